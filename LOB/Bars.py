@@ -0,0 +1,133 @@
+# Columns of the bars file written by BarAggregator, a row for each bucket of bist_time in which something traded or the top of the book changed
+BARS_HEADER = "bist_time,open,high,low,close,volume,vwap,trades,spread,bid_qty,ask_qty"
+
+class BarAggregator(object):
+    """
+    Streaming aggregation of the fills and of the top of the book into bars of a fixed interval of bist_time, used by OrderEngine when it is
+    given a bar_interval, so that bars don't have to be resampled from the trades and market outputs after the run.
+
+    OrderEngine calls update() after each E and D message, with its trades and the top of the book after it. The bar of the bucket being
+    filled is kept as a few running sums, and is written to stream as soon as a message of a later bucket arrives, so the bars are emitted
+    while the input is processed, and close() writes the last one. Each bar is a row of BARS_HEADER:
+    - bist_time: start of the bucket
+    - open, high, low, close, volume, vwap and trades: of the fills in the bucket, the prices are empty if nothing traded
+    - spread, bid_qty and ask_qty: averages of the best ask minus the best bid, and of the volume at the best bid and at the best ask,
+      weighted by the time each value lasted within the bucket. The spread only counts the time both sides had orders.
+    Buckets in which nothing traded and the top of the book didn't change are not written, the book stayed as the previous bar ended.
+    Prices are kept in integer ticks, and turned into prices by the converters of the stream.
+    """
+    def __init__(self, interval, stream):
+        self.interval = interval # length of a bucket, in nanoseconds of bist_time
+        self.stream   = stream   # CsvSink the bars are written to
+        self.bucket   = None     # index of the bucket of the bar being filled, bist_time // interval
+        self.top      = (0, 0, 0, 0) # (bid_price, bid_qty, ask_price, ask_qty) since top_time, see OrderEngine.top_of_book()
+        self.top_time = None     # bist_time since which the top of the book is self.top, or the start of the bucket if it is later
+        self.new_bar()
+
+    def new_bar(self):
+        self.open        = None
+        self.high        = None
+        self.low         = None
+        self.close_price = None
+        self.volume      = 0 # qty traded in the bucket
+        self.notional    = 0 # sum of price * qty of the trades, in ticks
+        self.trades      = 0 # number of trades
+        self.book_time   = 0 # nanoseconds of the bucket with a known top of the book
+        self.bid_area    = 0 # integral of the volume at the best bid over book_time
+        self.ask_area    = 0 # integral of the volume at the best ask over book_time
+        self.spread_time = 0 # nanoseconds of the bucket during which both sides had orders
+        self.spread_area = 0 # integral of the spread, in ticks, over spread_time
+
+    def update(self, bist_time, trades, top):
+        """
+        Called by OrderEngine.process_execute_order() and process_delete_order()
+
+        Arguments:
+            bist_time: int, time of the message
+            trades: list of the trades of the message, as written to the trades output
+            top: tuple, top of the book after the message, returned by OrderEngine.top_of_book()
+        """
+        if not trades and top == self.top:
+            return
+        bucket = bist_time // self.interval
+        if self.bucket is None:
+            self.bucket = bucket
+        elif bucket > self.bucket:
+            # the bar of the previous bucket is closed, the top of the book it ended with carries over into the new one
+            self.accumulate((self.bucket + 1) * self.interval)
+            self.emit()
+            self.new_bar()
+            self.bucket = bucket
+            if self.top_time is not None:
+                self.top_time = bucket * self.interval
+        self.accumulate(bist_time)
+
+        for trade in trades:
+            price, qty = trade[1], trade[2]
+            if self.open is None:
+                self.open = self.high = self.low = price
+            elif price > self.high:
+                self.high = price
+            elif price < self.low:
+                self.low = price
+            self.close_price = price
+            self.volume     += qty
+            self.notional   += price * qty
+        self.trades  += len(trades)
+        self.top      = top
+        self.top_time = bist_time
+
+    def accumulate(self, bist_time):
+        """
+        Adds the time from top_time to bist_time, during which the top of the book was self.top, to the time weighted sums
+        """
+        if self.top_time is None or bist_time <= self.top_time:
+            return
+        elapsed = bist_time - self.top_time
+        bid_price, bid_qty, ask_price, ask_qty = self.top
+        self.book_time += elapsed
+        self.bid_area  += bid_qty * elapsed
+        self.ask_area  += ask_qty * elapsed
+        if bid_price and ask_price:
+            self.spread_time += elapsed
+            self.spread_area += (ask_price - bid_price) * elapsed
+        self.top_time = bist_time
+
+    def emit(self):
+        """
+        Writes the bar of the current bucket to the stream
+        """
+        book_time = self.book_time
+        self.stream.write_row((
+            self.bucket * self.interval,
+            self.open,
+            self.high,
+            self.low,
+            self.close_price,
+            self.volume,
+            self.notional / self.volume if self.volume else None,
+            self.trades,
+            self.spread_area / self.spread_time if self.spread_time else None,
+            round(self.bid_area / book_time, 2) if book_time else None,
+            round(self.ask_area / book_time, 2) if book_time else None,
+        ))
+
+    def close(self):
+        """
+        Writes the bar of the last bucket, up to the last message, and closes the stream. Called by OrderEngine.save_to_file()
+        """
+        if self.bucket is not None:
+            self.emit()
+            self.bucket = None
+        self.stream.close()
+
+    def checkpoint_state(self):
+        """
+        Returns the state of the bar being filled, saved in the checkpoints of OrderEngine
+        """
+        return {name: value for name, value in vars(self).items() if name != "stream"}
+
+    def load_checkpoint_state(self, state):
+        if state["interval"] != self.interval:
+            raise ValueError(f"Checkpoint was saved with a bar interval of {state['interval']} ns, not {self.interval}")
+        vars(self).update(state)
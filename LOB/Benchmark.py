@@ -0,0 +1,418 @@
+"""
+Benchmark harness of the package, with a generator of synthetic order flow and a set of standard scenarios.
+
+Each scenario is generated as a stream of A/E/D messages by generate_events(), and is run on OrderEngine (parsing and processing
+each input line), on OrderTree (the book operations the E and D messages turn into) and on OrderQue (the price level operations
+they turn into). For each of them the number of messages (or book/level operations) per second, the p50 and p99 latency of a single one
+and the peak RSS of the process are reported. Every run is done in a new process, so that the peak RSS of one doesn't hide the next.
+The results are saved to a JSON file, which can be given as the baseline of a later run to compare the two.
+
+Run from the repository root:
+    python -m LOB.Benchmark --output benchmark.json
+    python -m LOB.Benchmark --scenarios sweeps --scale 0.1 --baseline benchmark.json
+"""
+import argparse
+import concurrent.futures
+import datetime
+import json
+import multiprocessing
+import platform
+import random
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows, where peak RSS isn't reported
+    resource = None
+
+from LOB.OrderEngine import OrderEngine, BOOK_TYPES
+from LOB.OrderQue    import OrderQue
+from LOB.OrderTypes  import orderA, orderE
+
+RESULTS_VERSION = 1 # version of the format of the JSON results
+ASSET           = "SYNTH.E"
+MID_PRICE       = 2000 # price (in ticks of 0.01) the synthetic books are built around, bids are below it and asks above it
+START_TIME      = 1663743600000000000 # bist_time of the first synthetic message, in nanoseconds
+
+# Parameters of generate_events() for each scenario:
+# deep_book is a deep passive book that is mostly added to, heavy_cancels a shallow book where most orders are canceled and replaced,
+# sweeps a book whose best levels are repeatedly consumed by aggressive orders that sweep up to sweep_size levels
+SCENARIOS = {
+    "deep_book":     dict(num_messages=200_000, num_levels=500, depth=20, cancel_ratio=0.10, aggressive_ratio=0.01, sweep_size=1),
+    "heavy_cancels": dict(num_messages=200_000, num_levels=20,  depth=10, cancel_ratio=0.90, aggressive_ratio=0.02, sweep_size=1),
+    "sweeps":        dict(num_messages=200_000, num_levels=50,  depth=10, cancel_ratio=0.05, aggressive_ratio=0.05, sweep_size=10),
+}
+COMPONENTS = ["OrderEngine", "OrderTree", "OrderQue"]
+
+def generate_events(num_messages, num_levels, depth, cancel_ratio, aggressive_ratio, sweep_size, seed=0):
+    """
+    Generates synthetic order flow, that first builds a book of num_levels price levels of depth orders on each side,
+    then adds passive orders, cancels and replaces resting orders and sends aggressive orders until it holds num_messages messages.
+    A model of the book is kept while generating, so each cancel refers to a resting order and each aggressive order exactly
+    consumes the best levels it sweeps.
+
+    Arguments:
+        num_messages: int, number of messages (A, E and D lines) generated, including the ones that build the initial book
+        num_levels: int, number of price levels on each side of the initial book, and of the prices passive orders are added at
+        depth: int, number of orders at each level of the initial book
+        cancel_ratio: float, fraction of the events after the initial book that cancel a random resting order and add a new one
+            at a random level of the same side, so that cancels don't change the size of the book
+        aggressive_ratio: float, fraction of the events after the initial book that are aggressive orders
+        sweep_size: int, an aggressive order sweeps between 1 and sweep_size levels of the other side
+        seed: int, seed of the random generator, the same arguments always generate the same events
+    Returns:
+        events: list of tuples, each one of
+            ("add", side, price, que_loc, qty, id): a passive orderA and the orderE that puts it on the book, 2 messages
+            ("sweep", side, price, que_loc, qty, id, levels): an aggressive orderA and the orderE that matches the list of prices levels, 2 messages
+            ("cancel", side, price, id): an orderD canceling a resting order, 1 message
+    """
+    rng     = random.Random(seed)
+    events  = []
+    levels  = {"B": {}, "S": {}} # Key: price, Value: list of the ids resting at the price, for each side
+    resting = []  # ids of the resting orders, canceled ones are swapped with the last one and popped
+    index   = {}  # Key: id, Value: (side, price, qty, index in resting)
+    counter = {"id": 1_000_000_000, "que_loc": 0, "messages": 0}
+
+    def new_order(side, price, qty, kind):
+        counter["id"]      += 1
+        counter["que_loc"] += 1
+        counter["messages"] += 2
+        return (kind, side, price, counter["que_loc"], qty, counter["id"])
+
+    def add(side, price):
+        event = new_order(side, price, 100 * rng.randint(1, 10), "add")
+        id    = event[5]
+        levels[side].setdefault(price, []).append(id)
+        index[id] = (side, price, event[4], len(resting))
+        resting.append(id)
+        events.append(event)
+
+    def forget(id):
+        side, price, qty, i = index.pop(id)
+        last = resting.pop()
+        if last != id:
+            resting[i] = last
+            index[last] = index[last][:3] + (i,)
+        return side, price
+
+    def passive_price(side):
+        offset = rng.randint(1, num_levels)
+        return MID_PRICE - offset if side == "B" else MID_PRICE + offset
+
+    # the initial book, in a random order of levels and sides
+    initial = [(side, level) for level in range(1, num_levels + 1) for side in "BS" for _ in range(depth)]
+    rng.shuffle(initial)
+    for side, level in initial:
+        add(side, MID_PRICE - level if side == "B" else MID_PRICE + level)
+
+    while counter["messages"] < num_messages:
+        draw = rng.random()
+        side = rng.choice("BS")
+        if draw < cancel_ratio and resting:
+            id = resting[rng.randrange(len(resting))]
+            side, price = forget(id)
+            level = levels[side][price]
+            level.remove(id)
+            if not level:
+                del levels[side][price]
+            events.append(("cancel", side, price, id))
+            counter["messages"] += 1
+            add(side, passive_price(side))
+        elif draw < cancel_ratio + aggressive_ratio and levels["S" if side == "B" else "B"]:
+            other  = levels["S" if side == "B" else "B"]
+            # the best levels of the other side, lowest asks for a buy and highest bids for a sell
+            swept  = sorted(other, reverse=(side == "S"))[:rng.randint(1, sweep_size)]
+            qty    = 0
+            for price in swept:
+                for id in other.pop(price):
+                    qty += index[id][2]
+                    forget(id)
+            events.append(new_order(side, swept[-1], qty, "sweep") + (swept,))
+        else:
+            add(side, passive_price(side))
+    return events
+
+def format_lines(events):
+    """
+    Returns the input lines of the events returned by generate_events(), in the format of the input files of OrderEngine
+    """
+    lines = []
+    t     = START_TIME
+    for event in events:
+        t += 1000
+        if event[0] == "cancel":
+            kind, side, price, id = event
+            lines.append(f"{t},{t},D,{ASSET},{side},0.0,0,0,{id}")
+        else:
+            side, price, que_loc, qty, id = event[1:6]
+            lines.append(f"{t},{t},A,{ASSET},{side},{price / 100:.2f},{que_loc},{qty},{id}")
+            lines.append(f"{t},{t + 1},E,{ASSET},{side},0.0,0,{qty},{id}")
+    return lines
+
+def run_order_engine(events, book_type):
+    """
+    Processes the input lines of the events one by one with OrderEngine.process_order(), with no outputs
+
+    Returns:
+        latencies: list of int, nanoseconds taken by each message
+    """
+    lines  = format_lines(events)
+    engine = OrderEngine(output_mode=[], book_type=book_type)
+    setup_done()
+
+    latencies = []
+    append    = latencies.append
+    clock     = time.perf_counter_ns
+    process   = engine.process_order
+    for line in lines:
+        start = clock()
+        process(line)
+        append(clock() - start)
+    return latencies
+
+def run_order_tree(events, book_type):
+    """
+    Runs the book operations of the events directly on the OrderTree (or OrderLadder) of each side:
+    insert_order() for the orderE of each passive order, process_order() for the orderE of each aggressive order,
+    and remove_order_by_key() for each canceled order. The orders are created before the operations are timed.
+
+    Returns:
+        latencies: list of int, nanoseconds taken by each operation
+    """
+    # the engine only holds the books and the active orderAs, which fully matched orders are removed from
+    engine = OrderEngine(output_mode=[], book_type=book_type)
+    books  = {"B": engine.OpenBids, "S": engine.OpenAsks}
+    orders = {} # Key: id, Value: orderE
+    ops    = []
+    t      = START_TIME
+    for event in events:
+        t += 1000
+        if event[0] == "cancel":
+            kind, side, price, id = event
+            ops.append((kind, books[side], orders.pop(id)))
+            continue
+        kind, side, price, que_loc, qty, id = event[:6]
+        order = orderA(t, t, "A", ASSET, side, price, que_loc, qty, id, ord_engine=engine)
+        engine.active_orderAs[id] = order
+        execute = orderE(id, qty, "E", t, t + 1)
+        order.process_execute_order(execute)
+        if kind == "add":
+            orders[id] = execute
+            ops.append((kind, books[side], execute))
+        else:
+            ops.append((kind, books["S" if side == "B" else "B"], execute))
+    setup_done()
+
+    latencies = []
+    append    = latencies.append
+    clock     = time.perf_counter_ns
+    for kind, book, order in ops:
+        start = clock()
+        if kind == "add":
+            book.insert_order(order)
+        elif kind == "sweep":
+            book.process_order(order)
+        else:
+            book.remove_order_by_key(order.key, not_head=True)
+        append(clock() - start)
+    return latencies
+
+def run_order_que(events, book_type):
+    """
+    Runs the price level operations of the events directly on an OrderQue for each price level:
+    append_order() for each passive order, get_head() and remove_head_order() for each order consumed by an aggressive order,
+    and remove_order_by_key() for each canceled order. Like in OrderTree, a level that runs out of orders is replaced by a new OrderQue.
+    book_type isn't used, the levels are the same for all book types.
+
+    Returns:
+        latencies: list of int, nanoseconds taken by each operation
+    """
+    ques   = {}  # Key: (side, price), Value: [OrderQue, number of orders], for the levels that have orders
+    orders = {}  # Key: id, Value: orderE
+    ops    = []
+    for event in events:
+        kind = event[0]
+        if kind == "add":
+            kind, side, price, que_loc, qty, id = event
+            order = orderE(id, qty, "E", 0, 0)
+            order.que_loc = que_loc
+            orders[id] = order
+            level = ques.get((side, price))
+            if level is None:
+                level = ques[(side, price)] = [OrderQue(), 0]
+            level[1] += 1
+            ops.append(("append", level[0], order))
+        elif kind == "cancel":
+            kind, side, price, id = event
+            level = ques[(side, price)]
+            level[1] -= 1
+            if level[1] == 0:
+                del ques[(side, price)]
+            ops.append(("cancel", level[0], orders.pop(id).key))
+        else:
+            side = "S" if event[1] == "B" else "B"
+            for price in event[6]:
+                order_que, count = ques.pop((side, price))
+                ops += [("pop", order_que, None)] * count
+    setup_done()
+
+    latencies = []
+    append    = latencies.append
+    clock     = time.perf_counter_ns
+    for kind, order_que, arg in ops:
+        start = clock()
+        if kind == "append":
+            order_que.append_order(arg)
+        elif kind == "pop":
+            order_que.get_head()
+            order_que.remove_head_order()
+        else:
+            order_que.remove_order_by_key(arg)
+        append(clock() - start)
+    return latencies
+
+RUNNERS = {
+    "OrderEngine": run_order_engine,
+    "OrderTree": run_order_tree,
+    "OrderQue": run_order_que,
+}
+
+def peak_rss_mb():
+    """
+    Returns the peak resident set size of the process in MB, None if it isn't available
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return round(peak / (1 << 20) if sys.platform == "darwin" else peak / (1 << 10), 1)
+
+_setup_rss = None
+
+def setup_done():
+    """
+    Called by the runners once the input is ready and before the timed loop, records the peak RSS of the setup
+    """
+    global _setup_rss
+    _setup_rss = peak_rss_mb()
+
+def scenario_params(scenario, scale=1.0):
+    """
+    Returns the parameters of generate_events() for a scenario, with num_messages multiplied by scale.
+    The initial book is scaled with it, so that it stays the same share of the messages: the depth of its levels is scaled,
+    and once it is down to a single order, the number of its levels is scaled instead
+    """
+    params = dict(SCENARIOS[scenario])
+    orders = params["num_levels"] * params["depth"] * scale # orders on each side of the initial book
+    params["num_messages"] = int(params["num_messages"] * scale)
+    params["depth"]        = max(1, round(params["depth"] * scale))
+    params["num_levels"]   = max(1, round(orders / params["depth"]))
+    return params
+
+def run_component(scenario, component, book_type, scale=1.0, seed=0):
+    """
+    Runs a scenario on a component and returns its results, called in a new process by run_benchmarks()
+
+    Returns:
+        results: dict, with the number of messages (or operations) run, the seconds they took, the messages per second,
+        the p50 and p99 latency in microseconds, and the peak RSS in MB at the end of the setup and of the run
+    """
+    events = generate_events(seed=seed, **scenario_params(scenario, scale))
+
+    latencies = np.array(RUNNERS[component](events, book_type), dtype=np.int64)
+    seconds   = latencies.sum() / 1e9
+    p50, p99  = np.percentile(latencies, [50, 99]) / 1e3
+    return {
+        "messages": len(latencies),
+        "seconds": round(float(seconds), 6),
+        "msgs_per_sec": round(len(latencies) / seconds, 1),
+        "p50_us": round(float(p50), 3),
+        "p99_us": round(float(p99), 3),
+        "setup_rss_mb": _setup_rss,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def git_commit():
+    """
+    Returns the commit the package is checked out at, None if it isn't in a git repository
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(scenarios=None, components=None, book_type="tree", scale=1.0, seed=0):
+    """
+    Runs each scenario on each component, every run in a new process
+
+    Returns:
+        results: dict, the JSON results, with the scenario parameters and the results of each component under "scenarios"
+    """
+    scenarios  = scenarios or list(SCENARIOS)
+    components = components or COMPONENTS
+    results = {
+        "version": RESULTS_VERSION,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "book_type": book_type,
+        "scale": scale,
+        "seed": seed,
+        "scenarios": {},
+    }
+    # spawned processes start without the memory of this one
+    context = multiprocessing.get_context("spawn")
+    for scenario in scenarios:
+        params = scenario_params(scenario, scale)
+        entry  = results["scenarios"][scenario] = {"params": params, "results": {}}
+        for component in components:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                entry["results"][component] = executor.submit(run_component, scenario, component, book_type, scale, seed).result()
+    return results
+
+def print_results(results, baseline=None):
+    """
+    Prints the results as a table, with the change in messages per second from the baseline results if given
+    """
+    print(f"\n{'scenario':>14} | {'component':>11} | {'messages':>8} | {'msgs/sec':>10} | {'p50 (us)':>8} | {'p99 (us)':>8} | {'peak RSS (MB)':>13} | {'vs baseline':>11}")
+    for scenario, entry in results["scenarios"].items():
+        for component, result in entry["results"].items():
+            change = ""
+            try:
+                before = baseline["scenarios"][scenario]["results"][component]["msgs_per_sec"]
+                change = f"{(result['msgs_per_sec'] / before - 1) * 100:+.1f}%"
+            except (TypeError, KeyError):
+                pass
+            rss = "" if result["peak_rss_mb"] is None else f"{result['peak_rss_mb']:.1f}"
+            print(f"{scenario:>14} | {component:>11} | {result['messages']:>8} | {result['msgs_per_sec']:>10.0f} | "
+                  f"{result['p50_us']:>8.3f} | {result['p99_us']:>8.3f} | {rss:>13} | {change:>11}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs the benchmark scenarios on OrderEngine, OrderTree and OrderQue and saves the results as JSON")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), help="scenarios to run, all of them by default")
+    parser.add_argument("--components", nargs="+", choices=COMPONENTS, help="components to run, all of them by default")
+    parser.add_argument("--book-type", choices=list(BOOK_TYPES), default="tree")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies the number of messages of each scenario, and the size of its initial book")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark.json", help="file the JSON results are saved to")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare to")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    results = run_benchmarks(args.scenarios, args.components, args.book_type, args.scale, args.seed)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print_results(results, baseline)
+    print(f"\nSaved the results to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import numpy as np
+import argparse
+import bisect
+import json
+import mmap
+import struct
+from sys import intern
+
+# Layout of the records of a binary input file, one for each line of the input csv, with the fields of the
+# records returned by OrderEngine.parse_fields() in the same order. Prices are integer ticks, msg_type and side are single bytes.
+# The fields are placed at aligned offsets in 64 bytes, which leaves 14 bytes for the asset_name.
+RECORD_DTYPE = np.dtype({
+    "names":   ["network_time", "bist_time", "msg_type", "asset_name", "side", "price", "que_loc", "qty", "id"],
+    "formats": ["<i8",          "<i8",       "S1",       "S14",        "S1",   "<i8",   "<i8",     "<i8", "<u8"],
+    "offsets": [0,              8,           48,         50,           49,     16,      24,        32,    40],
+    "itemsize": 64,
+})
+
+# The file starts with a header of HEADER_SIZE bytes:
+# magic string, tick_size the prices were converted with, number of records, 1 if the input ended with an empty line,
+# and the byte offset of the trailer, a json list of [record index, message] pairs of the invalid lines
+MAGIC         = b"LOBBIN01"
+HEADER_FORMAT = "<8sdqqq"
+HEADER_SIZE   = 64
+
+def is_binary_input(file_name):
+    """
+    Returns True if the file was written by convert_to_binary()
+    """
+    with open(file_name, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def read_header(f):
+    """
+    Returns:
+        header: tuple, (tick_size, num_records, ended, trailer_offset)
+    """
+    f.seek(0)
+    magic, tick_size, num_records, ended, trailer_offset = struct.unpack(HEADER_FORMAT, f.read(struct.calcsize(HEADER_FORMAT)))
+    if magic != MAGIC:
+        raise ValueError(f"{f.name} is not a binary input file")
+    return tick_size, num_records, bool(ended), trailer_offset
+
+def convert_to_binary(file_name, out_file, tick_size=0.01, chunk_size=1 << 20):
+    """
+    Converts an input csv file into a binary input file, so that it can be replayed by OrderEngine without parsing it again.
+    Each line is parsed exactly as OrderEngine would parse it, the lines that fail are kept as empty records,
+    together with their messages, so that a replay reports the same line numbers and invalid orders as the csv.
+
+    Arguments:
+        file_name: str, path of the input csv
+        out_file: str, path of the binary file that is written
+        tick_size: float, tick_size of the OrderEngine that will replay the file, prices are saved as integer ticks
+    Returns:
+        num_records: int, number of records written
+    """
+    # imported here, since OrderEngine imports this module
+    from LOB.OrderEngine import OrderEngine, InvalidOrder, read_chunks
+
+    # an engine without outputs, only used for its parse_lines()
+    parser  = OrderEngine(output_mode=[], tick_size=tick_size)
+    empty   = (0, 0, b"", b"", b"", 0, 0, 0, 0)
+    invalid = [] # [record index, message] of the invalid lines
+    ended   = False
+    num_records = 0
+    with open(out_file, "wb") as out:
+        out.write(bytes(HEADER_SIZE))
+        for start, end, lines in read_chunks(file_name, chunk_size):
+            parsed = parser.parse_lines(lines)
+            # nothing after the empty line that ends the input is processed
+            if None in parsed:
+                parsed = parsed[:parsed.index(None)]
+                ended  = True
+
+            records = []
+            for i, record in enumerate(parsed, num_records):
+                if record.__class__ is InvalidOrder:
+                    invalid.append([i, str(record)])
+                    record = empty
+                elif len(record[3].encode()) > RECORD_DTYPE["asset_name"].itemsize:
+                    raise ValueError(f"asset_name {record[3]!r} at line {i+1} is longer than {RECORD_DTYPE['asset_name'].itemsize} bytes")
+                records.append(record)
+            out.write(np.array(records, dtype=RECORD_DTYPE).tobytes())
+            num_records += len(records)
+            if ended:
+                break
+
+        trailer_offset = out.tell()
+        out.write(json.dumps(invalid).encode())
+        out.seek(0)
+        out.write(struct.pack(HEADER_FORMAT, MAGIC, tick_size, num_records, ended, trailer_offset))
+    return num_records
+
+def read_binary_chunks(file_name, chunk_size, tick_size, start=0):
+    """
+    Replays a binary input file through mmap, in chunks of (about) chunk_size bytes, from the record at byte offset start
+    (or from the first record if start is 0).
+    The records of each chunk are read through a numpy view of the mapped file, without copying or parsing them,
+    and turned into the tuples returned by OrderEngine.parse_fields() column by column.
+
+    Yields:
+        start: int, byte offset of the first record of the chunk
+        end: int, byte offset right after the last record of the chunk
+        records: list of tuples, the records of the chunk, followed by None if the input ended with an empty line
+        invalid: list of (index in records, message) pairs, the records of the lines that failed to be parsed
+    """
+    with open(file_name, "rb") as f:
+        file_tick_size, num_records, ended, trailer_offset = read_header(f)
+        if file_tick_size != tick_size:
+            raise ValueError(f"{file_name} was converted with tick_size {file_tick_size}, not {tick_size}")
+        f.seek(trailer_offset)
+        invalid = json.loads(f.read().decode())
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    # the invalid records are sorted by their index, the ones of each chunk are found by bisection
+    invalid_index = [i for i, message in invalid]
+    view = None
+    try:
+        records_per_chunk = max(1, chunk_size // RECORD_DTYPE.itemsize)
+        first_record = max(0, start - HEADER_SIZE) // RECORD_DTYPE.itemsize
+        for first in range(first_record, num_records, records_per_chunk):
+            count = min(records_per_chunk, num_records - first)
+            start = HEADER_SIZE + first * RECORD_DTYPE.itemsize
+            view  = np.frombuffer(mm, dtype=RECORD_DTYPE, count=count, offset=start)
+            records = list(zip(
+                view["network_time"].tolist(),
+                view["bist_time"].tolist(),
+                view["msg_type"].astype("U1").tolist(),
+                list(map(intern, view["asset_name"].astype("U").tolist())),
+                view["side"].astype("U1").tolist(),
+                view["price"].tolist(),
+                view["que_loc"].tolist(),
+                view["qty"].tolist(),
+                view["id"].tolist(),
+            ))
+            view = None
+            chunk_invalid = [(i - first, message) for i, message in
+                             invalid[bisect.bisect_left(invalid_index, first):bisect.bisect_left(invalid_index, first + count)]]
+            if ended and first + count == num_records:
+                records.append(None)
+            yield start, start + count * RECORD_DTYPE.itemsize, records, chunk_invalid
+        # starting at (or past) the end of the records, only the end of the input is left, at the offset right after the last record
+        if ended and first_record >= num_records:
+            end = HEADER_SIZE + num_records * RECORD_DTYPE.itemsize
+            yield end, end, [None], []
+    finally:
+        # the map can't be closed while a numpy view of it is alive
+        view = None
+        mm.close()
+
+def find_time_record(file_name, start_time):
+    """
+    Same as LOB.OrderEngine.find_time_offset() for a binary input file, bisects the records by their bist_time
+    through a view of the mapped file. The records of invalid lines, which have no bist_time, are skipped while bisecting.
+
+    Returns:
+        offset: int, byte offset of the first record after the last one with a bist_time of at most start_time
+        index: int, index of that record
+    """
+    with open(file_name, "rb") as f:
+        tick_size, num_records, ended, trailer_offset = read_header(f)
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    times = None
+    try:
+        times = np.frombuffer(mm, dtype=RECORD_DTYPE, count=num_records, offset=HEADER_SIZE)["bist_time"]
+        index = 0
+        low, high = 0, num_records
+        while low < high:
+            middle = (low + high) // 2
+            i = middle
+            while i < num_records and times[i] == 0:
+                i += 1
+            if i < num_records and times[i] <= start_time:
+                index = i + 1
+                low   = i + 1
+            else:
+                high  = middle
+    finally:
+        times = None
+        mm.close()
+    return HEADER_SIZE + index * RECORD_DTYPE.itemsize, index
+
+def main():
+    parser = argparse.ArgumentParser(description="Converts an input csv file into a binary input file that OrderEngine.run_with_file() replays without parsing")
+    parser.add_argument("file_name")
+    parser.add_argument("out_file")
+    parser.add_argument("--tick-size", type=float, default=0.01)
+    args = parser.parse_args()
+    num_records = convert_to_binary(args.file_name, args.out_file, args.tick_size)
+    print(f"Converted {num_records} lines of {args.file_name} into {args.out_file}")
+
+if __name__ == "__main__":
+    main()
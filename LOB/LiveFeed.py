@@ -0,0 +1,321 @@
+"""
+asyncio front end that runs an OrderEngine on a live feed instead of a finished file, for intraday monitoring.
+
+The feed is either a file that is still being written (see follow_file()) or a socket (see stream_chunks()), and replay_server()
+replays an input file over a local TCP server at a given speed, as a stand-in for the BIST stream.
+
+Run from the repository root:
+    python -m LOB.LiveFeed replay GARAN.E.mini.csv --speed 10              # replays the file to itself through a local server
+    python -m LOB.LiveFeed serve GARAN.E.mini.csv --port 9000 --speed 10   # only runs the replay server
+    python -m LOB.LiveFeed connect --port 9000                            # runs an engine on the lines read from a server
+    python -m LOB.LiveFeed follow GARAN.E.mini.csv                         # runs an engine on a file that is still being written
+"""
+import argparse
+import asyncio
+import time
+
+from LOB.OrderEngine import OrderEngine, OUTPUT_MODES, read_chunks
+
+# Put on the queue of each subscriber after the last event, and on the chunk queue after the last chunk of the feed
+END = None
+
+class LiveFeed(object):
+    """
+    Runs an OrderEngine on the lines of a live feed and publishes its trades and top of book changes to async subscribers.
+
+    run() reads the feed, an async iterable of lists of lines (see follow_file() and stream_chunks()), and puts each list on a queue
+    of at most queue_size chunks. The matcher takes them from it and parses and processes them exactly like the chunks of a file in
+    OrderEngine.match_file(), and after each message puts its events on the queue of each subscriber:
+    - ("trade", line, bist_time, price, qty, bid_id, bid_time, ask_id, ask_time) for each trade the message made
+    - ("top", line, bist_time, bid_price, bid_qty, ask_price, ask_qty) if the best price or the volume at the best price of either side
+      changed, with None and 0 for an empty side
+    where line is the index of the message in the feed and bist_time is the one of the message.
+
+    All queues are bounded, so a stage that falls behind slows down the ones before it instead of piling up messages in memory:
+    a slow subscriber blocks the matcher, which then stops taking chunks, and once the chunk queue is full the feed stops being read
+    (for a socket, TCP flow control then pushes back on the sender).
+    """
+    def __init__(self, engine, queue_size=8):
+        self.engine      = engine # OrderEngine the feed is run on, its outputs are saved once the feed ends
+        self.queue_size  = queue_size # maximum number of chunks of the feed waiting to be matched
+        self.chunks      = None # asyncio.Queue of the chunks of the feed, created by run() in its event loop
+        self.subscribers = [] # asyncio.Queue of the events of each subscriber
+        self.last_top    = engine.top_of_book() # top of the book after the last message, to publish its changes
+
+    def subscribe(self, queue_size=1024):
+        """
+        Adds a subscriber, to be called before run()
+
+        Arguments:
+            queue_size: int, maximum number of events waiting in the queue of the subscriber
+        Returns:
+            queue: asyncio.Queue, the events published after each message, followed by END once the feed is over
+        """
+        queue = asyncio.Queue(maxsize=queue_size)
+        self.subscribers.append(queue)
+        return queue
+
+    async def run(self, feed):
+        """
+        Top level method that runs the engine on the feed, until the feed ends or the empty line that ends the input is reached,
+        then saves the outputs of the engine
+
+        Arguments:
+            feed: async iterable of lists of str, the lines of the feed without their line breaks
+        """
+        self.chunks = asyncio.Queue(maxsize=self.queue_size)
+        reader  = asyncio.create_task(self.read_feed(feed))
+        matcher = asyncio.create_task(self.match_chunks())
+        try:
+            done, pending = await asyncio.wait([reader, matcher], return_when=asyncio.FIRST_COMPLETED)
+            if reader in done:
+                # the feed ended (or failed), the matcher processes the chunks left on the queue
+                reader.result()
+                await matcher
+            else:
+                # the matcher reached the end of the input, the rest of the feed isn't read
+                matcher.result()
+            for queue in self.subscribers:
+                await queue.put(END)
+        finally:
+            reader.cancel()
+            matcher.cancel()
+            await asyncio.gather(reader, matcher, return_exceptions=True)
+            if self.engine.concurrent_mode:
+                self.engine.save_to_file_concurrent()
+            else:
+                self.engine.save_to_file()
+            if self.engine.metrics is not None:
+                self.engine.metrics.dump(line=self.engine.last_line, final=True)
+
+    async def read_feed(self, feed):
+        """
+        Called by run(), puts the chunks of the feed on the chunk queue, waiting while it is full
+        """
+        async for lines in feed:
+            if lines:
+                await self.chunks.put(lines)
+        await self.chunks.put(END)
+
+    async def match_chunks(self):
+        """
+        Called by run(), parses and processes the chunks of the feed as they come
+        """
+        engine     = self.engine
+        first_line = engine.start_line
+        while True:
+            lines = await self.chunks.get()
+            if lines is END:
+                break
+            # the total size of a live feed isn't known, its progress is reported relative to the lines received so far
+            engine.tot_bytes  = first_line + len(lines)
+            engine.chunk_span = (first_line, first_line + len(lines), first_line, len(lines))
+            end_of_feed = await self.process_parsed(engine.parse_lines(lines), first_line)
+            first_line += len(lines)
+            if end_of_feed:
+                engine.log("\n================================= END OF FILE REACHED =================================")
+                break
+            if engine.metrics is not None:
+                engine.metrics.maybe_dump(line=first_line)
+        engine.log(engine.display_final())
+
+    async def process_parsed(self, parsed, first_line):
+        """
+        Same as OrderEngine.process_parsed(), but publishes the events of each message to the subscribers
+
+        Returns:
+            end_of_feed: bool, True if an empty line (which marks the end of the input) has been reached
+        """
+        engine         = self.engine
+        subscribers    = self.subscribers
+        ticks_to_price = engine.ticks_to_price
+        for i, record in enumerate(parsed, first_line):
+            if record is None:
+                engine.last_line = i
+                return True
+            # rejected lines don't go through process_record(), which clears the trades of the previous message
+            engine.last_trades = []
+            engine.process_line_record(i, record)
+            if not subscribers:
+                continue
+
+            events = []
+            for bist_time, price, qty, bid_id, bid_time, ask_id, ask_time in engine.last_trades:
+                events.append(("trade", i, bist_time, ticks_to_price(price), qty, bid_id, bid_time, ask_id, ask_time))
+            top = engine.top_of_book()
+            if top != self.last_top:
+                bid_price, bid_qty, ask_price, ask_qty = top
+                events.append(("top", i, record[1], ticks_to_price(bid_price or None), bid_qty, ticks_to_price(ask_price or None), ask_qty))
+                self.last_top = top
+            for event in events:
+                for queue in subscribers:
+                    await queue.put(event)
+        return False
+
+async def follow_file(file_name, chunk_size=1 << 16, poll_interval=0.1):
+    """
+    Reads a file that is still being written, like tail -f. Whenever the end of the file is reached, waits for poll_interval seconds
+    and reads again, until the empty line that ends the input is read
+
+    Yields:
+        lines: list of str, the complete lines read at once (at most chunk_size bytes), without the line breaks
+    """
+    rest = b""
+    with open(file_name, "rb") as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                await asyncio.sleep(poll_interval)
+                continue
+            # a line that is only partly written yet is kept until the rest of it is read
+            data = rest + data
+            cut  = data.rfind(b"\n") + 1
+            rest = data[cut:]
+            if cut == 0:
+                continue
+            lines = data[:cut].decode().splitlines()
+            yield lines
+            if "" in lines:
+                return
+
+async def stream_chunks(reader, chunk_size=1 << 16):
+    """
+    Reads the lines of a feed from an asyncio.StreamReader, until the other end closes it
+
+    Yields:
+        lines: list of str, the complete lines received at once (at most chunk_size bytes), without the line breaks
+    """
+    rest = b""
+    while True:
+        data = await reader.read(chunk_size)
+        if not data:
+            break
+        data = rest + data
+        cut  = data.rfind(b"\n") + 1
+        rest = data[cut:]
+        if cut > 0:
+            yield data[:cut].decode().splitlines()
+    if rest:
+        yield rest.decode().splitlines()
+
+async def replay_server(file_name, host="127.0.0.1", port=0, speed=1.0, chunk_size=1 << 16):
+    """
+    Starts a TCP server that replays an input file to each client that connects, as a local stand-in for the live feed.
+    The lines are sent at the pace of their bist_time, speed times faster than they happened, or as fast as the client reads them
+    if speed is 0. Lines without a bist_time are sent right after the line before them.
+
+    Arguments:
+        port: int, port the server listens on, 0 for any free port
+    Returns:
+        server: asyncio.Server, the port it listens on is server.sockets[0].getsockname()[1]
+    """
+    async def replay(reader, writer):
+        try:
+            await send_file(file_name, writer, speed, chunk_size)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+    return await asyncio.start_server(replay, host, port)
+
+async def send_file(file_name, writer, speed, chunk_size):
+    """
+    Called by replay_server(), writes the lines of the file to a client, waiting for it to read them (writer.drain()) after each chunk
+    and before each pause
+    """
+    start      = time.perf_counter()
+    first_time = None
+    for offset, end, lines in read_chunks(file_name, chunk_size):
+        for line in lines:
+            if speed:
+                bist_time = line_time(line)
+                if bist_time is not None:
+                    if first_time is None:
+                        first_time = bist_time
+                    delay = (bist_time - first_time) / 1e9 / speed - (time.perf_counter() - start)
+                    if delay > 0:
+                        await writer.drain()
+                        await asyncio.sleep(delay)
+            writer.write(line.encode() + b"\n")
+        await writer.drain()
+
+def line_time(line):
+    """
+    Returns the bist_time of an input line, None if it doesn't have one
+    """
+    fields = line.split(",", 2)
+    try:
+        return int(fields[1])
+    except (IndexError, ValueError):
+        return None
+
+async def print_events(queue):
+    """
+    Subscriber used by main(), prints the events of the feed as they come
+    """
+    while True:
+        event = await queue.get()
+        if event is END:
+            return
+        if event[0] == "trade":
+            kind, line, bist_time, price, qty, bid_id, bid_time, ask_id, ask_time = event
+            print(f"TRADE line {line+1:>7} {bist_time} {qty:>8} @ {price}")
+        else:
+            kind, line, bist_time, bid_price, bid_qty, ask_price, ask_qty = event
+            print(f"TOP   line {line+1:>7} {bist_time} {bid_qty:>8} @ {bid_price} / {ask_qty} @ {ask_price}")
+
+async def run_feed(engine, feed, quiet=False):
+    """
+    Called by main(), runs a LiveFeed of the engine on the feed, with a subscriber printing its events unless quiet is True
+    """
+    live = LiveFeed(engine)
+    subscribers = [] if quiet else [print_events(live.subscribe())]
+    # a subscriber that fails would block the feed once its queue is full, gather() raises its error instead
+    await asyncio.gather(live.run(feed), *subscribers)
+
+async def connect(host, port, engine, quiet=False):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        await run_feed(engine, stream_chunks(reader), quiet)
+    finally:
+        writer.close()
+
+async def serve(file_name, host, port, speed):
+    server = await replay_server(file_name, host, port, speed)
+    print(f"Replaying {file_name} on {host}:{server.sockets[0].getsockname()[1]} at speed {speed}")
+    async with server:
+        await server.serve_forever()
+
+async def replay(file_name, host, speed, engine, quiet=False):
+    server = await replay_server(file_name, host, 0, speed)
+    async with server:
+        await connect(host, server.sockets[0].getsockname()[1], engine, quiet)
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs an OrderEngine on a live feed, read from a socket or from a file that is still being written")
+    parser.add_argument("mode", choices=["replay", "serve", "connect", "follow"],
+                        help="replay a file through a local server, only serve a file, connect to a server, or follow a growing file")
+    parser.add_argument("file_name", nargs="?", help="input file of replay, serve and follow")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed relative to the bist_time of the lines, 0 to send them as fast as possible")
+    parser.add_argument("--output-mode", choices=list(OUTPUT_MODES), default="fast")
+    parser.add_argument("--output-dir", default="output")
+    parser.add_argument("--quiet", action="store_true", help="don't print the trades and top of book changes")
+    args = parser.parse_args()
+    if args.mode != "connect" and args.file_name is None:
+        parser.error(f"{args.mode} needs a file_name")
+
+    if args.mode == "serve":
+        asyncio.run(serve(args.file_name, args.host, args.port, args.speed))
+        return
+    engine = OrderEngine(output_mode=args.output_mode, output_dir=args.output_dir)
+    if args.mode == "replay":
+        asyncio.run(replay(args.file_name, args.host, args.speed, engine, args.quiet))
+    elif args.mode == "connect":
+        asyncio.run(connect(args.host, args.port, engine, args.quiet))
+    else:
+        asyncio.run(run_feed(engine, follow_file(args.file_name), args.quiet))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import json
+import os
+import time
+
+class Histogram(object):
+    """
+    HDR-style histogram of non-negative integers (latencies in nanoseconds, or counts), with a fixed relative precision.
+
+    Values are counted in log-linear buckets: each power of two is split into 2 ** SUB_BITS buckets of equal width,
+    so a value is recorded with a relative error of at most 1 / 2 ** SUB_BITS (about 3%), whatever its magnitude.
+    Recording a value is a bit_length() and a list increment, and the memory used is fixed.
+    """
+    SUB_BITS    = 5
+    SUB_BUCKETS = 1 << SUB_BITS
+    NUM_BUCKETS = SUB_BUCKETS * 64 # enough for any value up to 2 ** 64
+
+    def __init__(self):
+        self.counts = [0] * self.NUM_BUCKETS
+        self.count  = 0 # number of values recorded
+        self.total  = 0 # sum of the values recorded
+        self.max    = 0 # largest value recorded
+
+    def record(self, value):
+        if value < self.SUB_BUCKETS:
+            index = value
+        else:
+            shift = value.bit_length() - self.SUB_BITS - 1
+            index = (shift << self.SUB_BITS) + (value >> shift)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def bucket_value(self, index):
+        """
+        Returns the smallest value counted in the bucket at index
+        """
+        if index < 2 * self.SUB_BUCKETS:
+            return index
+        shift = (index >> self.SUB_BITS) - 1
+        return (index - (shift << self.SUB_BITS)) << shift
+
+    def percentile(self, p):
+        """
+        Returns the value (rounded down to the start of its bucket) below which p percent of the recorded values are, 0 if it is empty
+        """
+        if self.count == 0:
+            return 0
+        target = max(1, -(-self.count * p // 100))
+        seen   = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self.bucket_value(index), self.max)
+        return self.max
+
+    def summary(self):
+        """
+        Returns the count, mean, percentiles and max of the recorded values as a dict
+        """
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 1) if self.count else 0,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "p999": self.percentile(99.9),
+            "max": self.max,
+        }
+
+class Metrics(object):
+    """
+    Opt-in instrumentation of an OrderEngine, enabled with OrderEngine(metrics=True) or by giving it a metrics_file.
+
+    instrument() replaces methods of the engine, of its books and of its output streams with timed wrappers, set as attributes of
+    the instances (the classes are left as they are). An engine without metrics has nothing wrapped, so it runs exactly the same code.
+    It records:
+    - a latency histogram (in nanoseconds) for each message type, "message.A", "message.E" and "message.D", of process_record()
+    - a latency histogram for each stage: "stage.parse" (parse_lines() of a chunk, or parse_fields() of a line, which also validate them),
+      "stage.validate" (handling a rejected line), "stage.match" (OrderTree.process_order() of an orderE against the other side),
+      "stage.cancel" (removing a canceled orderE from its book), "stage.snapshot" (recording the market and lob rows after a trade)
+      and "stage.serialise" (formatting and writing a flushed output buffer)
+    - "levels_swept" and "orders_touched", histograms of the number of price levels and of resting orders each orderE matched
+      (0 for the ones that don't cross the other side)
+    - counters of the messages of each type, lines parsed, lines rejected, trades, levels swept and orders touched
+
+    In concurrent_mode the input is parsed by another process and the outputs are written by another thread,
+    the parse stage is then not recorded and the serialise stage is recorded by the writer thread.
+
+    dump() writes the summary of everything recorded so far to metrics_file as a line of JSON, OrderEngine calls it every
+    interval seconds between chunks of the input (see maybe_dump()) and once at the end of the run.
+    """
+    def __init__(self, metrics_file=None, interval=60):
+        self.metrics_file = metrics_file # file the summaries are appended to as JSON lines, nothing is dumped if None
+        self.interval     = interval     # number of seconds between two dumps
+        self.histograms   = {}  # Key: name, Value: Histogram
+        self.counters     = {}  # Key: name, Value: int
+        self.start_time   = time.time()
+        self.last_dump    = time.perf_counter()
+        self.dumped       = False # True once the first dump has created (or overwritten) metrics_file
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        return histogram
+
+    def timed(self, name, method):
+        """
+        Returns a wrapper of method that records the time of each call in the histogram name
+        """
+        record = self.histogram(name).record
+        clock  = time.perf_counter_ns
+        def wrapper(*args, **kwargs):
+            start = clock()
+            result = method(*args, **kwargs)
+            record(clock() - start)
+            return result
+        return wrapper
+
+    def instrument(self, engine, streams):
+        """
+        Wraps the methods of engine, of its books and of its output streams that are recorded, called once by OrderEngine.__init__()
+        """
+        clock    = time.perf_counter_ns
+        counters = self.counters
+
+        # messages, by msg_type
+        process_record = engine.process_record
+        by_type        = {msg_type: self.histogram("message." + msg_type).record for msg_type in "AED"}
+        def timed_process_record(record):
+            start = clock()
+            process_record(record)
+            msg_type = record[2]
+            by_type[msg_type](clock() - start)
+            key = "messages." + msg_type
+            counters[key] = counters.get(key, 0) + 1
+        engine.process_record = timed_process_record
+
+        # parsing and validation
+        parse_lines = self.timed("stage.parse", engine.parse_lines)
+        def counted_parse_lines(lines):
+            counters["lines_parsed"] = counters.get("lines_parsed", 0) + len(lines)
+            return parse_lines(lines)
+        engine.parse_lines  = counted_parse_lines
+        engine.parse_fields = self.timed("stage.parse", engine.parse_fields)
+        reject_order = self.timed("stage.validate", engine.reject_order)
+        def counted_reject_order(i, e):
+            counters["lines_rejected"] = counters.get("lines_rejected", 0) + 1
+            reject_order(i, e)
+        engine.reject_order = counted_reject_order
+
+        # matching and cancels, on both books
+        match_record   = self.histogram("stage.match").record
+        cancel_record  = self.histogram("stage.cancel").record
+        levels_record  = self.histogram("levels_swept").record
+        touched_record = self.histogram("orders_touched").record
+        for book in [engine.OpenBids, engine.OpenAsks]:
+            def timed_process_order(orderE, process_order=book.process_order):
+                start = clock()
+                qty_not_matched, trades = process_order(orderE)
+                match_record(clock() - start)
+                # each trade is with one resting order, and the trades of each level come one after the other
+                levels, last_price = 0, None
+                for trade in trades:
+                    if trade[1] != last_price:
+                        levels    += 1
+                        last_price = trade[1]
+                levels_record(levels)
+                touched_record(len(trades))
+                counters["trades"]         = counters.get("trades", 0) + len(trades)
+                counters["levels_swept"]   = counters.get("levels_swept", 0) + levels
+                counters["orders_touched"] = counters.get("orders_touched", 0) + len(trades)
+                return qty_not_matched, trades
+            book.process_order = timed_process_order
+
+            def timed_remove_order_by_key(key, not_head=False, remove_order_by_key=book.remove_order_by_key):
+                # orders removed from the head of their queue are the ones consumed by a match, the others are canceled
+                if not not_head:
+                    return remove_order_by_key(key, not_head)
+                start = clock()
+                remove_order_by_key(key, not_head)
+                cancel_record(clock() - start)
+            book.remove_order_by_key = timed_remove_order_by_key
+
+        # snapshots of the book and serialisation of the outputs
+        engine.market_to_file = self.timed("stage.snapshot", engine.market_to_file)
+        engine.lob_to_file    = self.timed("stage.snapshot", engine.lob_to_file)
+        for stream in streams:
+            stream.write_buffer = self.timed("stage.serialise", stream.write_buffer)
+
+    def summary(self):
+        """
+        Returns everything recorded so far as a dict, with the latency histograms in nanoseconds
+        """
+        return {
+            "time": time.time(),
+            "elapsed": round(time.time() - self.start_time, 3),
+            "counters": dict(self.counters),
+            "histograms": {name: histogram.summary() for name, histogram in sorted(self.histograms.items())},
+        }
+
+    def maybe_dump(self, **extra):
+        """
+        Called by OrderEngine.match_file() after each chunk, dumps the summary if interval seconds have passed since the last dump
+        """
+        if self.metrics_file is not None and time.perf_counter() - self.last_dump >= self.interval:
+            self.dump(**extra)
+
+    def dump(self, **extra):
+        """
+        Appends the summary (with the items of extra) to metrics_file as a line of JSON, the first dump of a run overwrites the file
+        """
+        if self.metrics_file is None:
+            return
+        summary = dict(self.summary(), **extra)
+        dir_name = os.path.dirname(self.metrics_file)
+        if dir_name != "" and not os.path.exists(dir_name):
+            os.makedirs(dir_name, exist_ok=True)
+        with open(self.metrics_file, "a" if self.dumped else "w") as f:
+            f.write(json.dumps(summary) + "\n")
+        self.dumped    = True
+        self.last_dump = time.perf_counter()
@@ -0,0 +1,270 @@
+from LOB.OrderEngine import OrderEngine, NPY_OUTPUTS, read_chunks
+from LOB.OutputSink  import load_columns
+from LOB.BinaryInput import is_binary_input
+from zlib            import crc32
+import concurrent.futures
+import heapq
+import numpy as np
+import os
+import shutil
+import time
+
+# Outputs of OrderEngine that are csv files, mapped to the OrderEngine attribute holding their file name. Most of them have bist_time
+# (or for rejects, the line number) as their first column, and are merged in order of it, with an asset_name column added in front.
+# The CONCAT_OUTPUTS already have an asset_name column and their rows aren't in order of time, they are concatenated share by share.
+# The other outputs are text files, merged share by share.
+CSV_OUTPUTS    = {"market": "price_file", "trades": "trades_file", "lob": "lob_file", "rejects": "rejects_file", "closed": "orderA_file"}
+CONCAT_OUTPUTS = {"closed"}
+TEXT_OUTPUTS   = {"log": "order_book_file"}
+
+class MultiOrderEngine(object):
+    """
+    Runs an input file with the orders of many shares, keeping a seperate OrderEngine (and so, a seperate book) for each asset_name.
+
+    Shares are partitioned across num_workers processes of a ProcessPoolExecutor by the hash of their asset_name.
+    Each worker reads the entire input, but only parses and matches the lines of its own shares (the asset_name of the other
+    lines is found from their commas, without splitting them, see line_asset()), and saves the outputs
+    of each of its shares under output_dir/shards/<asset_name>. Once all workers are done, the shards are merged into
+    the output files under output_dir, csv files in order of bist_time (with an asset_name column added in front of each row),
+    and the closed orders and text files share by share.
+
+    engine_kwargs are passed to the OrderEngine of each share, tick_sizes can set a different tick_size for some of the shares.
+    """
+    def __init__(self, num_workers=None, output_dir="output", engine_kwargs=None, tick_sizes=None, chunk_size=1 << 20, keep_shards=False):
+        self.num_workers   = num_workers or os.cpu_count() # number of worker processes, each owning a disjoint set of shares
+        self.output_dir    = output_dir # directory where the merged outputs are saved
+        self.shard_dir     = os.path.join(output_dir, "shards") # directory where the outputs of each share are saved by the workers
+        self.engine_kwargs = dict(engine_kwargs or {}) # keyword arguments of the OrderEngine of each share
+        self.engine_kwargs.setdefault("output_mode", "fast")
+        # the shares already run in parallel, and ShardRouter reads the input itself, so the engines don't use concurrent_mode or checkpoints,
+        # nor metrics, which would all be dumped to the same file, nor golden files, which hold the merged outputs of all shares
+        for name in ["concurrent_mode", "checkpoint_file", "checkpoint_every", "checkpoint_interval", "metrics", "metrics_file", "metrics_interval", "golden_dir"]:
+            self.engine_kwargs.pop(name, None)
+        self.tick_sizes    = tick_sizes or {} # Key: asset_name, Value: tick_size of the share, if different from engine_kwargs
+        self.chunk_size    = chunk_size # number of bytes read from the input file at a time
+        self.keep_shards   = keep_shards # if False, the shards are deleted once they are merged
+        self.assets        = [] # asset_names of all shares in the input, set by run_with_file()
+
+    def run_with_file(self, file_name):
+        """
+        Top level function that runs the shares of the input file on the workers and merges their outputs
+        """
+        if is_binary_input(file_name):
+            raise ValueError("binary input files are replayed by OrderEngine, MultiOrderEngine only reads csv inputs")
+        start = time.perf_counter()
+        args  = [(file_name, shard, self.num_workers, self.shard_dir, self.engine_kwargs, self.tick_sizes, self.chunk_size)
+                 for shard in range(self.num_workers)]
+
+        if self.num_workers == 1:
+            assets = [run_shard(*args[0])]
+        else:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=self.num_workers) as executor:
+                assets = list(executor.map(run_shard, *zip(*args)))
+        self.assets = sorted([asset for shard_assets in assets for asset in shard_assets])
+
+        start_merge = time.perf_counter()
+        self.merge_shards()
+        if not self.keep_shards:
+            shutil.rmtree(self.shard_dir, ignore_errors=True)
+        end = time.perf_counter()
+
+        print(f"\n========================= {len(self.assets)} SHARES ON {self.num_workers} WORKERS =========================")
+        print(f"\n========================= PROGRAM COMPLETED IN: {end-start          :0.4f} SECONDS =======================")
+        print(f"\n========================= MERGING COMPLETED IN: {end-start_merge    :0.4f} SECONDS ========================")
+
+    def merge_shards(self):
+        """
+        Merges the output files of all shares into the output files under self.output_dir
+        """
+        # an engine that is never run, only used to get the file names and the outputs the engines of the shares produced
+        template = OrderEngine(**self.engine_kwargs)
+        for output, attribute in CSV_OUTPUTS.items():
+            if output in template.outputs:
+                file_name = getattr(template, attribute)
+                if template.output_format == "npy" and output in NPY_OUTPUTS:
+                    self.merge_npy(os.path.splitext(file_name)[0])
+                elif output in CONCAT_OUTPUTS:
+                    self.concat_csv(file_name)
+                else:
+                    self.merge_csv(file_name)
+        # bars and quotes are only recorded when the engines are given a bar_interval or a quote_depth, their rows start with a bist_time
+        # like the csv outputs
+        if template.bars is not None:
+            self.merge_csv(template.bars_file)
+        if template.quotes_stream is not None:
+            self.merge_csv(template.quotes_file)
+        for output, attribute in TEXT_OUTPUTS.items():
+            if output in template.outputs:
+                file_name = getattr(template, attribute)
+                self.merge_text(file_name)
+
+    def merge_csv(self, file_name):
+        """
+        Merges the csv file with the given name of all shares in order of bist_time, streaming through the files without loading them
+        """
+        files = [open(os.path.join(self.shard_dir, asset_dir(asset), file_name)) for asset in self.assets]
+        try:
+            header = None
+            rows   = []
+            for asset, f in zip(self.assets, files):
+                header = f.readline().rstrip("\n")
+                rows.append(self.csv_rows(asset, f))
+            with open(os.path.join(self.output_dir, file_name), "w") as out:
+                if header is not None:
+                    out.write("asset_name," + header + "\n")
+                for bist_time, asset, line in heapq.merge(*rows):
+                    out.write(asset + "," + line)
+        finally:
+            for f in files:
+                f.close()
+
+    def concat_csv(self, file_name):
+        """
+        Concatenates the csv file with the given name of all shares, with the header of the first one
+        """
+        with open(os.path.join(self.output_dir, file_name), "w") as out:
+            for i, asset in enumerate(self.assets):
+                with open(os.path.join(self.shard_dir, asset_dir(asset), file_name)) as f:
+                    header = f.readline()
+                    if i == 0:
+                        out.write(header)
+                    shutil.copyfileobj(f, out)
+
+    @staticmethod
+    def csv_rows(asset, f):
+        """
+        Yields the rows of the csv file of a share as (first column, asset_name, line) tuples, the order they are merged in
+        """
+        for line in f:
+            yield int(line.split(",", 1)[0]), asset, line
+
+    def merge_npy(self, dir_name):
+        """
+        Same as merge_csv() for the npy outputs saved to the directories with the given name, with an asset_name column added in front.
+        The columns are merged one at a time, each of them is loaded into memory for the merge
+        """
+        shards = [load_columns(os.path.join(self.shard_dir, asset_dir(asset), dir_name)) for asset in self.assets]
+        if not shards:
+            return
+        out_dir = os.path.join(self.output_dir, dir_name)
+        os.makedirs(out_dir, exist_ok=True)
+        names = ["asset_name"] + list(shards[0])
+        with open(os.path.join(out_dir, "columns.txt"), "w") as f:
+            f.write("".join([name + "\n" for name in names]))
+
+        # a stable sort keeps the rows with the same bist_time in order of asset_name, like merge_csv()
+        order = np.argsort(np.concatenate([columns["bist_time"] for columns in shards]), kind="stable")
+        for name in names:
+            if name == "asset_name":
+                column = np.concatenate([np.full(len(columns["bist_time"]), asset) for asset, columns in zip(self.assets, shards)])
+            else:
+                column = np.concatenate([columns[name] for columns in shards])
+            np.save(os.path.join(out_dir, name + ".npy"), column[order])
+
+    def merge_text(self, file_name):
+        """
+        Concatenates the text file with the given name of all shares, each one starting with the asset_name of the share
+        """
+        with open(os.path.join(self.output_dir, file_name), "w") as out:
+            for asset in self.assets:
+                out.write(f"\n================================= {asset} =================================\n")
+                with open(os.path.join(self.shard_dir, asset_dir(asset), file_name)) as f:
+                    shutil.copyfileobj(f, out)
+
+def asset_dir(asset):
+    """
+    Returns the name of the shard directory of a share, lines without an asset_name are saved under "_"
+    """
+    return asset if asset != "" else "_"
+
+def line_asset(line):
+    """
+    Returns the asset_name (the 4th field) of an input line without splitting it, the rest of the line if it is the last field,
+    and "" if the line has less than 4 fields
+    """
+    i = line.find(",")
+    if i >= 0:
+        i = line.find(",", i + 1)
+    if i >= 0:
+        i = line.find(",", i + 1)
+    if i < 0:
+        return ""
+    j = line.find(",", i + 1)
+    return line[i + 1:j] if j >= 0 else line[i + 1:]
+
+def run_shard(file_name, shard, num_shards, shard_dir, engine_kwargs, tick_sizes, chunk_size):
+    """
+    Worker function of MultiOrderEngine, runs the shares whose asset_name hashes to shard
+
+    Returns:
+        assets: list of str, asset_names of the shares run by this worker
+    """
+    router = ShardRouter(shard, num_shards, shard_dir, engine_kwargs, tick_sizes)
+    try:
+        router.match_file(file_name, chunk_size)
+    finally:
+        for engine in router.engines.values():
+            engine.save_to_file()
+    return list(router.engines)
+
+class ShardRouter(object):
+    """
+    Used by run_shard(), routes the lines of the input that belong to the shares of a shard to the OrderEngine of their share
+    """
+    def __init__(self, shard, num_shards, shard_dir, engine_kwargs, tick_sizes):
+        self.shard         = shard
+        self.num_shards    = num_shards
+        self.shard_dir     = shard_dir
+        self.engine_kwargs = engine_kwargs
+        self.tick_sizes    = tick_sizes
+        self.engines       = {} # Key: asset_name, Value: OrderEngine of the share
+        self.owned         = {} # Key: asset_name, Value: True if the share belongs to this shard
+        self.tot_bytes     = None
+        self.chunk_span    = None
+
+    def owns(self, asset):
+        owned = self.owned.get(asset)
+        if owned is None:
+            owned = self.owned[asset] = crc32(asset.encode()) % self.num_shards == self.shard
+        return owned
+
+    def get_engine(self, asset):
+        engine = self.engines.get(asset)
+        if engine is None:
+            kwargs = dict(self.engine_kwargs, output_dir=os.path.join(self.shard_dir, asset_dir(asset)))
+            if asset in self.tick_sizes:
+                kwargs["tick_size"] = self.tick_sizes[asset]
+            engine = self.engines[asset] = OrderEngine(**kwargs)
+            engine.tot_bytes  = self.tot_bytes
+            engine.chunk_span = self.chunk_span
+        return engine
+
+    def match_file(self, file_name, chunk_size):
+        self.tot_bytes = os.path.getsize(file_name)
+        first_line = 0
+        for start, end, lines in read_chunks(file_name, chunk_size):
+            self.chunk_span = (start, end, first_line, len(lines))
+            for engine in self.engines.values():
+                engine.chunk_span = self.chunk_span
+            end_of_file = self.process_lines(lines, first_line)
+            first_line += len(lines)
+            if end_of_file:
+                break
+        for engine in self.engines.values():
+            engine.log(engine.display_final())
+
+    def process_lines(self, lines, first_line):
+        """
+        Same as OrderEngine.process_lines(), but only the lines of the shares of this shard are split and parsed, each by the engine of its share
+        """
+        owns = self.owns
+        for i, line in enumerate(lines, first_line):
+            # terminate if we reach the end of the file
+            if line == "":
+                return True
+            asset = line_asset(line)
+            if not owns(asset):
+                continue
+            engine = self.get_engine(asset)
+            engine.process_line_record(i, engine.parse_fields(line.split(",")))
+        return False
@@ -1,50 +1,453 @@
-from io             import StringIO
 from LOB.OrderTypes import orderA, orderE, orderD
 from LOB.OrderTree  import OrderTree
+from LOB.OrderLadder import OrderLadder
+from LOB.OutputSink import OutputSink, CsvSink, NpySink, SinkWriter, GoldenSink, Divergence
+from LOB.BinaryInput import is_binary_input, read_binary_chunks, find_time_record, HEADER_SIZE, RECORD_DTYPE
+from LOB.Metrics    import Metrics
+from LOB.Bars       import BarAggregator, BARS_HEADER
+from sys            import intern
+from decimal        import Decimal
+from itertools      import compress, repeat
+from collections    import OrderedDict
+from functools      import partial
+import numpy as np
+import multiprocessing
 import os
-import concurrent.futures
+import pickle
 import time
 
+# Artifacts an OrderEngine can produce:
+# trades, market, lob, closed and rejects are the csv/text output files, log is the human-readable text output with the
+# order book printed after each trade, and progress is the line printed to stdout after each trade
+OUTPUTS      = ["trades", "market", "lob", "log", "closed", "rejects", "progress"]
+OUTPUT_MODES = {
+    "full": OUTPUTS,
+    "fast": ["trades", "market", "lob", "closed", "rejects"],
+}
+
+# Formats the NPY_OUTPUTS can be written in:
+# csv is the text format, npy writes each output to a directory with a NumPy .npy file for each column, see LOB.OutputSink.NpySink
+OUTPUT_FORMATS = ["csv", "npy"]
+NPY_OUTPUTS    = ["trades", "market", "lob"]
+
+# Attributes of OrderEngine holding the output streams, their offsets are saved in the checkpoints
+STREAMS = ["price_file_stream", "trades_file_stream", "output_stream", "lob_stream", "orderA_stream", "rejects_stream", "bars_stream", "quotes_stream"]
+
+# Version of the checkpoint format written by OrderEngine.checkpoint(), checkpoints of other versions can't be loaded
+CHECKPOINT_VERSION = 1
+
+# Columns of the closed orders file, a row for each orderA that was fully executed or canceled, written when it is closed.
+# order_stack lists the orderEs and orderDs of the orderA seperated by spaces, as E:bist_time:qty and D:bist_time, see format_order_stack()
+CLOSED_HEADER = "network_time,bist_time,asset_name,side,price,que_loc,qty,id,qty_not_executed,canceled,order_stack"
+
+# Columns of the book snapshot files written by OrderEngine.write_book_snapshot(), the columns of the input followed by the open qty:
+# an "A" row for each active orderA, with its qty_not_executed, and an "E" row for each orderE on the book, with its qty_not_matched,
+# in order of priority within each price level. A snapshot written by the engine starts with a "P" row, whose que_loc is the index
+# of the first input line not processed before it (the other fields are empty), snapshots made by other tools can leave it out
+SNAPSHOT_HEADER = "msg_type,network_time,bist_time,asset_name,side,price,que_loc,qty,id,qty_open"
+
+# Book implementations an OrderEngine can use for OpenBids and OpenAsks:
+# tree is the Red Black Tree based OrderTree, ladder is the array based OrderLadder for prices bounded within daily limits
+BOOK_TYPES = {
+    "tree": OrderTree,
+    "ladder": OrderLadder,
+}
+
+# Reasons an input line is rejected for, in the order parse_fields() and parse_lines() check them.
+# A line that fails none of them can still be rejected by the error of turning its fields into numbers.
+REJECT_REASONS = [
+    "quote_list must have 9 elements",
+    "msg_type must be either A, E or D",
+    "side must be either B or S",
+    "network_time must be a positive integer",
+    "bist_time must be a positive integer",
+    "id must be a positive integer",
+    "price must be a multiple of tick_size",
+]
+
+# Columns of the arrays returned by OrderEngine.process_batch(), with their dtypes. Prices are in integer ticks,
+# the index of a row is the index of the message it was produced by, and empty sides of the book have a price and qty of 0
+BATCH_COLUMNS = ["network_time", "bist_time", "msg_type", "side", "price", "que_loc", "qty", "id"]
+FILL_COLUMNS  = [("index", "i8"), ("bist_time", "i8"), ("price", "i8"), ("qty", "i8"), ("bid_id", "u8"), ("bid_time", "i8"), ("ask_id", "u8"), ("ask_time", "i8")]
+TOP_COLUMNS   = [("index", "i8"), ("bist_time", "i8"), ("bid_price", "i8"), ("bid_qty", "i8"), ("ask_price", "i8"), ("ask_qty", "i8")]
+REJECT_COLUMNS = [("index", "i8"), ("reason", object)]
+
+# Values of the reasons returned by OrderEngine.parse_columns() that aren't an index in REJECT_REASONS
+VALID_LINE = -1
+EMPTY_LINE = -2
+
 class InvalidOrder(Exception):
     """
     Raised when an incoming order line fails to match criteria set by OrderEngine.process_order()
     """
     pass
 
+def read_chunks(file_name, chunk_size, start=0):
+    """
+    Reads a file from the byte offset start in chunks of (about) chunk_size bytes, each of which is cut at the last line break in it.
+    Each chunk starts where the previous one was cut, so the chunks only depend on where the reading starts,
+    and resuming from the end of a chunk reads the same chunks as reading the whole file.
+
+    Yields:
+        start: int, byte offset of the first line of the chunk
+        end: int, byte offset right after the last line of the chunk
+        lines: list of str, lines of the chunk without the line breaks
+    """
+    offset = start
+    rest   = b""
+    with open(file_name, "rb") as f:
+        f.seek(start)
+        while True:
+            chunk = f.read(chunk_size - len(rest) if len(rest) < chunk_size else chunk_size)
+            if not chunk:
+                break
+            chunk = rest + chunk
+            cut   = chunk.rfind(b"\n") + 1
+            if cut == 0:
+                rest = chunk
+                continue
+            rest = chunk[cut:]
+            yield offset, offset + cut, chunk[:cut].decode().splitlines()
+            offset += cut
+    if rest:
+        yield offset, offset + len(rest), rest.decode().splitlines()
+
+def find_time_offset(file_name, start_time):
+    """
+    Finds where the lines with a bist_time after start_time begin in an input file sorted by bist_time, by bisection over its bytes,
+    so that only a few lines are read wherever the point is in the file. Lines without a valid bist_time are skipped while bisecting.
+
+    Returns:
+        offset: int, byte offset right after the last line with a bist_time of at most start_time, 0 if there is none
+        line: int, index of the line at offset
+    """
+    with open(file_name, "rb") as f:
+        def first_line_after(pos):
+            # (start, end, bist_time) of the first line starting at or after pos that has a bist_time, None if there is none
+            # the line that pos falls in (unless it starts right at pos) is skipped
+            f.seek(max(pos - 1, 0))
+            if pos > 0:
+                f.readline()
+                pos = f.tell()
+            for line in f:
+                fields = line.split(b",")
+                if len(fields) == 9:
+                    try:
+                        return pos, pos + len(line), int(fields[1])
+                    except ValueError:
+                        pass
+                pos += len(line)
+            return None
+
+        offset    = 0
+        low, high = 0, os.path.getsize(file_name)
+        while low < high:
+            middle = (low + high) // 2
+            found  = first_line_after(middle)
+            if found is not None and found[2] <= start_time:
+                offset = found[1]
+                low    = found[0] + 1
+            else:
+                high   = middle
+
+        # the line index is found by counting the line breaks before offset
+        line = 0
+        f.seek(0)
+        remaining = offset
+        while remaining > 0:
+            block = f.read(min(remaining, 1 << 20))
+            line += block.count(b"\n")
+            remaining -= len(block)
+    return offset, line
+
+def find_line_offset(file_name, line):
+    """
+    Returns the byte offset of the line at index line of an input file, found by counting the line breaks before it
+    """
+    offset = 0
+    with open(file_name, "rb") as f:
+        while line > 0:
+            block = f.read(1 << 20)
+            if not block:
+                break
+            count = block.count(b"\n")
+            if count < line:
+                line   -= count
+                offset += len(block)
+                continue
+            end = -1
+            for _ in range(line):
+                end = block.index(b"\n", end + 1)
+            return offset + end + 1
+    return offset
+
+def quote_csv(text):
+    """
+    Returns text as a quoted csv field, so that it can hold commas
+    """
+    return '"' + text.replace('"', '""') + '"'
+
+def to_columns(rows, columns):
+    """
+    Returns a list of rows as a dict of typed arrays, one for each of the (name, dtype) pairs of columns
+    """
+    values = list(zip(*rows)) if rows else [()] * len(columns)
+    return {name: np.array(column, dtype=dtype) for (name, dtype), column in zip(columns, values)}
+
+def format_order_stack(order_stack):
+    """
+    Returns the order_stack of a closed orderA as it is recorded in the closed orders file
+    """
+    return " ".join([f"E:{order.bist_time}:{order.qty}" if order.msg_type == "E" else f"D:{order.bist_time}" for order in order_stack])
+
+def records_from_columns(columns, reason):
+    """
+    Called by OrderEngine.parse_lines() and OrderEngine.parsed_chunks_concurrent(), zips the columns returned by OrderEngine.parse_columns()
+    into records, and puts them back in the order of the lines, between the InvalidOrders of the rejected lines and None for the empty ones
+    """
+    network_time, bist_time, msg_type, asset_name, side, price, que_loc, qty, id = columns
+    # asset_name is interned, so that all the orders of a share point to the same string
+    records = list(zip(network_time, bist_time, msg_type, map(intern, asset_name), side, price, que_loc, qty, id))
+    valid   = reason == VALID_LINE
+    if valid.all():
+        return records
+
+    parsed = [None] * len(reason)
+    for i, record in zip(np.flatnonzero(valid).tolist(), records):
+        parsed[i] = record
+    for i in np.flatnonzero(reason >= 0).tolist():
+        parsed[i] = InvalidOrder(REJECT_REASONS[reason[i]])
+    return parsed
+
+def pack_columns(columns):
+    """
+    Called by parse_chunks(), turns the columns returned by OrderEngine.parse_columns() into numpy arrays, so that they are sent to the
+    matching process as a few buffers instead of a python object for each field. asset_name is sent as codes into the list of the names.
+
+    Returns:
+        packed: tuple of the arrays, read back by unpack_columns(), or None if a number doesn't fit in 64 bits
+    """
+    network_time, bist_time, msg_type, asset_name, side, price, que_loc, qty, id = columns
+    names = {}
+    codes = [names.setdefault(name, len(names)) for name in asset_name]
+    try:
+        ints = np.array([network_time, bist_time, price, que_loc, qty], dtype=np.int64).reshape(5, len(id))
+        ids  = np.array(id, dtype=np.uint64)
+    except OverflowError:
+        return None
+    return ints, ids, np.array(msg_type, dtype="U1"), np.array(side, dtype="U1"), np.array(codes, dtype=np.int32), list(names)
+
+def unpack_columns(packed):
+    """
+    Called by OrderEngine.parsed_chunks_concurrent(), returns the columns packed by pack_columns()
+    """
+    ints, ids, msg_type, side, codes, names = packed
+    network_time, bist_time, price, que_loc, qty = ints.tolist()
+    asset_name = list(map(names.__getitem__, codes.tolist()))
+    return [network_time, bist_time, msg_type.tolist(), asset_name, side.tolist(), price, que_loc, qty, ids.tolist()]
+
+def parse_chunks(file_name, chunk_size, tick_size, parsed_queue, start=0):
+    """
+    Parse stage of OrderEngine's concurrent_mode, runs in its own process and puts the parsed chunks of the input file on parsed_queue
+
+    Puts (start, end, packed, reason) for each chunk, where packed and reason are the columns and reasons returned by
+    OrderEngine.parse_columns(), packed into arrays by pack_columns(). The rare chunks that can't be packed (a field that should be
+    a number isn't one, or doesn't fit in 64 bits) are put as the list returned by OrderEngine.parse_lines(), with a reason of None.
+    Then puts None once the input is over, or the exception that stopped the parsing.
+    """
+    try:
+        # an engine without outputs, only used for its parse_columns()
+        parser = OrderEngine(output_mode=[], tick_size=tick_size)
+        for chunk_start, end, lines in read_chunks(file_name, chunk_size, start):
+            columns, reason = parser.parse_columns(lines)
+            packed = None if columns is None else pack_columns(columns)
+            if packed is None:
+                parsed_queue.put((chunk_start, end, parser.parse_lines(lines), None))
+            else:
+                parsed_queue.put((chunk_start, end, packed, reason))
+            # nothing after the empty line that ends the input is processed
+            if (reason == EMPTY_LINE).any():
+                break
+        parsed_queue.put(None)
+    except Exception as e:
+        parsed_queue.put(e)
+
 class OrderEngine(object):
     """
     Saves the market as well as the trade data to a new directory called "output" (creates it if it doesn't exist)
     Default file names are "market_data.csv" and "trades.csv"
+    Each output is streamed to its file through an OutputSink, which is flushed every flush_size entries
     
     ASSUMPTIONS:
     1- Column order_id, together with bist_time uniquely identifies the orderE, thus there cannot be orderEs with the same order_id and bist_time 
     """
-    def __init__(self, debug_mode=False, concurrent_mode=False, price_file="market_data.csv", trades_file="trades.csv", order_book_file="LOB.txt", orderA_file="closed_orders.txt", lob_file="LOB.csv"):
+    def __init__(self, debug_mode=False, concurrent_mode=False, price_file="market_data.csv", trades_file="trades.csv", order_book_file="LOB.txt", orderA_file="closed_orders.txt", lob_file="LOB.csv", rejects_file="rejects.csv", output_dir="output", flush_size=4096, chunk_size=1 << 20, lob_depth=3, output_mode="full", tick_size=0.01, book_type="tree", ladder_levels=1024, price_limits=None, queue_size=8, output_format="csv", checkpoint_file=None, checkpoint_every=None, checkpoint_interval=None, closed_cache_size=0, metrics=False, metrics_file=None, metrics_interval=60, golden_dir=None, bar_interval=None, bars_file="bars.csv", quote_depth=None, quote_throttle=0, quotes_file="quotes.csv"):
         self.debug_mode          = debug_mode # if True, prints the order book, closed_orderAs and active_orderAs after processing each order
-        self.concurrent_mode       = concurrent_mode # if True, all parallelized versions of the functions will be used inside run_with_file()
+        self.concurrent_mode     = concurrent_mode # if True, parsing and writing the outputs run in their own stages, in parallel with matching
+        self.queue_size          = queue_size # number of parsed chunks, and of flushed buffers, the queues between the stages of concurrent_mode hold
         self.price_file          = price_file # file name where the market info will be recorded
         self.trades_file         = trades_file # file name where the trades will be recorded
         self.order_book_file     = order_book_file # file name where the order book (as well as other output) will be recorded
-        self.price_file_stream   = StringIO() # stream where the market info will be recorded
-        self.trades_file_stream  = StringIO() # stream where the trades will be recorded
-        self.output_stream       = StringIO() # stream where the output will be recorded
-        self.lob_stream          = StringIO() # stream where the order book will be recorded
-        self.OpenBids            = OrderTree(isbid=True)
-        self.OpenAsks            = OrderTree(isbid=False)
+        self.orderA_file         = orderA_file # file name where the orderA's will be recorded
+        self.lob_file            = lob_file # file name where the order book will be recorded
+        self.rejects_file        = rejects_file # file name where the invalid orders will be recorded, with their line numbers and reasons
+        self.output_dir          = output_dir # directory where all the output files are saved
+        self.flush_size          = flush_size # number of lines each output stream holds in memory before flushing them to its file
+        self.chunk_size          = chunk_size # number of bytes read from the input file at a time
+        self.lob_depth           = lob_depth # number of best price levels of each side recorded in the lob file
+        self.tick_size           = tick_size # smallest price increment of the instrument, prices of all price bands must be multiples of it
+        self.price_decimals      = max(0, -Decimal(str(tick_size)).as_tuple().exponent) # number of decimals of the prices written to the outputs
+        self.outputs             = self.get_outputs(output_mode) # names of the artifacts that are produced, see OUTPUTS
+        self.print_progress      = "progress" in self.outputs # if True, prints the progress to stdout after each trade
+        self.output_format       = output_format # one of OUTPUT_FORMATS, format of the trades, market and lob outputs
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"output_format must be one of {OUTPUT_FORMATS}")
+        self.golden_dir          = golden_dir # verification mode, if not None the trades, market and lob outputs are checked against the files with the same names in it instead of being written, see verify_with_file()
+        if golden_dir is not None and output_format != "csv":
+            raise ValueError("only csv outputs can be verified against golden files")
+        # the streams of the artifacts that are not produced are None
+        self.price_file_stream   = None # stream where the market info will be recorded
+        self.trades_file_stream  = None # stream where the trades will be recorded
+        self.output_stream       = None # stream where the output will be recorded
+        self.lob_stream          = None # stream where the order book will be recorded
+        self.orderA_stream       = None # stream where the closed orderA's will be recorded
+        self.rejects_stream      = None # stream where the invalid orders will be recorded
+        self.bars_stream         = None # stream where the bars will be recorded
+        self.quotes_stream       = None # stream where the changes of the best levels will be recorded
+        # in concurrent_mode the streams hand their flushed buffers over to the writer stage instead of writing them themselves
+        self.sink_writer         = SinkWriter(queue_size) if concurrent_mode and self.outputs else None
+        writer                   = self.sink_writer
+        if output_format == "npy":
+            self.price_file_stream, self.trades_file_stream, self.lob_stream = self.npy_streams(writer)
+        else:
+            self.price_file_stream, self.trades_file_stream, self.lob_stream = self.csv_streams(writer)
+        if "log" in self.outputs:
+            self.output_stream      = OutputSink(os.path.join(output_dir, order_book_file), flush_size, writer=writer)
+        if "closed" in self.outputs:
+            self.orderA_stream      = CsvSink(os.path.join(output_dir, orderA_file), flush_size, header=CLOSED_HEADER, writer=writer,
+                                              converters={4: self.ticks_to_price, 10: format_order_stack})
+        if "rejects" in self.outputs:
+            self.rejects_stream     = CsvSink(os.path.join(output_dir, rejects_file), flush_size, header="line,reason", writer=writer, converters={1: quote_csv})
+        self.bars_file           = bars_file # file name where the bars will be recorded
+        self.bar_interval        = bar_interval # length of the bars in seconds of bist_time, no bars are made if None, see LOB.Bars.BarAggregator
+        self.bars                = None # BarAggregator fed with the trades and the top of the book after each E and D message
+        if bar_interval is not None:
+            to_price, to_mean_price = self.ticks_to_price, self.ticks_to_mean_price
+            self.bars_stream        = CsvSink(os.path.join(output_dir, bars_file), flush_size, header=BARS_HEADER, writer=writer,
+                                              converters={1: to_price, 2: to_price, 3: to_price, 4: to_price, 6: to_mean_price, 8: to_mean_price})
+            self.bars               = BarAggregator(round(bar_interval * 1e9), self.bars_stream)
+        self.book_type           = book_type # key of BOOK_TYPES, selects the data structure of OpenBids and OpenAsks
+        self.ladder_levels       = ladder_levels # number of price levels of each side if book_type is "ladder", centered on the first price of the side
+        self.price_limits        = price_limits # (low, high) prices of the daily price band, if set the ladders cover this band instead
+        self.OpenBids            = self.new_book(isbid=True)
+        self.OpenAsks            = self.new_book(isbid=False)
+        self.quotes_file         = quotes_file # file name where the changes of the best levels will be recorded
+        self.quote_depth         = quote_depth # number of best levels of each side whose changes are recorded, no quotes are recorded if None
+        self.quote_throttle      = round(quote_throttle * 1e9) # nanoseconds of bist_time, at most one quote is recorded in each window of this length
+        self.last_quote          = None # levels of the last row written to the quotes stream
+        self.pending_quote       = None # last row of the current throttle window, not written yet
+        if quote_depth is not None:
+            to_price = self.ticks_to_price
+            self.quotes_stream      = CsvSink(os.path.join(output_dir, quotes_file), flush_size, header=self.lob_header(quote_depth), writer=writer,
+                                              converters={i: to_price for i in range(1, 4 * quote_depth, 2)})
+            # the books are empty, which their best levels start as
+            self.OpenBids.watch_top(quote_depth, ())
+            self.OpenAsks.watch_top(quote_depth, ())
         self.trades              = [] # A list of trades that have been matched
-        self.closed_orderAs      = [] # List of orderA's that have been fully matched or canlceled, which esentially contains other orders
+        self.num_closed_orderAs  = 0  # Number of orderA's that have been fully matched or canceled, which are written to orderA_stream as soon as they are closed
+        self.closed_cache_size   = closed_cache_size # number of the most recently closed orderA's kept in closed_orderAs, for debugging
+        self.closed_orderAs      = OrderedDict() if closed_cache_size > 0 else None # Key: order id, Value: recently closed orderA, oldest first
         self.active_orderAs      = {} # A dict of orderA objects that are not yet fully matched, key = order id, value = order object
         self.time_series         = [] # A list of dicts, each dict contains the order book at a specific time
         self.last_trades         = [] # A list of last trades that have been matched
         self.last_line           = None # Counter for the last line index that was processed
-        self.tot_lines           = None # Total number of lines in the file
-        self.orderA_file         = orderA_file # file name where the orderA's will be recorded
-        self.lob_file            = lob_file # file name where the order book will be recorded
+        self.tot_bytes           = None # Size of the input file in bytes
+        self.chunk_span          = None # (start offset, end offset, first line index, number of lines) of the chunk being processed, used to report progress
+        self.start_offset        = 0    # byte offset of the input file where match_file() starts reading, set by load_checkpoint()
+        self.start_line          = 0    # index of the line at start_offset
+        self.checkpoint_file     = checkpoint_file # file where the state of the engine is saved by checkpoint(), no checkpoints are saved if None
+        self.checkpoint_every    = checkpoint_every # number of lines after which a checkpoint is saved
+        self.checkpoint_interval = checkpoint_interval # number of seconds after which a checkpoint is saved
+        self.checkpoint_line     = 0    # index of the first line after the last checkpoint
+        self.checkpoint_time     = time.perf_counter() # time of the last checkpoint
+        # opt-in instrumentation, see LOB.Metrics, giving a metrics_file enables it. Without it nothing is wrapped or recorded
+        self.metrics             = Metrics(metrics_file, metrics_interval) if metrics or metrics_file is not None else None
+        if self.metrics is not None:
+            self.metrics.instrument(self, [getattr(self, name) for name in STREAMS if getattr(self, name) is not None])
+
+    @staticmethod
+    def get_outputs(output_mode):
+        """
+        Arguments:
+            output_mode: str, one of the keys of OUTPUT_MODES, or a list of names from OUTPUTS
+        Returns:
+            outputs: set of the names of the artifacts that will be produced
+        """
+        if isinstance(output_mode, str):
+            if output_mode not in OUTPUT_MODES:
+                raise ValueError(f"output_mode must be one of {list(OUTPUT_MODES)} or a list of names from {OUTPUTS}")
+            return set(OUTPUT_MODES[output_mode])
+        outputs = set(output_mode)
+        unknown = outputs.difference(OUTPUTS)
+        if unknown:
+            raise ValueError(f"Unknown outputs {sorted(unknown)}, must be from {OUTPUTS}")
+        return outputs
+
+    def csv_streams(self, writer):
+        """
+        Returns the market, trades and lob streams in csv format, None for the ones that are not produced
+        """
+        price_file_stream, trades_file_stream, lob_stream = None, None, None
+        # the books keep prices as integer ticks, which are turned back into prices when the csv rows are formatted
+        to_price = self.ticks_to_price
+        # in verification mode the rows are checked against the golden files as they are written
+        Sink = CsvSink if self.golden_dir is None else partial(GoldenSink, golden_dir=self.golden_dir)
+        if "market" in self.outputs:
+            price_file_stream  = Sink(os.path.join(self.output_dir, self.price_file), self.flush_size, header="bist_time,ask,bid,volume", writer=writer, converters={1: to_price, 2: to_price})
+        if "trades" in self.outputs:
+            trades_file_stream = Sink(os.path.join(self.output_dir, self.trades_file), self.flush_size, header="bist_time,price,qty,bid_id,bid_time,ask_id,ask_time,", writer=writer, converters={1: to_price})
+        if "lob" in self.outputs:
+            lob_stream         = Sink(os.path.join(self.output_dir, self.lob_file), self.flush_size, header=self.lob_header(), writer=writer, converters={i: to_price for i in range(1, 4 * self.lob_depth, 2)})
+        return price_file_stream, trades_file_stream, lob_stream
 
-        # add columns to the price file
-        self.price_file_stream.write("bist_time,ask,bid,volume\n")
-        self.trades_file_stream.write("bist_time,price,qty,bid_key,ask_key,\n")
-        self.lob_stream.write("bist_time,ask_price1,ask_vol1,ask_price2,ask_vol2,ask_price3,ask_vol3,bid_price1,bid_vol1,bid_price2,bid_vol2,bid_price3,bid_vol3\n") 
+    def npy_streams(self, writer):
+        """
+        Returns the market, trades and lob streams in npy format, None for the ones that are not produced.
+        Each one is saved to a directory named after its file name without the extension, e.g. output/trades for trades.csv
+        """
+        price_file_stream, trades_file_stream, lob_stream = None, None, None
+        # prices are turned from integer ticks into prices for the whole column at once
+        to_price = self.ticks_to_prices
+        if "market" in self.outputs:
+            columns = [("bist_time", "i8"), ("ask", "f8"), ("bid", "f8"), ("volume", "i8")]
+            price_file_stream  = NpySink(self.npy_dir(self.price_file), columns, self.flush_size, writer=writer, converters={1: to_price, 2: to_price})
+        if "trades" in self.outputs:
+            columns = [("bist_time", "i8"), ("price", "f8"), ("qty", "i8"), ("bid_id", "u8"), ("bid_time", "i8"), ("ask_id", "u8"), ("ask_time", "i8")]
+            trades_file_stream = NpySink(self.npy_dir(self.trades_file), columns, self.flush_size, writer=writer, converters={1: to_price})
+        if "lob" in self.outputs:
+            names   = self.lob_header().split(",")
+            columns = [(name, "f8" if "price" in name else "i8") for name in names]
+            lob_stream         = NpySink(self.npy_dir(self.lob_file), columns, self.flush_size, writer=writer, converters={i: to_price for i in range(1, 4 * self.lob_depth, 2)})
+        return price_file_stream, trades_file_stream, lob_stream
+
+    def npy_dir(self, file_name):
+        """
+        Returns the path of the directory an npy output is saved to
+        """
+        return os.path.join(self.output_dir, os.path.splitext(file_name)[0])
+
+    def new_book(self, isbid):
+        """
+        Returns an empty book for one side of the market, of the type selected by self.book_type
+        """
+        if self.book_type not in BOOK_TYPES:
+            raise ValueError(f"book_type must be one of {list(BOOK_TYPES)}")
+        if self.book_type == "ladder":
+            if self.price_limits is None:
+                return OrderLadder(isbid, num_levels=self.ladder_levels)
+            low, high = map(self.price_to_ticks, self.price_limits)
+            return OrderLadder(isbid, num_levels=high - low + 1, base_price=low)
+        return BOOK_TYPES[self.book_type](isbid)
 
     def run_with_file(self, file_name):
         """
@@ -53,101 +456,550 @@ class OrderEngine(object):
         # start the timer, use perf_counter() for high resolution timer
         start = time.perf_counter()
 
-        num_lines = 0
-        with open(file_name, "r") as f:
-            num_lines = sum(1 for line in f)
-        self.tot_lines = num_lines
+        self.tot_bytes = os.path.getsize(file_name)
 
-
-        with open(file_name, "r") as f:
-            for i, l in enumerate(f):
-                self.last_line = i
-                
-                # terminate if we reach the end of the file
-                if l in ["", "\n"] or (i == num_lines-1): 
-                    self.output_stream.write("\n================================= END OF FILE REACHED =================================")
-                    print("\n================================= END OF FILE REACHED =================================")
-                    print("\n================================ SAVED FILES TO /output ===============================")
-                    print()
-                    break
-
-                try:
-                    self.process_order(l)
-                except InvalidOrder as e:
-                    # This error doesn't raise any exception, so we ignore the invalid order and process the next one
-                    self.output_stream.write(f'\nInvalid order at line {(i+1)} due to \n==> {e}')
-                except Exception as e :
-                    self.output_stream.write(f'\nError: "{e}" at line {(i+1)}')
-                    self.output_stream.write("\nPrinting Order Book and exiting...")
-                    self.output_stream.write(str(self))
-                    raise e
-            self.output_stream.write(self.display_final())
-
-        # record start of the save_to_file for timing
-        start_save = time.perf_counter() 
-        if self.concurrent_mode:
-            self.save_to_file_concurrent()
-        else:
-            self.save_to_file()
+        try:
+            self.match_file(file_name)
+        finally:
+            # record start of the save_to_file for timing
+            # the outputs are also saved if the run fails, so that everything processed so far ends up on disk
+            start_save = time.perf_counter() 
+            if self.concurrent_mode:
+                self.save_to_file_concurrent()
+            else:
+                self.save_to_file()
+            if self.metrics is not None:
+                self.metrics.dump(line=self.last_line, final=True)
         # stop the timer
         end = time.perf_counter()
 
         print("\n============================== DISPLAYING CONFIGURATIONS ==============================")
         print("DEBUG_MODE    :", self.debug_mode)
         print("CONCURRENT_MODE :", self.concurrent_mode)
+        print("BOOK_TYPE     :", self.book_type)
+        print("OUTPUTS       :", ", ".join([x for x in OUTPUTS if x in self.outputs]))
         print("INPUT_FILE    :", file_name)
         # print the time it took to run the OrderEngine
         print(f"\n========================= PROGRAM COMPLETED IN: {end-start    :0.4f} SECONDS =======================")
         print(f"\n========================= SAVING COMPLETED IN: {end-start_save:0.4f} SECONDS =========================")
 
-    def process_order(self, line):
+    def verify_with_file(self, file_name):
         """
-        Top level method that processes the incoming order
-        Processes a line from the input file, turns into order and calls the right method depending on the msg_type
+        Verification mode, to check that a change to the books or the matching doesn't change any output.
+        Runs the engine on the input file like run_with_file(), on an engine created with a golden_dir, so that its trades, market
+        and lob outputs are checked against the golden files row by row as they are produced (see LOB.OutputSink.GoldenSink),
+        in a single pass that never holds the outputs in memory. The run stops at the first row that differs.
+
+        Returns:
+            divergence: None if all the outputs match their golden files, otherwise the dict returned by divergence_report()
         """
-        quote_list = line.strip("\n").split(",")
+        if self.golden_dir is None:
+            raise ValueError("verify_with_file() needs an OrderEngine created with a golden_dir")
+        golden_streams = [stream for stream in [self.price_file_stream, self.trades_file_stream, self.lob_stream] if stream is not None]
+        if not golden_streams:
+            raise ValueError("none of the trades, market and lob outputs is produced, there is nothing to verify")
+        # the record being processed is kept, to report the message that produced a divergent row
+        self.last_record = None
+        process_record = self.process_record
+        def remember_record(record):
+            self.last_record = record
+            process_record(record)
 
-        keys_list  = ["network_time", "bist_time", "msg_type", "asset_name", "side", "price", "que_loc", "qty", "id"]
-        quote_dict = dict(zip(keys_list, quote_list))
-        msg_type = quote_dict["msg_type"]
-        side     = quote_dict["side"]
-        self.last_trades = []
+        start = time.perf_counter()
+        self.tot_bytes = os.path.getsize(file_name)
+        divergence = None
+        self.process_record = remember_record
+        try:
+            try:
+                self.match_file(file_name)
+                # the golden files with lines left diverge at the first of them
+                for stream in golden_streams:
+                    stream.close()
+            except Divergence:
+                # only the first divergence is reported, the other golden files are left where they are
+                for stream in golden_streams:
+                    stream.stop()
+                raise
+            finally:
+                # the engine processes its records as usual after the verification, whether it passed, diverged or failed
+                self.process_record = process_record
+                if self.concurrent_mode:
+                    self.save_to_file_concurrent()
+                else:
+                    self.save_to_file()
+        except Divergence as e:
+            divergence = self.divergence_report(e)
+        end = time.perf_counter()
+
+        print(f"\n========================= VERIFICATION COMPLETED IN: {end-start:0.4f} SECONDS ====================")
+        if divergence is None:
+            print(f"All outputs match the golden files in {self.golden_dir}")
+        else:
+            print(f"\n{divergence['error']}")
+            print(f"At line {divergence['input_line']} of {file_name}: {divergence['message']}")
+            print("Book when the row was produced:")
+            for side in ["asks", "bids"]:
+                print(f"  {side}: " + ", ".join([f"{volume} @ {price}" for price, volume in divergence[side]]))
+        return divergence
+
+    def divergence_report(self, divergence, depth=10):
+        """
+        Called by verify_with_file(), describes a divergence with the message that produced it and the book at that point
+
+        Arguments:
+            divergence: LOB.OutputSink.Divergence
+            depth: int, number of best price levels of each side in the report
+        Returns:
+            report: dict with the golden file, the number of its line that differs, the expected and actual lines, the line of the input
+                    (starting from 1) and its message, and the best levels of the asks and bids as (price, volume) pairs
+        """
+        record = self.last_record
+        if record is not None:
+            record = list(record)
+            record[5] = self.ticks_to_price(record[5])
+        to_price = self.ticks_to_price
+        return {
+            "error": str(divergence),
+            "golden_file": divergence.golden_path,
+            "golden_line": divergence.line_number,
+            "expected": divergence.expected.rstrip("\n"),
+            "actual": divergence.actual.rstrip("\n"),
+            "input_line": None if self.last_line is None else self.last_line + 1,
+            "message": None if record is None else ",".join([str(x) for x in record]),
+            "asks": [(to_price(price), volume) for price, volume in self.OpenAsks.top_levels(depth)],
+            "bids": [(to_price(price), volume) for price, volume in self.OpenBids.top_levels(depth)],
+        }
+
+    def resume_from(self, checkpoint_file, file_name):
+        """
+        Top level function like run_with_file(), that restores the state of the engine from a checkpoint saved by a previous run
+        on the same input file, and runs the rest of the file from where the checkpoint was saved.
+        The outputs of the previous run are cut back to where they were at the checkpoint, and the new outputs are appended to them,
+        so they end up the same as the outputs of a single run.
+        The engine must be created with the same arguments as the one that saved the checkpoint.
+        """
+        self.load_checkpoint(checkpoint_file)
+        self.run_with_file(file_name)
+
+    def run_from_book(self, book_file, file_name, start_time=None):
+        """
+        Top level function like run_with_file(), that starts from an initial book instead of an empty one, and only runs the lines
+        of the input file after it, so that a session can be picked up intraday without replaying it from its start.
+
+        book_file is either a checkpoint saved by checkpoint() or a book snapshot file written by write_book_snapshot().
+        The lines run are the ones with a bist_time after start_time, found by bisecting the input file, see find_time_offset().
+        As all the lines with a bist_time of start_time are taken as processed, a book taken in the middle of the lines of a bist_time
+        (the input often has thousands of lines with the same one) must be run from the exact line after it instead:
+        leave start_time as None to run the lines after the one the checkpoint was saved at, or the snapshot was written at.
+        Unlike resume_from(), the outputs only hold what happens after the start, the ones of a previous run are overwritten.
+        """
+        with open(book_file, "rb") as f:
+            # pickles start with the PROTO opcode, snapshot files with their header
+            is_checkpoint = f.read(1) == b"\x80"
+        if is_checkpoint:
+            self.load_checkpoint(book_file, truncate_outputs=False)
+        else:
+            next_line = self.load_book_snapshot(book_file)
+            if start_time is None:
+                if next_line is None:
+                    raise ValueError("start_time must be given to run from a book snapshot file without a P row")
+                self.start_line   = next_line
+                self.start_offset = (HEADER_SIZE + next_line * RECORD_DTYPE.itemsize if is_binary_input(file_name)
+                                     else find_line_offset(file_name, next_line))
+                self.checkpoint_line = self.start_line
+
+        if start_time is not None:
+            if is_binary_input(file_name):
+                self.start_offset, self.start_line = find_time_record(file_name, start_time)
+            else:
+                self.start_offset, self.start_line = find_time_offset(file_name, start_time)
+            self.checkpoint_line = self.start_line
+        self.run_with_file(file_name)
+
+    def match_file(self, file_name):
+        """
+        Called by run_with_file(), reads the input file once, chunk by chunk, and processes the orders in it
+        """
+        first_line = self.start_line
+        chunks     = self.parsed_chunks(file_name)
+        # the writer thread of concurrent_mode is started once the parser process is running, see parsed_chunks_concurrent()
+        if self.sink_writer is not None:
+            self.sink_writer.start()
+        for start, end, parsed in chunks:
+            self.chunk_span = (start, end, first_line, len(parsed))
+            end_of_file = self.process_parsed(parsed, first_line)
+            first_line += len(parsed)
+            if end_of_file:
+                break
+            # checkpoints are only saved between chunks, where the state of the engine matches a byte offset of the input
+            if self.checkpoint_due(first_line):
+                self.checkpoint(end, first_line)
+            if self.metrics is not None:
+                self.metrics.maybe_dump(line=first_line)
+        else:
+            self.log("\n================================= END OF FILE REACHED =================================")
+            print("\n================================= END OF FILE REACHED =================================")
+        print("\n================================ SAVED FILES TO /output ===============================")
+        print()
+        self.log(self.display_final())
+
+    def read_chunks(self, file_name):
+        """
+        Called by match_file(), reads the input file in chunks of self.chunk_size bytes, see read_chunks()
+        """
+        return read_chunks(file_name, self.chunk_size, self.start_offset)
+
+    def parsed_chunks(self, file_name):
+        """
+        Called by match_file(), yields (start, end, parsed) for each chunk of the input file, see read_chunks() and parse_lines()
 
+        In concurrent_mode the chunks are parsed by parse_chunks() in a seperate process while the previous chunks are being matched,
+        otherwise each chunk is parsed right before it is matched.
+        Binary input files written by LOB.BinaryInput.convert_to_binary() are replayed without any parsing, see binary_chunks().
+        """
+        if is_binary_input(file_name):
+            return self.binary_chunks(file_name)
+        if self.concurrent_mode:
+            return self.parsed_chunks_concurrent(file_name)
+        return ((start, end, self.parse_lines(lines)) for start, end, lines in self.read_chunks(file_name))
+
+    def parsed_chunks_concurrent(self, file_name):
+        """
+        Parallel version of parsed_chunks(), the parse stage runs in a process (parsing is pure python, so a thread would hold the GIL)
+        and passes the parsed chunks through a queue of at most self.queue_size chunks, so it doesn't run too far ahead of matching.
+        The chunks come as numpy columns (see parse_chunks()), only zipped into records here.
+        The process is started right away, before the writer thread of the outputs, so it isn't forked from a process running threads
+        """
+        parsed_queue = multiprocessing.Queue(maxsize=self.queue_size)
+        parser = multiprocessing.Process(target=parse_chunks, args=(file_name, self.chunk_size, self.tick_size, parsed_queue, self.start_offset), daemon=True)
+        parser.start()
+        return self.receive_chunks(parser, parsed_queue)
+
+    def receive_chunks(self, parser, parsed_queue):
+        """
+        Called by parsed_chunks_concurrent(), yields the chunks put on parsed_queue by the parser process as (start, end, parsed)
+        """
         try:
-            assert len(quote_list) == 9        , "quote_list must have 9 elements"
-            assert msg_type in ['A', 'E', 'D'] , "msg_type must be either A, E or D"
-            assert side in ['B', 'S']          , "side must be either B or S"
+            while True:
+                item = parsed_queue.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                start, end, packed, reason = item
+                yield start, end, packed if reason is None else records_from_columns(unpack_columns(packed), reason)
+        finally:
+            # the parser may still be blocked on the queue if matching stopped early
+            parser.terminate()
+            parser.join()
+
+    def binary_chunks(self, file_name):
+        """
+        Version of parsed_chunks() for binary input files, yields the records of the file read by LOB.BinaryInput.read_binary_chunks(),
+        with the records of the lines that failed to be parsed turned back into InvalidOrders
+        """
+        for start, end, records, invalid in read_binary_chunks(file_name, self.chunk_size, self.tick_size, self.start_offset):
+            for i, message in invalid:
+                records[i] = InvalidOrder(message)
+            yield start, end, records
+
+    def parse_lines(self, lines):
+        """
+        Parses and validates all the lines of a chunk at once, called by parsed_chunks()
+
+        The lines are parsed into columns by parse_columns(), which are then zipped into the records.
+        If a field that should be a number isn't one, the chunk is parsed again line by line with parse_fields(), to reject the line with the same error.
+
+        Arguments:
+            lines: list of str, lines of the input file
+        Returns:
+            parsed: list with the value parse_fields() returns for each line, a record, None (for an empty line) or an InvalidOrder
+        """
+        columns, reason = self.parse_columns(lines)
+        if columns is None:
+            return [self.parse_fields(l.split(",")) for l in lines]
+        return records_from_columns(columns, reason)
+
+    def parse_columns(self, lines):
+        """
+        Called by parse_lines() and parse_chunks(), parses and validates all the lines of a chunk into the columns of their records
+
+        The checks of parse_fields() are run on whole columns of the chunk with numpy masks, and only the rows that pass them
+        are turned into numbers, so no exception is raised for the invalid rows.
+
+        Arguments:
+            lines: list of str, lines of the input file
+        Returns:
+            columns: list of the 9 columns of the records of the valid lines, in the order of the fields of a record, as lists,
+                     None if a field that should be a number isn't one
+            reason: numpy array, index in REJECT_REASONS of the first check each line failed, VALID_LINE for the valid lines
+                    and EMPTY_LINE for the empty ones
+        """
+        n = len(lines)
+        # index in REJECT_REASONS of the first check each row fails, -1 for the rows that pass all of them
+        reason = np.full(n, VALID_LINE, dtype=np.int8)
+        if n == 0:
+            return [[] for _ in range(9)], reason
+        sizes  = np.fromiter(map(str.count, lines, repeat(",")), dtype=np.int64, count=n) + 1
+        empty  = None
+        if not (sizes == 9).all():
+            reason[sizes != 9] = 0
+            empty = np.array([l == "" for l in lines], dtype=bool)
+            # rows with the wrong number of fields are replaced by empty ones, so the columns line up
+            lines = [l if size == 9 else ",,,,,,,," for l, size in zip(lines, sizes.tolist())]
+        # the fields of all rows are split at once, each column is then a slice of them
+        fields  = ",".join(lines).split(",")
+        columns = [fields[i::9] for i in range(9)]
+
+        # the columns are compared as object arrays, which compare the strings in place instead of copying them into a numpy string array
+        msg_types = np.array(columns[2], dtype=object)
+        sides     = np.array(columns[4], dtype=object)
+        checks = [
+            (msg_types != "A") & (msg_types != "E") & (msg_types != "D"),
+            (sides != "B") & (sides != "S"),
+            np.array(columns[0], dtype=object) == "0",
+            np.array(columns[1], dtype=object) == "0",
+            np.array(columns[8], dtype=object) == "0",
+        ]
+        for code, failed in enumerate(checks, 1):
+            reason[(reason < 0) & failed] = code
+
+        valid = reason < 0
+        if not valid.all():
+            selected = valid.tolist()
+            columns  = [list(compress(column, selected)) for column in columns]
+        if empty is not None:
+            reason[empty] = EMPTY_LINE
+        network_time, bist_time, msg_type, asset_name, side, price, que_loc, qty, id = columns
+
+        try:
+            prices = np.array(list(map(float, price)), dtype=np.float64)
+            if not np.isfinite(prices).all():
+                raise ValueError(price)
+            ints = [list(map(int, column)) for column in (network_time, bist_time, que_loc, qty, id)]
+        except ValueError:
+            return None, reason
+        network_time, bist_time, que_loc, qty, id = ints
+
+        ticks = np.round(prices / self.tick_size)
+        on_grid = np.abs(ticks * self.tick_size - prices) < 1e-9 * (1 + prices)
+        columns = [network_time, bist_time, msg_type, asset_name, side, ticks.astype(np.int64).tolist(), que_loc, qty, id]
+        if not on_grid.all():
+            reason[np.flatnonzero(valid)[~on_grid]] = 6
+            selected = on_grid.tolist()
+            columns  = [list(compress(column, selected)) for column in columns]
+        return columns, reason
+
+    def process_lines(self, lines, first_line):
+        """
+        Parses the lines of a chunk and processes them, see process_parsed()
+        """
+        return self.process_parsed(self.parse_lines(lines), first_line)
+
+    def process_parsed(self, parsed, first_line):
+        """
+        Called by match_file(), passes the parsed lines of a chunk to process_record() one by one
+
+        Arguments:
+            parsed: list of the values returned by parse_fields() for the lines of a chunk
+            first_line: int, index of parsed[0] in the input file
+        Returns:
+            end_of_file: bool, True if an empty line (which marks the end of the input) has been reached
+        """
+        for i, record in enumerate(parsed, first_line):
+            # terminate if we reach the end of the file
+            if record is None:
+                self.last_line = i
+                self.log("\n================================= END OF FILE REACHED =================================")
+                print("\n================================= END OF FILE REACHED =================================")
+                return True
+
+            self.process_line_record(i, record)
+        return False
+
+    def process_line_record(self, i, record):
+        """
+        Processes the record parsed from the line at index i of the input file, invalid orders are logged and skipped
+
+        Arguments:
+            i: int, index of the line in the input file
+            record: tuple or InvalidOrder, returned by parse_fields()
+        """
+        self.last_line = i
+        # the lines that failed to be parsed are already InvalidOrders, so they are rejected without raising them
+        if record.__class__ is InvalidOrder:
+            self.reject_order(i, record)
+            return
+        try:
+            self.process_record(record)
+        except InvalidOrder as e:
+            # This error doesn't raise any exception, so we ignore the invalid order and process the next one
+            self.reject_order(i, e)
+        except Exception as e :
+            self.log(f'\nError: "{e}" at line {(i+1)}')
+            self.log("\nPrinting Order Book and exiting...")
+            self.log(str(self))
+            raise e
+
+    def reject_order(self, i, e):
+        """
+        Called by process_line_record(), logs the invalid order at line index i and records it in the rejects file
+
+        Arguments:
+            i: int, index of the line in the input file
+            e: InvalidOrder, with the reason the order was rejected for
+        """
+        self.log(f'\nInvalid order at line {(i+1)} due to \n==> {e}')
+        if self.rejects_stream is not None:
+            self.rejects_stream.write_row([i + 1, str(e)])
+
+    def parse_fields(self, quote_list):
+        """
+        Turns the fields of an input line into an order record, which is a tuple with the columns of the input file in the same order:
+        (network_time, bist_time, msg_type, asset_name, side, price, que_loc, qty, id)
+        where price is converted to an integer number of ticks
+
+        Arguments:
+            quote_list: list of str, the comma seperated fields of the line
+        Returns:
+            record: tuple, or None if the line is empty, or an InvalidOrder (returned, not raised) if the line fails to match the criteria
+        """
+        try:
+            assert len(quote_list) == 9        , REJECT_REASONS[0]
+            network_time, bist_time, msg_type, asset_name, side, price, que_loc, qty, id = quote_list
+            assert msg_type in ['A', 'E', 'D'] , REJECT_REASONS[1]
+            assert side in ['B', 'S']          , REJECT_REASONS[2]
 
             # make sure that network_time, bist_time, id are positive integers
-            assert quote_dict["network_time"] != "0", "network_time must be a positive integer"
-            assert quote_dict["bist_time"]    != "0", "bist_time must be a positive integer"
-            assert quote_dict["id"]           != "0", "id must be a positive integer"
-
-            # =============== ATTRIBUTES FROM ARGS ============== 
-            quote_dict["network_time"] = int(quote_dict["network_time"])
-            quote_dict["bist_time"]    = int(quote_dict["bist_time"])
-            quote_dict["qty"]          = int(quote_dict["qty"])
-            quote_dict["price"]        = float(quote_dict["price"])
-            quote_dict["que_loc"]      = int(quote_dict["que_loc"])
+            assert network_time != "0", REJECT_REASONS[3]
+            assert bist_time    != "0", REJECT_REASONS[4]
+            assert id           != "0", REJECT_REASONS[5]
+
+            price = float(price)
+            ticks = round(price / self.tick_size)
+            assert abs(ticks * self.tick_size - price) < 1e-9 * (1 + price), REJECT_REASONS[6]
+
+            # asset_name is interned, so that all the orders of a share point to the same string
+            return (int(network_time), int(bist_time), msg_type, intern(asset_name), side, ticks, int(que_loc), int(qty), int(id))
         except Exception as e:
-            raise InvalidOrder(e)
+            if quote_list == [""]:
+                return None
+            return InvalidOrder(e)
+
+    def process_order(self, line):
+        """
+        Processes a single line of the input file, turns into an order record and calls process_record()
+        The lines given to it one by one are counted, so the text output reports their index
+        """
+        self.last_line = 0 if self.last_line is None else self.last_line + 1
+        record = self.parse_fields(line.strip("\n").split(","))
+        if record.__class__ is InvalidOrder:
+            raise record
+        self.process_record(record)
+
+    def process_batch(self, columns, first_index=0):
+        """
+        Processes a batch of messages given as typed columns instead of input lines, for research code that already holds them in arrays.
+        The columns are validated with numpy masks, like the lines of a chunk in parse_lines(), then the messages are processed one by one
+        by process_record() in a tight loop, and the fills and changes of the top of the book are collected as plain tuples,
+        which are turned into typed arrays at the end. Nothing is parsed or formatted for each message.
+        Create the engine with output_mode=[] to only get the arrays, otherwise the outputs are written as usual.
+
+        Arguments:
+            columns: a dict of arrays (or a pandas DataFrame, or a numpy structured array like the records of a binary input file)
+                     with the BATCH_COLUMNS, where price is in integer ticks and msg_type and side are single characters (str or bytes).
+                     An asset_name column is optional
+            first_index: int, index of the first message of the batch, the rows of the returned arrays refer to the messages by their index
+        Returns:
+            fills: dict of arrays with the FILL_COLUMNS, a row for each trade
+            top_of_book: dict of arrays with the TOP_COLUMNS, a row for each message after which the best price or the volume at the
+                         best price of either side changed
+            rejects: dict of arrays with the REJECT_COLUMNS, a row for each message that was rejected, with the reason
+        """
+        n = len(columns["bist_time"])
+        values = {}
+        for name in BATCH_COLUMNS:
+            column = np.asarray(columns[name])
+            if name in ("msg_type", "side"):
+                values[name] = column.astype("U1").tolist() if column.dtype.kind == "S" else column.tolist()
+            elif column.dtype.kind not in "iu":
+                raise TypeError(f"column {name} must hold integers, not {column.dtype}")
+            else:
+                values[name] = column
+        # the names of the columns of a structured array are in its dtype
+        names = columns.dtype.names if isinstance(columns, np.ndarray) else columns
+        if "asset_name" in names:
+            column = np.asarray(columns["asset_name"])
+            asset_names = list(map(intern, (column.astype("U") if column.dtype.kind == "S" else column).tolist()))
+        else:
+            asset_names = repeat("")
+
+        # index in REJECT_REASONS of the first check each message fails, -1 for the ones that pass all of them, same as parse_lines()
+        msg_types = np.array(values["msg_type"], dtype=object)
+        sides     = np.array(values["side"], dtype=object)
+        reason = np.full(n, -1, dtype=np.int8)
+        checks = [
+            (msg_types != "A") & (msg_types != "E") & (msg_types != "D"),
+            (sides != "B") & (sides != "S"),
+            values["network_time"] == 0,
+            values["bist_time"] == 0,
+            values["id"] == 0,
+        ]
+        for code, failed in enumerate(checks, 1):
+            reason[(reason < 0) & failed] = code
+
+        ints = [values[name].tolist() for name in ("network_time", "bist_time", "price", "que_loc", "qty", "id")]
+        network_time, bist_time, price, que_loc, qty, id = ints
+        records = list(zip(network_time, bist_time, values["msg_type"], asset_names, values["side"], price, que_loc, qty, id))
+        for i in np.flatnonzero(reason >= 0).tolist():
+            records[i] = InvalidOrder(REJECT_REASONS[reason[i]])
+
+        # progress (if it is printed) is reported as the fraction of the batch processed
+        self.tot_bytes  = n
+        self.chunk_span = (0, n, first_index, n)
+
+        fills, changes, rejects = [], [], []
+        process_record = self.process_record
+        top_of_book    = self.top_of_book
+        last_top       = top_of_book()
+        for i, record in enumerate(records, first_index):
+            self.last_line = i
+            try:
+                if record.__class__ is InvalidOrder:
+                    raise record
+                process_record(record)
+            except InvalidOrder as e:
+                self.reject_order(i, e)
+                rejects.append((i, str(e)))
+                continue
+            for trade in self.last_trades:
+                fills.append((i, *trade))
+
+            top = top_of_book()
+            if top != last_top:
+                changes.append((i, record[1], *top))
+                last_top = top
+
+        return to_columns(fills, FILL_COLUMNS), to_columns(changes, TOP_COLUMNS), to_columns(rejects, REJECT_COLUMNS)
+
+    def process_record(self, record):
+        """
+        Top level method that processes the incoming order
+        Turns a record returned by parse_fields() into an order and calls the right method depending on the msg_type
+        """
+        network_time, bist_time, msg_type, asset_name, side, price, que_loc, qty, id = record
+        self.last_trades = []
 
         order = None
         if msg_type == "A":
-            order = orderA(**quote_dict, ord_engine=self)
+            order = orderA(network_time, bist_time, msg_type, asset_name, side, price, que_loc, qty, id, ord_engine=self)
             self.active_orderAs[order.id] = order  # adding the order to the active_orderAs
         elif msg_type == "E":
-            order = orderE(quote_dict)
-            try:
-                self.process_execute_order(order)
-            except Exception as e:
-                raise e                
+            order = orderE(id, qty, msg_type, network_time, bist_time)
+            self.process_execute_order(order)
         elif msg_type == "D":
-            order = orderD(quote_dict)
-            try:
-                self.process_delete_order(order)
-            except Exception as e:
-                raise e
+            order = orderD(msg_type, id, network_time, bist_time)
+            self.process_delete_order(order)
 
         # print the book (or open and closed orderA's) if debug_mode is True
         if self.debug_mode:
@@ -155,7 +1007,7 @@ class OrderEngine(object):
                 self.display_open_and_closed_orders()
                 return
             else:
-                self.output_stream.write("Incoming Order:\n\n", order)
+                self.log("Incoming Order:\n\n" + str(order))
                 print(self)
                 return
 
@@ -171,6 +1023,10 @@ class OrderEngine(object):
         orderA.process_delete_order(orderD)
         # orderA.add_to_order_stack(orderD) already called from within orderA
         self.remove_order_from_book(orderA)
+        if self.bars is not None:
+            self.bars.update(orderD.bist_time, [], self.top_of_book())
+        if self.quotes_stream is not None:
+            self.quotes_to_file(orderD.bist_time)
 
     def process_execute_order(self, orderE):
         """
@@ -184,6 +1040,10 @@ class OrderEngine(object):
         orderA           = self.get_order_with_id(orderE.id)
         side             = orderA.side
 
+        # a ladder only has levels for the prices of its band, the orders out of it are rejected before they change anything
+        if self.book_type == "ladder" and not (self.OpenBids if side == "B" else self.OpenAsks).covers(orderA.price):
+            raise InvalidOrder("price {} of order {} is out of the price band of the book".format(self.ticks_to_price(orderA.price), orderE.id))
+
         # orderE now has fully populated attributes from orderA
         orderA.process_execute_order(orderE) 
 
@@ -214,14 +1074,25 @@ class OrderEngine(object):
                 self.OpenAsks.insert_order(orderE)
 
         self.last_trades = last_trades
+        if self.bars is not None:
+            self.bars.update(orderE.bist_time, trades, self.top_of_book())
+        if self.quotes_stream is not None:
+            self.quotes_to_file(orderE.bist_time)
 
         # If any trades have been made, append the market and trades info to their output streams 
         if self.last_trades != []:
-            self.market_to_file(orderE.bist_time)
-            self.trades_to_file(trades)
-            self.lob_stream.write(str(orderE.bist_time) + ",")
-            self.output_stream.write(str(self))
-            self.output_stream.write("New orderE matched:\n\n" + str(orderE))
+            # the outputs that are not produced are skipped without building anything
+            if self.price_file_stream is not None:
+                self.market_to_file(orderE.bist_time)
+            if self.trades_file_stream is not None:
+                self.trades_to_file(trades)
+            if self.lob_stream is not None:
+                self.lob_to_file(orderE.bist_time)
+            if self.output_stream is not None:
+                self.output_stream.write(str(self))
+                self.output_stream.write("New orderE matched:\n\n" + str(orderE))
+            if self.print_progress:
+                self.display_progress()
 
     def remove_order_from_book(self, orderA):
         """
@@ -233,29 +1104,95 @@ class OrderEngine(object):
 
         # first remove from active_orderAs
         del self.active_orderAs[id]
-        # add to the list of closed orders
-        self.closed_orderAs.append(orderA)
+        # the orderA won't change anymore, so it is written out right away instead of being kept in memory,
+        # its row is only formatted when the stream is flushed, after which nothing refers to it
+        if self.orderA_stream is not None:
+            self.orderA_stream.write_row((orderA.network_time, orderA.bist_time, orderA.asset_name, orderA.side, orderA.price, orderA.que_loc,
+                                          orderA.qty, id, orderA.qty_not_executed, orderA.canceled, orderA.order_stack))
+        # only the last closed_cache_size closed orderA's are kept, the least recently closed one is dropped
+        closed_orderAs = self.closed_orderAs
+        if closed_orderAs is not None:
+            closed_orderAs.pop(id, None)
+            closed_orderAs[id] = orderA
+            if len(closed_orderAs) > self.closed_cache_size:
+                closed_orderAs.popitem(last=False)
+        self.num_closed_orderAs += 1
 
     def get_order_with_id(self, id):
         """
         Arguments:
-            id: str, id of the orderA
+            id: int, id of the orderA
         Returns:
             orderA: orderA object
         """
         return self.active_orderAs[id]
 
+    def get_closed_order(self, id):
+        """
+        Arguments:
+            id: int, id of the orderA
+        Returns:
+            orderA: the last orderA with the id that was closed, if it is among the last closed_cache_size closed orderA's, None otherwise
+        """
+        if self.closed_orderAs is None:
+            return None
+        return self.closed_orderAs.get(id)
+
+    def top_of_book(self):
+        """
+        Returns:
+            top: tuple, (bid_price, bid_qty, ask_price, ask_qty), the best price of each side in ticks with the volume at it, 0s for an empty side
+        """
+        bids, asks = self.OpenBids, self.OpenAsks
+        bid,  ask  = bids.max_price, asks.min_price
+        return (bid or 0, bids.get_order_que(bid).volume if bid is not None else 0,
+                ask or 0, asks.get_order_que(ask).volume if ask is not None else 0)
+
     def get_volume_at_price(self, price):
         """
         Returns volume at a price
         """
+        price  = self.price_to_ticks(price)
         volume = None
         if price in self.OpenBids:
-            volume = self.OpenBids.price_dict[price].volume
+            volume = self.OpenBids.get_order_que(price).volume
         if price in self.OpenAsks:
-            volume = self.OpenAsks.price_dict[price].volume
+            volume = self.OpenAsks.get_order_que(price).volume
         return volume
 
+    def price_to_ticks(self, price):
+        """
+        Returns the price as an integer number of ticks, which is how the books store prices
+        """
+        return round(price / self.tick_size)
+
+    def ticks_to_price(self, ticks):
+        """
+        Returns the price of a number of ticks, used by the output writers, None is returned as it is
+        """
+        if ticks is None:
+            return None
+        return round(ticks * self.tick_size, self.price_decimals)
+
+    def ticks_to_mean_price(self, ticks):
+        """
+        Same as ticks_to_price() for averages of prices, which are written with 4 more decimals
+        """
+        if ticks is None:
+            return None
+        return round(ticks * self.tick_size, self.price_decimals + 4)
+
+    def ticks_to_prices(self, ticks):
+        """
+        Vectorized version of ticks_to_price(), used by the npy outputs
+
+        Arguments:
+            ticks: numpy array of float, prices in integer ticks, NaN for missing prices
+        Returns:
+            prices: numpy array of float
+        """
+        return (ticks * self.tick_size).round(self.price_decimals)
+
     def trades_to_file(self, trades):
         """
         Called by process_execute_order() 
@@ -266,8 +1203,7 @@ class OrderEngine(object):
         """
         for trade in trades:
             if trade is not []:
-                line = ",".join([str(x) for x in trade])
-                self.trades_file_stream.write(line + "\n")
+                self.trades_file_stream.write_row(trade)
     
     def market_to_file(self, bist_time):
         """
@@ -283,141 +1219,431 @@ class OrderEngine(object):
             self.OpenBids.max_price,
             self.OpenBids.volume + self.OpenAsks.volume
         ]
-        line = ",".join([str(x) for x in line_list])
-        # with open(self.price_file, 'a') as f:
-        #     f.write(line + "\n")
-        self.price_file_stream.write(line + "\n")
+        self.price_file_stream.write_row(line_list)
     
+    def lob_header(self, depth=None):
+        """
+        Returns the header of the lob file, with lob_depth (or depth) price and volume columns for each side
+        """
+        columns = ["bist_time"]
+        for side in ["ask", "bid"]:
+            for i in range(1, (depth or self.lob_depth) + 1):
+                columns += [f"{side}_price{i}", f"{side}_vol{i}"]
+        return ",".join(columns)
+
+    def lob_to_file(self, bist_time):
+        """
+        Called by process_execute_order() each time an orderE is matched with the market
+        Adds the best lob_depth levels of both sides to the lob stream, missing levels are recorded as None
+
+        Arguments:
+            bist_time: int, time of the orderE
+        """
+        depth = self.lob_depth
+        row = [bist_time]
+        for tree in [self.OpenAsks, self.OpenBids]:
+            levels = tree.top_levels(depth)
+            for price, volume in levels:
+                row += [price, volume]
+            row += [None, None] * (depth - len(levels))
+        self.lob_stream.write_row(row)
+
+    def quotes_to_file(self, bist_time):
+        """
+        Called by process_execute_order() and process_delete_order() if quotes are recorded, records a row with the best quote_depth levels
+        of both sides if any of them changed, with the same columns as the lob file. Only the trees where a change was made at or better
+        than their worst recorded level read their levels again, see OrderTree.top_change().
+
+        With a quote_throttle, only the last row of each window of quote_throttle nanoseconds is written, once a change of a later window
+        (or the end of the run) comes. Rows with the same levels as the last one written are skipped.
+
+        Arguments:
+            bist_time: int, time of the message
+        """
+        asks, bids = self.OpenAsks.top_change(), self.OpenBids.top_change()
+        if asks is None and bids is None:
+            return
+        quote = (self.OpenAsks.top, self.OpenBids.top)
+        if not self.quote_throttle:
+            self.write_quote(bist_time, quote)
+            return
+        pending = self.pending_quote
+        if pending is not None and bist_time // self.quote_throttle > pending[0] // self.quote_throttle:
+            self.write_quote(*pending)
+        self.pending_quote = (bist_time, quote)
+
+    def write_quote(self, bist_time, quote):
+        """
+        Writes a row of the quotes stream, unless its levels are the same as the last one's
+        """
+        if quote == self.last_quote:
+            return
+        self.last_quote = quote
+        depth = self.quote_depth
+        row   = [bist_time]
+        for levels in quote:
+            for price, volume in levels:
+                row += [price, volume]
+            row += [None, None] * (depth - len(levels))
+        self.quotes_stream.write_row(row)
+
     def save_to_file(self):
         """
-        Saves the both self.price_file_stream self.trades_file_stream into files with names self.price_file and self.trades_file
-        """
-        # open directory "ouput" if it does not exist
-        if not os.path.exists("output"):
-            os.makedirs("output")
-        # open self.price_file under "output" directory, and write the contents of self.price_file_stream into it
-        with open(os.path.join("output", self.price_file), 'w') as f:
-            f.write(self.price_file_stream.getvalue())
-        # same for self.trades_file
-        with open(os.path.join("output", self.trades_file), 'w') as f:
-            f.write(self.trades_file_stream.getvalue())
-        with open(os.path.join("output", self.order_book_file), 'w') as f:
-            f.write(self.output_stream.getvalue())
-        with open(os.path.join("output",self.lob_file), 'w') as f:
-            f.write(self.lob_stream.getvalue())
-        with open(os.path.join("output",self.orderA_file), 'w') as f:
-            [f.write(str(x) + "\n") for x in self.closed_orderAs]
-            # json.dump([str(x) for x in self.closed_orderAs], f)
+        Flushes whatever is left in the output streams into their files under self.output_dir and closes them
+        """
+        self.write_price_file()
+        self.write_trades_file()
+        self.write_order_book_file()
+        self.write_lob_file()
+        self.write_orderA_file()
+        self.write_rejects_file()
+        self.write_bars_file()
+        self.write_quotes_file()
 
     def write_price_file(self):
         """
-        Writes the price filestream into the price file
+        Flushes the price filestream into the price file
         """
-        # open self.price_file under "output" directory, and write the contents of self.price_file_stream into it
-        with open(os.path.join("output", self.price_file), 'w') as f:
-            f.write(self.price_file_stream.getvalue())
+        if self.price_file_stream is not None:
+            self.price_file_stream.close()
 
     def write_trades_file(self):
         """
-        Writes the trades filestream into the trades file
+        Flushes the trades filestream into the trades file
         """
-        # same for self.trades_file
-        with open(os.path.join("output", self.trades_file), 'w') as f:
-            f.write(self.trades_file_stream.getvalue())
+        if self.trades_file_stream is not None:
+            self.trades_file_stream.close()
     
     def write_order_book_file(self):
         """
-        Writes the order book filestream into the order book file
+        Flushes the order book filestream into the order book file
         """
-        with open(os.path.join("output", self.order_book_file), 'w') as f:
-            f.write(self.output_stream.getvalue())
+        if self.output_stream is not None:
+            self.output_stream.close()
 
     def write_lob_file(self):
         """
-        Writes the lob filestream into the lob file
+        Flushes the lob filestream into the lob file
         """
-        with open(os.path.join("output", self.lob_file), 'w') as f:
-            f.write(self.lob_stream.getvalue())
+        if self.lob_stream is not None:
+            self.lob_stream.close()
 
     def write_orderA_file(self):
         """
-        Writes the orderA filestream into the orderA file
+        Flushes the orderA filestream into the orderA file
+        """
+        if self.orderA_stream is not None:
+            self.orderA_stream.close()
+
+    def write_rejects_file(self):
+        """
+        Flushes the rejects filestream into the rejects file
+        """
+        if self.rejects_stream is not None:
+            self.rejects_stream.close()
+
+    def write_bars_file(self):
+        """
+        Writes the last bar and flushes the bars filestream into the bars file
         """
-        with open(os.path.join("output", self.orderA_file), 'w') as f:
-            [f.write(str(x) + "\n") for x in self.closed_orderAs]
-            # json.dump([str(x) for x in self.closed_orderAs], f)
+        if self.bars is not None:
+            self.bars.close()
+
+    def write_quotes_file(self):
+        """
+        Writes the quote held by the throttle and flushes the quotes filestream into the quotes file
+        """
+        if self.quotes_stream is not None:
+            if self.pending_quote is not None:
+                self.write_quote(*self.pending_quote)
+                self.pending_quote = None
+            self.quotes_stream.close()
 
     def save_to_file_concurrent(self):
         """
-        Parallel version of save_to_file(), uses concurrent.futures.ProcessPoolExecutor to write to files in parallel
-        """
-        # open directory "ouput" if it does not exist
-        if not os.path.exists("output"):
-            os.makedirs("output")
-        
-        # create a list of futures
-        futures = []
-        # create a ProcessPoolExecutor
-        # with concurrent.futures.ProcessPoolExecutor() as executor:
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            # submit the methods that save the filestreams to the executor, one by one
-            futures.append(executor.submit(self.write_price_file, self.price_file_stream, self.price_file))
-            futures.append(executor.submit(self.write_trades_file, self.trades_file_stream, self.trades_file))
-            futures.append(executor.submit(self.write_order_book_file, self.output_stream, self.order_book_file))
-            futures.append(executor.submit(self.write_orderA_file, self.closed_orderAs, self.orderA_file))
-            futures.append(executor.submit(self.write_lob_file, self.lob_stream, self.lob_file))
-            # wait for all futures to complete
-            concurrent.futures.wait(futures)
+        Version of save_to_file() for concurrent_mode, hands the remaining outputs over to the writer stage and waits until it has written everything
+        """
+        self.save_to_file()
+        if self.sink_writer is not None:
+            self.sink_writer.close()
     
+    def checkpoint_due(self, first_line):
+        """
+        Called by match_file() after each chunk, returns True if a checkpoint should be saved
+        """
+        if self.checkpoint_file is None:
+            return False
+        if self.checkpoint_every is not None and first_line - self.checkpoint_line >= self.checkpoint_every:
+            return True
+        if self.checkpoint_interval is not None and time.perf_counter() - self.checkpoint_time >= self.checkpoint_interval:
+            return True
+        return False
+
+    def checkpoint(self, offset, first_line):
+        """
+        Saves the state of the engine to self.checkpoint_file, so that a run can be resumed from the input line at index first_line,
+        which starts at the byte offset offset of the input file, see resume_from()
+
+        The outputs are flushed, and the size of each one is saved, together with the books (with the orders of each price level in
+        their order of priority), the active orderAs and the orderEs linked to them. The state is made of plain tuples and lists, which are
+        pickled into a new file that replaces the previous checkpoint at once, so that a run that fails while saving leaves the previous one intact.
+        """
+        streams = [(name, getattr(self, name)) for name in STREAMS if getattr(self, name) is not None]
+        for name, stream in streams:
+            stream.flush()
+        if self.sink_writer is not None:
+            self.sink_writer.wait()
+
+        state = self.checkpoint_state()
+        state.update({
+            "offset": offset,
+            "first_line": first_line,
+            "streams": {name: stream.offset() for name, stream in streams},
+        })
+        temp_file = self.checkpoint_file + ".tmp"
+        with open(temp_file, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.checkpoint_file)
+
+        self.checkpoint_line = first_line
+        self.checkpoint_time = time.perf_counter()
+
+    def checkpoint_state(self):
+        """
+        Called by checkpoint(), returns the state of the books and the orders as a dict of plain values.
+        orderAs and orderEs are saved as tuples in the lists "orderAs" and "orderEs", and refer to each other by their index in these lists
+        """
+        orderAs, orderEs = [], []
+        orderA_index     = {} # Key: orderA object, Value: index in orderAs
+        orderE_index     = {} # Key: orderE.key, Value: index in orderEs
+
+        def index_orderA(order):
+            i = orderA_index.get(order)
+            if i is None:
+                i = orderA_index[order] = len(orderAs)
+                orderAs.append(None)
+                # orderDs can't be in the stack of an open orderA, but are saved for completeness
+                stack = [index_orderE(x) if x.__class__ is orderE else (x.id, x.network_time, x.bist_time) for x in order.order_stack]
+                active = self.active_orderAs.get(order.id) is order
+                orderAs[i] = (order.network_time, order.bist_time, order.asset_name, order.side, order.price, order.que_loc, order.id,
+                              order.qty, order.qty_not_executed, order.canceled, active, stack)
+            return i
+
+        def index_orderE(order):
+            i = orderE_index.get(order.key)
+            if i is None:
+                i = orderE_index[order.key] = len(orderEs)
+                orderEs.append(None)
+                orderEs[i] = (order.id, order.qty, order.qty_not_matched, order.network_time, order.bist_time, index_orderA(order.orderA))
+            return i
+
+        for order in self.active_orderAs.values():
+            index_orderA(order)
+        books = {}
+        for side, tree in [("bids", self.OpenBids), ("asks", self.OpenAsks)]:
+            books[side] = [(price, [index_orderE(order) for order in order_que.in_priority_order()])
+                           for price, order_que in tree.iter_levels()]
+
+        return {
+            "version": CHECKPOINT_VERSION,
+            "tick_size": self.tick_size,
+            "book_type": self.book_type,
+            "ladder_bases": (self.OpenBids.base_price, self.OpenAsks.base_price) if self.book_type == "ladder" else None,
+            "orderAs": orderAs,
+            "orderEs": orderEs,
+            "bids": books["bids"],
+            "asks": books["asks"],
+            "last_line": self.last_line,
+            "num_closed_orderAs": self.num_closed_orderAs,
+            "bars": None if self.bars is None else self.bars.checkpoint_state(),
+            "quotes": None if self.quotes_stream is None else (self.OpenAsks.top, self.OpenBids.top, self.last_quote, self.pending_quote),
+        }
+
+    def load_checkpoint(self, checkpoint_file, truncate_outputs=True):
+        """
+        Called by resume_from() and run_from_book(), restores the state saved by checkpoint() into this engine, which must be newly created.
+        If truncate_outputs is True, the outputs are cut back to their size at the checkpoint, otherwise they are written from scratch
+        """
+        with open(checkpoint_file, "rb") as f:
+            state = pickle.load(f)
+        if state["version"] != CHECKPOINT_VERSION:
+            raise ValueError(f"Checkpoint version {state['version']} is not supported, expected {CHECKPOINT_VERSION}")
+        if state["tick_size"] != self.tick_size:
+            raise ValueError(f"Checkpoint was saved with tick_size {state['tick_size']}, not {self.tick_size}")
+
+        orderAs = []
+        for network_time, bist_time, asset_name, side, price, que_loc, id, qty, qty_not_executed, canceled, active, stack in state["orderAs"]:
+            order = orderA(network_time, bist_time, "A", asset_name, side, price, que_loc, qty, id, ord_engine=self)
+            order.qty_not_executed = qty_not_executed
+            order.canceled         = canceled
+            orderAs.append(order)
+            if active:
+                self.active_orderAs[id] = order
+
+        orderEs = []
+        for id, qty, qty_not_matched, network_time, bist_time, orderA_index in state["orderEs"]:
+            order = orderE(id, qty, "E", network_time, bist_time)
+            order.qty_not_matched = qty_not_matched
+            order.populate_attributes_from_orderA(orderAs[orderA_index])
+            orderEs.append(order)
+
+        for order, row in zip(orderAs, state["orderAs"]):
+            order.order_stack = [orderEs[x] if isinstance(x, int) else orderD("D", *x) for x in row[-1]]
+
+        # ladders centered on their first price are centered where they were, not on the first price of the checkpoint
+        if self.book_type == "ladder" and state.get("ladder_bases") is not None:
+            self.OpenBids.base_price, self.OpenAsks.base_price = state["ladder_bases"]
+        # the orders are inserted in their order of priority, so each queue ends up in the same order
+        for tree, levels in [(self.OpenBids, state["bids"]), (self.OpenAsks, state["asks"])]:
+            for price, orders in levels:
+                for i in orders:
+                    tree.insert_order(orderEs[i])
+
+        self.last_line          = state["last_line"]
+        self.num_closed_orderAs = state["num_closed_orderAs"]
+        if self.bars is not None and state.get("bars") is not None:
+            self.bars.load_checkpoint_state(state["bars"])
+        # the books were rebuilt with the same best levels they had, so only the changes after the checkpoint are recorded
+        if self.quotes_stream is not None and state.get("quotes") is not None:
+            asks_top, bids_top, self.last_quote, self.pending_quote = state["quotes"]
+            self.OpenAsks.watch_top(self.quote_depth, asks_top)
+            self.OpenBids.watch_top(self.quote_depth, bids_top)
+        self.start_offset       = state["offset"]
+        self.start_line         = state["first_line"]
+        self.checkpoint_line    = state["first_line"]
+        if not truncate_outputs:
+            return
+        for name, offset in state["streams"].items():
+            stream = getattr(self, name)
+            if stream is not None:
+                stream.truncate(offset)
+
+    def write_book_snapshot(self, file_name):
+        """
+        Writes the current book to a csv file with SNAPSHOT_HEADER as its header, which can be loaded by load_book_snapshot(),
+        or by run_from_book(), which starts from the line after the last one processed before it was written (see the "P" row).
+        Unlike a checkpoint it is a plain text file with a row per order, so it can also be produced from depth data by other tools.
+        """
+        ticks_to_price = self.ticks_to_price
+        with open(file_name, "w") as f:
+            f.write(SNAPSHOT_HEADER + "\n")
+            next_line = 0 if self.last_line is None else self.last_line + 1
+            f.write(f"P,,,,,,{next_line},,,\n")
+            for order in self.active_orderAs.values():
+                f.write(f"A,{order.network_time},{order.bist_time},{order.asset_name},{order.side},{ticks_to_price(order.price)},"
+                        f"{order.que_loc},{order.qty},{order.id},{order.qty_not_executed}\n")
+            for tree in [self.OpenBids, self.OpenAsks]:
+                for price, order_que in tree.iter_levels():
+                    for order in order_que.in_priority_order():
+                        f.write(f"E,{order.network_time},{order.bist_time},{order.orderA.asset_name},{order.side},{ticks_to_price(price)},"
+                                f"{order.que_loc},{order.qty},{order.id},{order.qty_not_matched}\n")
+
+    def load_book_snapshot(self, file_name):
+        """
+        Called by run_from_book(), loads a book snapshot file written by write_book_snapshot() into this engine, which must be newly created.
+        The orderAs are added to active_orderAs, and the orderEs are linked to their orderA and inserted into the books in the order
+        of the file, so that each price level keeps the priority it had. The closed orders and the orderEs that were fully matched
+        before the snapshot are not in it, so the order_stack of each orderA only holds the orderEs on the book.
+
+        Returns:
+            next_line: int, index of the first input line not processed before the snapshot, from its "P" row, None if it has none
+        """
+        next_line = None
+        with open(file_name) as f:
+            header = f.readline().rstrip("\r\n")
+            if header != SNAPSHOT_HEADER:
+                raise ValueError(f"{file_name} is not a book snapshot file, its header must be {SNAPSHOT_HEADER}")
+            for i, line in enumerate(f, 2):
+                msg_type, network_time, bist_time, asset_name, side, price, que_loc, qty, id, qty_open = line.rstrip("\r\n").split(",")
+                if msg_type == "P":
+                    next_line = int(que_loc)
+                    continue
+                id = int(id)
+                if msg_type == "A":
+                    order = orderA(int(network_time), int(bist_time), "A", intern(asset_name), side, self.price_to_ticks(float(price)),
+                                   int(que_loc), int(qty), id, ord_engine=self)
+                    order.qty_not_executed  = int(qty_open)
+                    self.active_orderAs[id] = order
+                elif msg_type == "E":
+                    if id not in self.active_orderAs:
+                        raise ValueError(f"line {i} of {file_name}: orderE of id {id} has no orderA before it")
+                    order = orderE(id, int(qty), "E", int(network_time), int(bist_time))
+                    order.qty_not_matched = int(qty_open)
+                    self.active_orderAs[id].process_execute_order(order)
+                    if order.side == "B":
+                        self.OpenBids.insert_order(order)
+                    else:
+                        self.OpenAsks.insert_order(order)
+                else:
+                    raise ValueError(f"line {i} of {file_name}: msg_type must be either A, E or P")
+        return next_line
+
     def display_open_and_closed_orders(self):
         """
         Prints the number of open and closed orders
         """
         print("\nNumber of A orders:")
         print(f"Open: {len(self.active_orderAs)}")
-        print(f"Closed: {len(self.closed_orderAs)}")
+        print(f"Closed: {self.num_closed_orderAs}")
 
         # UCOMMENT TO SEE THE LIST OF CLOSED ORDERS
         # [print(order) for order in self.active_orderAs.values()]
         # print("CLOSED ORDERS:")
-        # print(len(self.closed_orderAs))
-        # [print(order) for order in self.closed_orderAs]
+
+    def progress(self):
+        """
+        Returns the fraction of the input file that has been processed, estimated from the byte offsets of the chunk being processed,
+        0 if the orders don't come from a file (process_order() called line by line)
+        """
+        if self.chunk_span is None or not self.tot_bytes:
+            return 0.0
+        start, end, first_line, num_lines = self.chunk_span
+        offset = start + (end - start) * (self.last_line - first_line + 1) / num_lines
+        return offset / self.tot_bytes
+
+    def log(self, text):
+        """
+        Writes text to the text output, if it is produced
+        """
+        if self.output_stream is not None:
+            self.output_stream.write(text)
+
+    def display_progress(self):
+        """
+        Prints the line and the percentage of the input file reached, called after each trade if "progress" is in outputs
+        """
+        percent = round(self.progress() * 100, 2)
+        print(f"\n=============================== At Line {self.last_line+1:>7} ({percent:>5}%) ==============================")
 
     def display_final(self):
         """
         A user friendly method that prints string representation of the book. 
         """
-        S = "\nTotal trades recorded: " + str(len(self.closed_orderAs))
+        S = "\nTotal trades recorded: " + str(self.num_closed_orderAs)
         return S
 
     def __str__(self):
         S = ""
         last_line = self.last_line
-        percent = round(last_line / self.tot_lines * 100, 2)
+        percent = round(self.progress() * 100, 2)
         S += f"\n=================================================== At Line {last_line+1:>7} ({percent:>5}%) =========="
-        print(f"\n=============================== At Line {last_line+1:>7} ({percent:>5}%) ==============================")
 
         S += "\n================= Asks =================\n"
         if self.OpenAsks != None and len(self.OpenAsks) > 0:
             # S += (str(self.OpenAsks))
-            ask_str, ask_list = self.OpenAsks.top_order_book()
-            S += ask_str
-            askline = ",".join([str(x) for x in ask_list])
-            self.lob_stream.write(str(askline) + ",")
-
+            S += self.OpenAsks.top_order_book(self.ticks_to_price)
 
         S += "\n================= Bids =================\n"
         if self.OpenBids != None and len(self.OpenBids) > 0:
             # S += (str(self.OpenBids))
-            bid_str, bid_list = self.OpenBids.top_order_book()
-            S += bid_str
-            bidline = ",".join([str(x) for x in bid_list])
-            self.lob_stream.write(str(bidline) + "\n")
+            S += self.OpenBids.top_order_book(self.ticks_to_price)
 
         S += "\n================ Trades ================\n"
         if self.last_trades != []:
             for entry in self.last_trades:
-                trade_str = f"| p: {entry[1]:>5} | qty: {entry[2]:>5}                |\n"
+                trade_str = f"| p: {self.ticks_to_price(entry[1]):>5} | qty: {entry[2]:>5}                |\n"
                 S += trade_str
                 # S += (pformat(entry, width=1, compact=True))
         else:
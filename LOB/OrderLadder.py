@@ -0,0 +1,82 @@
+#!/usr/bin/python
+
+from LOB.OrderQue  import OrderQue
+from LOB.OrderTree import OrderTree
+
+class OrderLadder(OrderTree):
+    """
+    Alternative OrderTree for instruments whose prices stay within known bounds, like BIST equities that trade within their daily price limits.
+
+    Instead of a Red Black Tree and a dict of prices, price levels are kept in a fixed size list, indexed by their offset (in ticks)
+    from self.base_price, and the non-empty levels are marked on a bitmap (a python int, bit i is set if self.levels[i] has orders).
+    min_price and max_price are the best price cursors, when the best level runs out of orders the next one is found from the lowest or
+    highest set bit of the bitmap, without walking over the empty levels.
+
+    It has the same interface as OrderTree, so OrderEngine, orderA and orderE use it in the same way.
+    The ladder never grows: it covers the num_levels prices from base_price, or if base_price is None, the num_levels prices centered
+    on the first price inserted. OrderEngine rejects the orders whose price is out of the ladder (see covers()), a price band far
+    wider than the book would otherwise take a level (and a bit) for every tick in between.
+    """
+    def __init__(self, isbid: bool, num_levels=1024, base_price=None):
+        super().__init__(isbid)
+        self.price_tree = None       # not used by the ladder
+        self.price_dict = None       # not used by the ladder
+        self.levels     = [None] * num_levels # OrderQue objects indexed by price - base_price, None for empty levels
+        self.bitmap     = 0          # bit i is set if self.levels[i] is not None
+        self.base_price = base_price # price (in ticks) of self.levels[0], set from the first price inserted if None
+
+    def iter_levels(self, reverse=False):
+        levels = self.levels
+        base   = self.base_price
+        bitmap = self.bitmap
+        while bitmap:
+            if reverse:
+                i = bitmap.bit_length() - 1
+            else:
+                i = (bitmap & -bitmap).bit_length() - 1
+            bitmap ^= 1 << i
+            yield base + i, levels[i]
+
+    def price_exists(self, price):
+        if self.base_price is None:
+            return False
+        i = price - self.base_price
+        return 0 <= i < len(self.levels) and self.levels[i] is not None
+
+    def covers(self, price):
+        """
+        Called by OrderEngine.process_execute_order() before an order is matched, returns True if price is within the ladder
+        (or the ladder is still empty and will be centered on it)
+        """
+        if self.base_price is None:
+            return True
+        return 0 <= price - self.base_price < len(self.levels)
+
+    def get_order_que(self, price):
+        return self.levels[price - self.base_price]
+
+    def create_price(self, price):
+        if self.base_price is None:
+            self.base_price = price - len(self.levels) // 2
+        i = price - self.base_price
+        if i < 0 or i >= len(self.levels):
+            raise ValueError(f"price {price} is out of the ladder, which covers {self.base_price} to {self.base_price + len(self.levels) - 1}")
+
+        self.levels[i] = OrderQue()
+        self.bitmap   |= 1 << i
+        if self.max_price == None or price > self.max_price:
+            self.max_price = price
+        if self.min_price == None or price < self.min_price:
+            self.min_price = price
+
+    def remove_price(self, price):
+        i = price - self.base_price
+        self.levels[i] = None
+        self.bitmap   ^= 1 << i
+
+        # the next best price is the highest (for max_price) or lowest (for min_price) level left on the bitmap
+        bitmap = self.bitmap
+        if self.max_price == price:
+            self.max_price = self.base_price + bitmap.bit_length() - 1 if bitmap else None
+        if self.min_price == price:
+            self.min_price = self.base_price + (bitmap & -bitmap).bit_length() - 1 if bitmap else None
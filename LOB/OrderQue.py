@@ -11,19 +11,30 @@ class OrderQue(object):
 
     At each operation, the head element (self.heap at index 0)
     remains the one with the lowest que_loc value 
+
+    Next to the heap, the orders in the queue are indexed by their key in self.orders, 
+    so canceling an order from the middle of the queue is only a dict removal (O(1)).
+    The heap entry of a canceled order is left in place and is dropped once it reaches the head,
+    which keeps removing the head order O(logN).
     """
 
     def __init__(self):
-        self.volume = 0  # Total order volume
-        self.heap   = [] 
-        self.length = len(self.heap)
+        self.volume = 0  # Total qty_not_matched of the orders in the queue, updated by OrderTree on partial matches
+        self.heap   = [] # min heap of (que_loc, seq, orderE) entries, may contain entries of canceled orders
+        self.orders = {} # Key: orderE.key, Value: orderE object, only for the orders that are still in the queue
+        self.length = 0
+        self.seq    = 0  # incremented at each append, so that orders with the same que_loc are matched in their order of arrival
 
     def get_head(self):
         """
         Returns the orderE object at the head of the heap,
         which is the orderE with the lowest que_loc
         """
-        return self.heap[0]
+        heap = self.heap
+        # drop the entries of canceled orders until a live one is at the head
+        while self.orders.get(heap[0][2].key) is not heap[0][2]:
+            heapq.heappop(heap)
+        return heap[0][2]
 
     def append_order(self, order):
         """
@@ -31,31 +42,45 @@ class OrderQue(object):
         """
         self.length += 1
         self.volume += order.qty_not_matched
-        heapq.heappush(self.heap, order)
+        self.seq    += 1
+        self.orders[order.key] = order
+        heapq.heappush(self.heap, (order.que_loc, self.seq, order))
 
     def remove_head_order(self):
         """
         Removes the orderE object at the head of the heap,
         which is the orderE with the lowest que_loc
         """
-        self.volume -= self.heap[0].qty_not_matched
-        self.length -= 1
-        if len(self) == 0:
-            return
+        order = self.get_head()
         heapq.heappop(self.heap)
+        del self.orders[order.key]
+        self.volume -= order.qty_not_matched
+        self.length -= 1
 
     def remove_order_by_key(self, key):
         """
-        Removes the orderE object with the given key from the heap
+        Removes the orderE object with the given key from the queue, its heap entry is dropped later by get_head()
+        """
+        order = self.orders.pop(key)
+        self.volume -= order.qty_not_matched
+        self.length -= 1
+        # rebuild the heap if it is mostly made of canceled entries, so that it doesn't grow with the number of cancels
+        if len(self.heap) > 2 * self.length + 32:
+            self.heap = [entry for entry in self.heap if self.orders.get(entry[2].key) is entry[2]]
+            heapq.heapify(self.heap)
+
+    def in_priority_order(self):
+        """
+        Returns the orders in the queue in their order of priority, used by OrderEngine.checkpoint() to save the queue
+        """
+        orders = self.orders
+        return [entry[2] for entry in sorted(entry for entry in self.heap if orders.get(entry[2].key) is entry[2])]
+
+    def __iter__(self):
+        """
+        Iterates over the orders in the queue, not in their order of priority
         """
-        # from self.head delete the orderE object with the given key
-        for i, order in enumerate(self.heap):
-            if order.key == key:
-                self.volume -= order.qty_not_matched
-                self.length -= 1
-                del self.heap[i]
-                heapq.heapify(self.heap)
-                break
+        return iter(self.orders.values())
 
     def __len__(self):
         return self.length
@@ -66,11 +91,8 @@ class OrderQue(object):
         after printing the size and total volume
         """
         file_str = StringIO()
-        # we add up the order qty_not_matched of all orders before displaying them, 
-        # since self.vol doesn't account for difference in volume of orders that has been only partially matched
-        qty_list = [order.qty_not_matched for order in self.heap]
-        # file_str.write("tot: {}, vol: {} ,{}| ".format(self.length, sum(qty_list)))
-        file_str.write(f"| tot: {self.length:>4} | vol: {sum(qty_list):>7} |")
+        # file_str.write("tot: {}, vol: {} ,{}| ".format(self.length, self.volume))
+        file_str.write(f"| tot: {self.length:>4} | vol: {self.volume:>7} |")
 
         # UNCOMMENT IF WANT TO DISPLAY THE LIST AS A CHAIN OF ORDER qty_not_matched OR que_loc VALUES
         # for order in self.heap:
@@ -13,71 +13,111 @@ class OrderTree(object):
     """
     def __init__(self, isbid: bool):
         self.isbid      = isbid # True if bid, False if ask
-        self.price_tree = FastRBTree() # Key: price, Value: OrderQue object
+        self.price_tree = FastRBTree() # Key: price (in integer ticks), Value: OrderQue object
         self.volume     = 0
-        self.price_dict = {}  # Key: price, Value: OrderQue object
+        self.price_dict = {}  # Key: price (in integer ticks), Value: OrderQue object
         self.order_dict = {}  # Key: orderE.key, Value: orderE object
         self.min_price  = None
         self.max_price  = None
+        # change tracking of the best top_depth levels, see watch_top(), nothing is tracked while top_depth is 0
+        self.top_depth  = 0
+        self.top        = None  # the best top_depth levels as of the last top_change(), a tuple of (price, volume) tuples
+        self.top_bound  = None  # price of the worst of them if there are top_depth levels, changes at worse prices can't affect them
+        self.top_dirty  = False # True if a level at or better than top_bound changed since the last top_change()
     
     def __str__(self):
+        return self.top_order_book()
+    
+    def top_order_book(self, to_price=None):
+        """
+        Returns the string representation of the book used in the OrderEngine text output
+
+        Arguments:
+            to_price: function that turns the integer price ticks of the tree into prices, prices are displayed as ticks if None
+        """
         # print keys and values of price_dict on seperate lines
         out_str = ""
         # reverse = False if self.isbid else True
-        for key, value in sorted(self.price_dict.items(), reverse=True):
-            qty_list = [order.qty_not_matched for order in value.heap]
-            # file_str.write("tot: {}, vol: {} ,{}| ".format(self.length, sum(qty_list)))
-            out_str += (f"| p: {key:>5}: | tot: {value.length:>4} | vol: {sum(qty_list):>7} |\n")
+        for key, value in self.iter_levels(reverse=True):
+            price = key if to_price is None else to_price(key)
+            out_str += (f"| p: {price:>5}: | tot: {value.length:>4} | vol: {value.volume:>7} |\n")
             # out_str += f"| p: {key:>5}: {value}\n"
         
         out_str += f"|                                      |\n"
         out_str += f"| Volume       : {self.volume:>9}             |\n"
         out_str += f"| Total Orders : {len(self.order_dict):>9}             |\n"
         return out_str
-    
-    def top_order_book(self):
-        # print keys and values of price_dict on seperate lines
-        out_str = ""
-        out_list = []
-        price_vol_list = []
-        sorted_prices = sorted(self.price_dict.items(), reverse=True)
-        length = len(sorted_prices)
-        for key, value in sorted_prices:
-            qty_list = [order.qty_not_matched for order in value.heap]
-            # file_str.write("tot: {}, vol: {} ,{}| ".format(self.length, sum(qty_list)))
-            vol = sum(qty_list)
-            out_str += (f"| p: {key:>5}: | tot: {value.length:>4} | vol: {vol:>7} |\n")
-            # out_str += f"| p: {key:>5}: {value}\n"
-            price_vol_list.append([key, vol])
 
-        out_str += f"|                                      |\n"
-        out_str += f"| Volume       : {self.volume:>9}             |\n"
-        out_str += f"| Total Orders : {len(self.order_dict):>9}             |\n"
+    def top_levels(self, k):
+        """
+        Returns the best k price levels of the tree, walking the tree from the best price, so that its cost depends on k and not on the size of the book
 
-        # if it is bid, add the largest 3 prices to the out_list, if less than 3 elements, appends [None, None]
-        if self.isbid:
-            out_list = price_vol_list[:3]
-            if length < 3:
-                out_list += [[None, None]] * (3 - len(out_list))
-        # if it is ask, add the smallest 3 prices to the out_list, if less than 3 elements, appends [[None, None]]
-        else:
-            out_list = price_vol_list[-3:]
-            # reverse out_list
-            out_list = out_list[::-1]
-            if length < 3:
-                out_list += [[None, None]] * (3 - len(out_list))
-        # concatenata all list in out_list to a single list
-        out_list = [item for sublist in out_list for item in sublist] 
-        return out_str, out_list
+        Arguments:
+            k: int, number of levels
+        Returns:
+            levels: list of [price, volume] lists (prices in ticks), starting from the best price, has less than k elements if there are less than k levels
+        """
+        # bids are walked from the highest price down, asks from the lowest up
+        levels = []
+        for price, order_que in self.iter_levels(reverse=self.isbid):
+            if len(levels) == k:
+                break
+            levels.append([price, order_que.volume])
+        return levels
+
+    def watch_top(self, depth, top=None):
+        """
+        Starts tracking the changes of the best depth levels of the tree, which top_change() reports
+
+        Arguments:
+            depth: int, number of levels
+            top: the levels returned by the last top_change() of a tree with the same orders (saved in a checkpoint), None to report all of them
+        """
+        self.top_depth = depth
+        self.top       = top
+        self.top_bound = top[-1][0] if top is not None and len(top) == depth else None
+        self.top_dirty = top is None
+
+    def touch(self, price):
+        """
+        Called when the volume at price changes while the top is tracked, marks the top as dirty if price is one of its levels or better
+        """
+        bound = self.top_bound
+        if bound is None or (price >= bound if self.isbid else price <= bound):
+            self.top_dirty = True
+
+    def top_change(self):
+        """
+        Returns the best top_depth levels if any of their prices or volumes changed since the last call, None otherwise.
+        The levels are only read if a change was made at or better than the worst of them, so the cost is proportional to the changes of the top
+
+        Returns:
+            top: tuple of (price, volume) tuples (prices in ticks) starting from the best price, or None
+        """
+        if not self.top_dirty:
+            return None
+        self.top_dirty = False
+        top = tuple([(price, volume) for price, volume in self.top_levels(self.top_depth)])
+        self.top_bound = top[-1][0] if len(top) == self.top_depth else None
+        if top == self.top:
+            return None
+        self.top = top
+        return top
+
+    def iter_levels(self, reverse=False):
+        """
+        Iterates over the (price, OrderQue) pairs of the tree in increasing order of price, or decreasing if reverse is True
+        """
+        return self.price_tree.iter_items(reverse=reverse)
 
     def __contains__(self, key):
-        return key in self.price_dict
+        return self.price_exists(key)
 
     def __len__(self):
         return len(self.order_dict)
 
     def get_price(self, price):
-        return self.price_dict[price]
+        return self.get_order_que(price)
 
     def get_order(self, key):
         return self.order_dict[key]
@@ -98,21 +138,22 @@ class OrderTree(object):
             self.min_price = price
 
     def remove_price(self, price):
-        self.price_tree.remove(price)
-        del self.price_dict[price]
-
-        # update min and max price
+        # update min and max price with the neighbours of the removed price in the tree, which is O(logN)
+        # instead of going through the entire tree
         if self.max_price == price:
             try:
-                self.max_price = max(self.price_tree)
-            except ValueError:
+                self.max_price = self.price_tree.prev_key(price)
+            except KeyError:
                 self.max_price = None
         if self.min_price == price:
             try:
-                self.min_price = min(self.price_tree)
-            except ValueError:
+                self.min_price = self.price_tree.succ_key(price)
+            except KeyError:
                 self.min_price = None
 
+        self.price_tree.remove(price)
+        del self.price_dict[price]
+
     def price_exists(self, price):
         return price in self.price_dict
 
@@ -145,6 +186,11 @@ class OrderTree(object):
                 qty_matched = qty_to_match
                 remaining_head_qty = head_order.qty_not_matched - qty_to_match
                 head_order.update_qty_not_matched(remaining_head_qty)
+                # volumes of the level and the tree are kept up to date with partial matches
+                order_que.volume -= qty_to_match
+                self.volume      -= qty_to_match
+                if self.top_depth:
+                    self.touch(price)
                 qty_to_match = 0
 
             # If the head_order qty is equal to the qty_to_match, removes the head order from the correct orderTree depending on the side
@@ -163,21 +209,20 @@ class OrderTree(object):
                 head_order.update_qty_not_matched(0)
                 qty_to_match -= qty_matched
             
-            # Construct the transaction record
-            bid_id, ask_id = None, None
+            # Construct the transaction record, with the id and bist_time of both orders as they are
             if orderE.side == 'B':
-                bid_id = int(head_order.key)
-                ask_id = int(orderE.key)
+                bid_order, ask_order = head_order, orderE
             else:
-                bid_id = int(orderE.key)
-                ask_id = int(head_order.key)
+                bid_order, ask_order = orderE, head_order
 
             transaction_list = [
                 orderE.bist_time,
                 price,
                 qty_matched,
-                bid_id,
-                ask_id
+                bid_order.id,
+                bid_order.bist_time,
+                ask_order.id,
+                ask_order.bist_time
             ]
             trades.append(transaction_list)
 
@@ -198,7 +243,8 @@ class OrderTree(object):
         best_price      = self.max_price if self.isbid else self.min_price
         
         trades = []
-        while ((qty_not_matched > 0) and (price <= best_price if self.isbid else price >= best_price)) == True:
+        # best_price becomes None once the sweep has consumed every level of the tree
+        while ((qty_not_matched > 0) and best_price is not None and (price <= best_price if self.isbid else price >= best_price)) == True:
             order_que = self.get_order_que(best_price)
 
             qty_not_matched, trades_at_price = self.match_orders_at_price(orderE, qty_not_matched, order_que, best_price)
@@ -216,14 +262,16 @@ class OrderTree(object):
         Arguments:
             order: orderE object
         """
-        if order.price not in self.price_dict:
+        if not self.price_exists(order.price):
             self.create_price(order.price)
 
-        order_que = self.price_dict[order.price] 
+        order_que = self.get_order_que(order.price)
         order.add_order_list(order_que)
         order_que.append_order(order)
         self.order_dict[order.key] = order
         self.volume += order.qty_not_matched
+        if self.top_depth:
+            self.touch(order.price)
         # set the order_tree attribute of the orderE object
         order.set_order_tree(self)
 
@@ -239,10 +287,15 @@ class OrderTree(object):
         """
         order = self.order_dict[key]
         self.volume -= order.qty_not_matched
+        if self.top_depth:
+            self.touch(order.price)
+        order_que = order.order_list
         if not_head:
-            order.order_list.remove_order_by_key(key)
+            order_que.remove_order_by_key(key)
         else:
-            order.order_list.remove_head_order()
-        if len(order.order_list) == 0:
+            order_que.remove_head_order()
+        # the order is no longer in the book, so a later orderD won't try to remove it again
+        order.add_order_list(None)
+        if len(order_que) == 0:
             self.remove_price(order.price)
         del self.order_dict[key]
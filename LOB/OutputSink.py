@@ -0,0 +1,394 @@
+import numpy as np
+import os
+import queue
+import threading
+
+class OutputSink(object):
+    """
+    Append-only text output that is flushed to its file incrementally, instead of being held in memory until the end of the run.
+
+    Writes are collected in a bounded buffer, which is written to the file once it holds flush_size entries.
+    Each write is a whole entry (a row, or a message of the text log, which starts rather than ends with a line break),
+    so the file on disk always ends at the end of an entry and a run that crashes half way leaves valid partial outputs behind.
+
+    The file is only open while a flush writes to it, so that many sinks can exist at the same time (e.g. one set per share
+    in MultiOrderEngine) without running out of file descriptors. It is created on the first flush (together with its directory)
+    and is overwritten if it already exists, just like the files written by OrderEngine.save_to_file() used to be.
+    """
+    def __init__(self, file_path, flush_size=4096, header=None, writer=None):
+        self.file_path  = file_path  # path of the file the output is saved to
+        self.flush_size = flush_size # number of buffered entries that triggers a flush
+        self.buffer     = []         # entries written since the last flush
+        self.created    = False      # True once the file has been created by the first flush
+        self.closed     = False
+        self.writer     = writer     # SinkWriter that formats and writes the flushed buffers on its own thread, if not None
+
+        if header is not None:
+            self.write(header + "\n")
+
+    def write(self, text):
+        """
+        Adds text to the buffer, flushes it if it is full
+        """
+        self.buffer.append(text)
+        if len(self.buffer) >= self.flush_size:
+            self.flush()
+
+    def format_buffer(self, buffer):
+        """
+        Returns the contents of a flushed buffer as a single string
+        """
+        return "".join(buffer)
+
+    def flush(self):
+        """
+        Empties the buffer and appends its contents to the file, or hands them over to self.writer
+        """
+        buffer = self.buffer
+        self.buffer = []
+        if self.writer is not None:
+            self.writer.submit(self, buffer)
+        else:
+            self.write_buffer(buffer)
+
+    def write_buffer(self, buffer):
+        """
+        Formats a flushed buffer and appends it to the file
+        """
+        data = self.format_buffer(buffer)
+        # the file is unbuffered, so each flush is written to the OS as a single block
+        with self.open() as f:
+            f.write(data.encode())
+
+    def open(self):
+        """
+        Opens the file for the next flush, the first flush creates (or overwrites) it, later ones append to it
+        """
+        if self.created:
+            return open(self.file_path, "ab", buffering=0)
+        dir_name = os.path.dirname(self.file_path)
+        if dir_name != "" and not os.path.exists(dir_name):
+            os.makedirs(dir_name, exist_ok=True)
+        self.created = True
+        return open(self.file_path, "wb", buffering=0)
+
+    def offset(self):
+        """
+        Returns the size of the file, or None if it hasn't been created yet.
+        Called by OrderEngine.checkpoint() once the buffer has been flushed and written
+        """
+        if not self.created:
+            return None
+        return os.path.getsize(self.file_path)
+
+    def truncate(self, offset):
+        """
+        Called by OrderEngine.load_checkpoint(), cuts the file back to an offset returned by offset(), so that the outputs of
+        a resumed run are appended right after the ones written before the checkpoint. Nothing is done if offset is None.
+        """
+        if offset is None:
+            return
+        with open(self.file_path, "r+b") as f:
+            f.truncate(offset)
+        # the header (if any) is already in the file
+        self.buffer  = []
+        self.created = True
+
+    def close(self):
+        """
+        Flushes the remaining buffer, called by OrderEngine.save_to_file()
+        """
+        if self.closed:
+            return
+        self.flush()
+        self.closed = True
+
+class CsvSink(OutputSink):
+    """
+    OutputSink for csv files, whose rows are written as lists of values.
+
+    Rows are buffered as they are and only turned into strings when the buffer is flushed,
+    so no formatting is done while the orders are being matched.
+    converters maps column indices to functions that are applied to the values of that column at that point,
+    e.g. to turn integer price ticks into prices.
+    """
+    def __init__(self, file_path, flush_size=4096, header=None, writer=None, converters=None):
+        self.converters = converters # dict, Key: column index, Value: function applied to the values of the column when formatting
+        super().__init__(file_path, flush_size, header, writer)
+
+    def write_row(self, row):
+        """
+        Arguments:
+            row: list or tuple of values, will be written as a comma seperated line
+        """
+        self.buffer.append(row)
+        if len(self.buffer) >= self.flush_size:
+            self.flush()
+
+    def format_buffer(self, buffer):
+        if self.converters:
+            self.convert_buffer(buffer)
+        # the header (and any other raw line) is stored as a string next to the rows
+        return "".join([
+            row if isinstance(row, str) else ",".join([str(x) for x in row]) + "\n"
+            for row in buffer
+        ])
+
+    def convert_buffer(self, buffer):
+        """
+        Applies self.converters to the rows in a flushed buffer
+        """
+        converters = list(self.converters.items())
+        for i, row in enumerate(buffer):
+            if isinstance(row, str):
+                continue
+            row = list(row)
+            for column, converter in converters:
+                row[column] = converter(row[column])
+            buffer[i] = row
+
+class Divergence(Exception):
+    """
+    Raised by GoldenSink at the first line of an output that differs from its golden file
+    """
+    def __init__(self, golden_path, line_number, expected, actual):
+        self.golden_path = golden_path # path of the golden file
+        self.line_number = line_number # number of the line (starting from 1, the header included) that differs
+        self.expected    = expected    # line of the golden file, "" if the golden file ended before the output
+        self.actual      = actual      # line of the output, "" if the output ended before the golden file
+        super().__init__(f"{golden_path} differs at line {line_number}: expected {expected.rstrip() or 'end of file'!r}, got {actual.rstrip() or 'end of file'!r}")
+
+class GoldenSink(CsvSink):
+    """
+    CsvSink that checks its rows against a golden file instead of writing them, used by the verification mode of OrderEngine.
+
+    Each row is formatted as soon as it is written and compared with the next line of the golden file, which is read line by line,
+    so outputs of any size are checked without holding either of them in memory. The first row that differs raises a Divergence
+    right away, while the engine is still at the message that produced it. close() raises one if the golden file has more lines.
+    Nothing is buffered, so flush_size and writer are ignored.
+    """
+    def __init__(self, file_path, flush_size=4096, header=None, writer=None, converters=None, golden_dir=None):
+        self.golden_path = os.path.join(golden_dir, os.path.basename(file_path)) # golden file with the same name as the output, in golden_dir
+        self.golden      = open(self.golden_path)
+        self.num_lines   = 0 # number of lines checked so far
+        super().__init__(file_path, flush_size, header, None, converters)
+
+    def write(self, text):
+        for line in text.splitlines(keepends=True):
+            self.check(line)
+
+    def write_row(self, row):
+        self.check(self.format_buffer([row]))
+
+    def check(self, line):
+        expected = self.golden.readline()
+        self.num_lines += 1
+        if line != expected:
+            raise Divergence(self.golden_path, self.num_lines, expected, line)
+
+    def flush(self):
+        pass
+
+    def offset(self):
+        return None
+
+    def stop(self):
+        """
+        Closes the golden file without checking the lines left in it, called after a divergence
+        """
+        self.golden.close()
+        self.closed = True
+
+    def close(self):
+        """
+        Checks that the golden file has no lines left, and closes it
+        """
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            expected = self.golden.readline()
+            if expected != "":
+                raise Divergence(self.golden_path, self.num_lines + 1, expected, "")
+        finally:
+            self.golden.close()
+
+class NpySink(CsvSink):
+    """
+    Binary columnar alternative to CsvSink, written to a directory with one NumPy .npy file per column.
+
+    Rows are written and buffered just like in CsvSink, but a flush turns each column of the buffer into a typed array
+    and appends its raw bytes to the column's file, without formatting any of the values as text.
+    The names of the columns are listed in order in columns.txt.
+    Each file starts with a .npy header of a fixed size, whose shape is rewritten after every flush, so the files are valid
+    at all times and can be memory-mapped for analysis with load_columns(), without a parse step.
+
+    columns has an entry for each column of the rows, a (name, dtype) pair. If name is a tuple of names, the values
+    of that column are tuples, which are split into a seperate file for each of their items, all of the same dtype.
+    Missing values (None) are written as NaN in float columns and as 0 in integer columns.
+    converters maps column indices to functions that are applied to the typed arrays of that column.
+    """
+    HEADER_SIZE = 128 # size of the .npy header (including the magic string), enough for a shape of any int64 row count
+
+    def __init__(self, dir_path, columns, flush_size=4096, writer=None, converters=None):
+        self.columns  = [(names if isinstance(names, tuple) else (names,), np.dtype(dtype)) for names, dtype in columns]
+        self.num_rows = 0 # number of rows written to the files so far
+        super().__init__(dir_path, flush_size, None, writer, converters)
+
+    def column_path(self, name):
+        return os.path.join(self.file_path, name + ".npy")
+
+    def npy_header(self, dtype):
+        """
+        Returns the .npy (version 1.0) header of a column with self.num_rows values of the given dtype, padded to HEADER_SIZE bytes
+        """
+        header = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (np.lib.format.dtype_to_descr(dtype), self.num_rows)
+        header = header.ljust(self.HEADER_SIZE - 10 - 1) + "\n"
+        return b"\x93NUMPY\x01\x00" + len(header).to_bytes(2, "little") + header.encode("latin1")
+
+    def format_buffer(self, buffer):
+        """
+        Returns the columns of a flushed buffer as a list of (name, array) pairs
+        """
+        values  = list(zip(*buffer)) if buffer else [()] * len(self.columns)
+        columns = []
+        for i, (names, dtype) in enumerate(self.columns):
+            array = self.to_array(values[i], dtype)
+            if self.converters and i in self.converters:
+                array = self.converters[i](array)
+            if len(names) == 1:
+                columns.append((names[0], array))
+            else:
+                array = array.reshape(-1, len(names))
+                columns += [(name, array[:, j]) for j, name in enumerate(names)]
+        return columns
+
+    @staticmethod
+    def to_array(values, dtype):
+        try:
+            return np.array(values, dtype=dtype)
+        except TypeError:
+            # integer columns can't hold None, missing values are written as 0
+            return np.array([0 if x is None else x for x in values], dtype=dtype)
+
+    def write_buffer(self, buffer):
+        """
+        Appends the columns of a flushed buffer to their files, then updates the row count in their headers
+        """
+        columns = self.format_buffer(buffer)
+        if not self.created:
+            os.makedirs(self.file_path, exist_ok=True)
+            # the order of the columns is recorded next to them, to be kept by load_columns()
+            with open(os.path.join(self.file_path, "columns.txt"), "w") as f:
+                f.write("".join([name + "\n" for name, array in columns]))
+            for name, array in columns:
+                with open(self.column_path(name), "wb") as f:
+                    f.write(self.npy_header(array.dtype))
+            self.created = True
+
+        self.num_rows += len(buffer)
+        for name, array in columns:
+            with open(self.column_path(name), "r+b") as f:
+                f.seek(0, os.SEEK_END)
+                f.write(np.ascontiguousarray(array).tobytes())
+                f.seek(0)
+                f.write(self.npy_header(array.dtype))
+
+    def offset(self):
+        """
+        Same as OutputSink.offset(), but returns the number of rows written to the files
+        """
+        if not self.created:
+            return None
+        return self.num_rows
+
+    def truncate(self, num_rows):
+        """
+        Same as OutputSink.truncate(), but cuts the files back to num_rows rows
+        """
+        if num_rows is None:
+            return
+        self.num_rows = num_rows
+        for names, dtype in self.columns:
+            for name in names:
+                with open(self.column_path(name), "r+b") as f:
+                    f.truncate(self.HEADER_SIZE + num_rows * dtype.itemsize)
+                    f.write(self.npy_header(dtype))
+        self.buffer  = []
+        self.created = True
+
+def load_columns(dir_path):
+    """
+    Memory-maps the columns saved by an NpySink
+
+    Returns:
+        columns: dict, Key: column name, Value: read-only numpy memmap of the column, can be passed to pandas.DataFrame() as it is
+    """
+    with open(os.path.join(dir_path, "columns.txt")) as f:
+        names = f.read().split()
+    return {name: np.load(os.path.join(dir_path, name + ".npy"), mmap_mode="r") for name in names}
+
+class SinkWriter(object):
+    """
+    Writer stage of OrderEngine's concurrent_mode. A thread that formats and writes the buffers flushed by OutputSinks,
+    so that the matching thread only hands over the rows it produced.
+
+    Buffers are taken in the order they are submitted, so the rows of each file stay in order. The queue between the sinks and
+    the thread holds at most queue_size buffers, the matching thread waits if the writer falls behind.
+    The thread is only started by start(), so that OrderEngine can start its parser process before it.
+    """
+    def __init__(self, queue_size=16):
+        self.queue  = queue.Queue(maxsize=queue_size)
+        self.error  = None # first exception raised while writing, raised again by submit() and close()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        """
+        Called by OrderEngine.match_file(), starts the thread, if it isn't already running
+        """
+        if self.thread.ident is None:
+            self.thread.start()
+
+    def submit(self, sink, buffer):
+        """
+        Called by OutputSink.flush(), queues a buffer to be written to the file of sink
+        """
+        if self.error is not None:
+            raise self.error
+        if self.thread.ident is None:
+            self.start()
+        self.queue.put((sink, buffer))
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                break
+            sink, buffer = item
+            # after an error the queue is still emptied, so that submit() doesn't block
+            if self.error is None:
+                try:
+                    sink.write_buffer(buffer)
+                except Exception as e:
+                    self.error = e
+            self.queue.task_done()
+
+    def wait(self):
+        """
+        Waits until all the buffers submitted so far are written, called by OrderEngine.checkpoint()
+        """
+        self.queue.join()
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        """
+        Waits until all the submitted buffers are written, then stops the thread
+        """
+        # the buffers submitted before the run started are written too
+        self.start()
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
@@ -0,0 +1,153 @@
+"""
+Memory benchmark for the order representation, reports the number of bytes each resting order takes.
+
+Three numbers are reported for each size:
+    dict orders:  an orderA and its orderE as they were before __slots__ (the copies below), string ids and keys,
+                  float prices, and the entries that index them by id and by key
+    slots orders: the same with the current order types, int ids and keys, tick prices and interned asset names
+    engine:       a resting order in OrderEngine, the orderA and orderE together with all their entries in OrderTree and OrderQue
+
+Run from the repository root:
+    python -m benchmarks.bench_order_memory
+"""
+import gc
+import tracemalloc
+from sys import intern
+
+from LOB.OrderEngine import OrderEngine
+from LOB.OrderTypes  import orderA, orderE
+
+NUM_ORDERS = [10_000, 100_000]
+NUM_LEVELS = 50
+
+def make_lines(num_orders):
+    """
+    Returns input lines that add and execute num_orders orders which never cross,
+    bids below 20.00 and asks above it, spread over NUM_LEVELS price levels on each side
+    """
+    lines = []
+    for i in range(num_orders):
+        side   = "B" if i % 2 == 0 else "S"
+        offset = (i // 2) % NUM_LEVELS + 1
+        price  = 20.0 - offset * 0.01 if side == "B" else 20.0 + offset * 0.01
+        id     = 7621969089428000000 + i
+        time   = 1663743600000000000 + i * 1000
+        lines.append(f"{time},{time},A,GARAN.E,{side},{price:.2f},{i + 1},100,{id}")
+        lines.append(f"{time},{time + 1},E,GARAN.E,{side},0.0,0,100,{id}")
+    return lines
+
+class dict_orderA:
+    """
+    Copy of orderA before __slots__, only the attributes are kept
+    """
+    def __init__(self, network_time, bist_time, msg_type, asset_name, side, price, que_loc, qty, id, ord_engine):
+        self.network_time     = network_time
+        self.bist_time        = bist_time
+        self.msg_type         = msg_type
+        self.asset_name       = asset_name
+        self.side             = side
+        self.price            = price
+        self.que_loc          = que_loc
+        self.id               = id
+        self.qty              = qty
+        self.qty_not_executed = qty
+        self.canceled         = False
+        self.order_stack      = []
+        self.ord_engine       = ord_engine
+
+class dict_orderE:
+    """
+    Copy of orderE before __slots__, only the attributes are kept
+    """
+    def __init__(self, dict):
+        self.id                = dict["id"]
+        self.qty               = dict["qty"]
+        self.qty_not_matched   = dict["qty"]
+        self.msg_type          = dict["msg_type"]
+        self.network_time      = dict["network_time"]
+        self.bist_time         = dict["bist_time"]
+        self.key               = dict["id"] + str(dict["bist_time"])
+        self.side              = None
+        self.price             = None
+        self.que_loc           = None
+        self.order_list        = None
+        self.orderA            = None
+        self.order_tree        = None
+
+    def populate_attributes_from_orderA(self, orderA):
+        self.side         = orderA.side
+        self.price        = orderA.price
+        self.que_loc      = orderA.que_loc
+        self.orderA       = orderA
+
+def dict_orders(lines):
+    """
+    Builds the orders of lines the way they were parsed before __slots__,
+    returns the dicts that index the orderAs by id and the orderEs by key
+    """
+    orderAs, orderEs = {}, {}
+    for line in lines:
+        network_time, bist_time, msg_type, asset_name, side, price, que_loc, qty, id = line.split(",")
+        if msg_type == "A":
+            orderAs[id] = dict_orderA(int(network_time), int(bist_time), msg_type, asset_name, side, float(price),
+                                      int(que_loc), int(qty), id, None)
+        else:
+            order = dict_orderE({"id": id, "qty": int(qty), "msg_type": msg_type,
+                                 "network_time": int(network_time), "bist_time": int(bist_time)})
+            orderAs[id].order_stack.append(order)
+            order.populate_attributes_from_orderA(orderAs[id])
+            orderEs[order.key] = order
+    return orderAs, orderEs
+
+def slots_orders(lines):
+    """
+    Builds the orders of lines with the current order types, as OrderEngine.parse_line does,
+    returns the dicts that index the orderAs by id and the orderEs by key
+    """
+    orderAs, orderEs = {}, {}
+    for line in lines:
+        network_time, bist_time, msg_type, asset_name, side, price, que_loc, qty, id = line.split(",")
+        id = int(id)
+        if msg_type == "A":
+            orderAs[id] = orderA(int(network_time), int(bist_time), msg_type, intern(asset_name), side,
+                                 round(float(price) * 100), int(que_loc), int(qty), id, None)
+        else:
+            order = orderE(id, int(qty), msg_type, int(network_time), int(bist_time))
+            orderAs[id].process_execute_order(order)
+            orderEs[order.key] = order
+    return orderAs, orderEs
+
+def engine_orders(lines):
+    """
+    Processes lines with an OrderEngine, returns the engine
+    """
+    engine = OrderEngine(output_mode=[])
+    for line in lines:
+        engine.process_order(line)
+    assert len(engine.OpenBids) + len(engine.OpenAsks) == len(lines) // 2
+    return engine
+
+def bytes_per_order(build, num_orders):
+    """
+    Returns the number of bytes traced while build(lines) creates num_orders resting orders, per order
+    """
+    lines  = make_lines(num_orders)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    orders = build(lines)
+    gc.collect()
+    after  = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del orders
+    return (after - before) / num_orders
+
+def main():
+    print("bytes per resting order")
+    print(f"{'orders':>8} | {'dict orders':>11} | {'slots orders':>12} | {'engine':>8}")
+    for num_orders in NUM_ORDERS:
+        sizes = [bytes_per_order(build, num_orders) for build in (dict_orders, slots_orders, engine_orders)]
+        print(f"{num_orders:>8} | {sizes[0]:>11.1f} | {sizes[1]:>12.1f} | {sizes[2]:>8.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Microbenchmark for OrderQue, measures the cost of canceling an order from the middle of a price level
+and of removing the head order, as the number of orders at the level grows.
+
+Run from the repository root:
+    python -m benchmarks.bench_order_que
+"""
+import random
+import time
+
+from LOB.OrderQue   import OrderQue
+from LOB.OrderTypes import orderE
+
+DEPTHS      = [100, 1_000, 10_000, 100_000]
+NUM_CANCELS = 1_000
+NUM_POPS    = 1_000
+
+def make_order(i):
+    order = orderE(i, 100, "E", i, i)
+    order.que_loc = i
+    return order
+
+def fill_que(depth):
+    order_que = OrderQue()
+    orders = [make_order(i) for i in range(depth)]
+    random.shuffle(orders)
+    for order in orders:
+        order_que.append_order(order)
+    return order_que, orders
+
+def bench_cancel(depth):
+    """
+    Returns the average time (in microseconds) of canceling a random order at a level of the given depth
+    """
+    order_que, orders = fill_que(depth)
+    to_cancel = random.sample(orders, min(NUM_CANCELS, depth // 2))
+    start = time.perf_counter()
+    for order in to_cancel:
+        order_que.remove_order_by_key(order.key)
+    return (time.perf_counter() - start) / len(to_cancel) * 1e6
+
+def bench_pop(depth):
+    """
+    Returns the average time (in microseconds) of getting and removing the head order at a level of the given depth
+    """
+    order_que, orders = fill_que(depth)
+    num_pops = min(NUM_POPS, depth // 2)
+    start = time.perf_counter()
+    for _ in range(num_pops):
+        order_que.get_head()
+        order_que.remove_head_order()
+    return (time.perf_counter() - start) / num_pops * 1e6
+
+def main():
+    random.seed(0)
+    print(f"{'depth':>8} | {'cancel (us)':>11} | {'head pop (us)':>13}")
+    for depth in DEPTHS:
+        print(f"{depth:>8} | {bench_cancel(depth):>11.3f} | {bench_pop(depth):>13.3f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark of the book implementations of OrderEngine (see BOOK_TYPES), on GARAN.E.mini.csv and on a synthetic deep book,
+where many price levels are filled up before being swept by aggressive orders and canceled.
+
+Run from the repository root:
+    python -m benchmarks.bench_order_tree
+"""
+import random
+import time
+
+from LOB.OrderEngine import OrderEngine, InvalidOrder, BOOK_TYPES
+from LOB.OrderTree   import OrderTree
+from LOB.OrderLadder import OrderLadder
+
+INPUT_FILE  = "GARAN.E.mini.csv"
+NUM_LEVELS  = 400 # price levels on each side of the synthetic book
+LEVEL_DEPTH = 25  # orders per level of the synthetic book
+NUM_SWEEPS  = 2_000
+NUM_CHURNS  = 20_000 # number of times the best level is emptied and refilled in the level churn benchmark
+REPEATS     = 3
+
+def read_lines(file_name):
+    with open(file_name) as f:
+        return [l for l in f.read().splitlines() if l != ""]
+
+def make_deep_book_lines():
+    """
+    Returns input lines that fill NUM_LEVELS levels of LEVEL_DEPTH orders on each side around 20.00,
+    followed by NUM_SWEEPS aggressive orders sweeping a random number of levels, each followed by a cancel
+    """
+    random.seed(0)
+    lines = []
+    id    = 7621969089428000000
+    time  = 1663743600000000000
+    def add(side, ticks, qty):
+        nonlocal id, time
+        id   += 1
+        time += 1000
+        lines.append(f"{time},{time},A,GARAN.E,{side},{ticks / 100:.2f},{id % 100000},{qty},{id}")
+        lines.append(f"{time},{time + 1},E,GARAN.E,{side},0.0,0,{qty},{id}")
+        return id
+
+    resting = []
+    for level in range(1, NUM_LEVELS + 1):
+        for _ in range(LEVEL_DEPTH):
+            resting.append(add("B", 2000 - level, 100))
+            resting.append(add("S", 2000 + level, 100))
+    random.shuffle(resting)
+
+    for _ in range(NUM_SWEEPS):
+        side   = random.choice("BS")
+        levels = random.randint(1, 5)
+        ticks  = 2000 + NUM_LEVELS if side == "B" else 2000 - NUM_LEVELS
+        add(side, ticks, 100 * LEVEL_DEPTH * levels)
+        time += 1000
+        lines.append(f"{time},{time},D,GARAN.E,B,0.0,0,0,{resting.pop()}")
+    return lines
+
+def bench(lines, book_type):
+    """
+    Returns the best time (in seconds) of processing the lines with a book of the given type, out of REPEATS runs
+    """
+    best = None
+    for _ in range(REPEATS):
+        engine = OrderEngine(output_mode=[], book_type=book_type)
+        start = time.perf_counter()
+        for line in lines:
+            # rejected lines are skipped as process_line_record() does, any other error is a bug of the book
+            try:
+                engine.process_order(line)
+            except InvalidOrder:
+                pass
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def bench_level_churn(book):
+    """
+    Returns the average time (in microseconds) of emptying the best level of a book with NUM_LEVELS levels and creating it again,
+    which is what happens to the book at the end of each aggressive sweep
+    """
+    for price in range(2000 - NUM_LEVELS, 2000):
+        book.create_price(price)
+    start = time.perf_counter()
+    for _ in range(NUM_CHURNS):
+        price = book.max_price
+        book.remove_price(price)
+        book.create_price(price)
+    return (time.perf_counter() - start) / NUM_CHURNS * 1e6
+
+def main():
+    scenarios = [
+        (INPUT_FILE, read_lines(INPUT_FILE)),
+        (f"deep book ({NUM_LEVELS}x{LEVEL_DEPTH} per side)", make_deep_book_lines()),
+    ]
+    for name, lines in scenarios:
+        print(f"\n{name}, {len(lines)} messages")
+        print(f"{'book_type':>10} | {'seconds':>8} | {'msgs/sec':>10}")
+        for book_type in BOOK_TYPES:
+            elapsed = bench(lines, book_type)
+            print(f"{book_type:>10} | {elapsed:>8.4f} | {len(lines) / elapsed:>10.0f}")
+
+    print(f"\nlevel churn ({NUM_LEVELS} levels)")
+    print(f"{'book_type':>10} | {'us per churn':>12}")
+    for book_type, book in [("tree", OrderTree(isbid=True)), ("ladder", OrderLadder(isbid=True))]:
+        print(f"{book_type:>10} | {bench_level_churn(book):>12.3f}")
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,27 @@
 INPUT_FILE_NAME  = "GARAN.E.mini.csv"
 DEBUG_MODE       = 0
-CONCURRENT_MODE  = 0
+CONCURRENT_MODE  = 0      # if True, parsing and writing the outputs run in parallel with matching, see LOB.OrderEngine.parsed_chunks_concurrent
+OUTPUT_MODE      = "full" # "fast" skips the LOB.txt text output and the progress prints, see LOB.OrderEngine.OUTPUT_MODES
+OUTPUT_FORMAT    = "csv"  # "npy" writes the csv outputs as directories of NumPy column files, see LOB.OrderEngine.OUTPUT_FORMATS
+MULTI_SYMBOL     = 0      # if True, keeps a seperate book for each asset_name and runs the shares on NUM_WORKERS processes
+NUM_WORKERS      = None   # number of worker processes in MULTI_SYMBOL mode, defaults to the number of CPUs
+BAR_INTERVAL     = None   # if set, bars of this many seconds of bist_time are saved to output/bars.mini.csv, see LOB.Bars.BarAggregator
+QUOTE_DEPTH      = None   # if set, each change of this many best levels of the book is saved to output/quotes.mini.csv, see LOB.OrderEngine.quotes_to_file
+VERIFY_DIR       = None   # if set, the trades, market and lob outputs are checked against the golden files in this directory instead of being written, see LOB.OrderEngine.verify_with_file
 
 from LOB.OrderEngine import OrderEngine
+from LOB.MultiEngine import MultiOrderEngine
 
 def main():
+    if MULTI_SYMBOL:
+        engine_kwargs = dict(price_file="market_data.mini.csv", trades_file="trades.mini.csv", order_book_file="LOB.mini.txt", orderA_file="closed_orders.mini.txt", lob_file="LOB.mini.csv", rejects_file="rejects.mini.csv", output_mode=OUTPUT_MODE, output_format=OUTPUT_FORMAT, bar_interval=BAR_INTERVAL, bars_file="bars.mini.csv", quote_depth=QUOTE_DEPTH, quotes_file="quotes.mini.csv")
+        MultiOrderEngine(num_workers=NUM_WORKERS, engine_kwargs=engine_kwargs).run_with_file(INPUT_FILE_NAME)
+        return
     # ord_engine = OrderEngine(debug_mode=DEBUG_MODE)
-    ord_engine = OrderEngine(debug_mode=DEBUG_MODE, concurrent_mode=CONCURRENT_MODE, price_file="market_data.mini.csv", trades_file="trades.mini.csv", order_book_file="LOB.mini.txt", orderA_file="closed_orders.mini.txt", lob_file="LOB.mini.csv")
+    ord_engine = OrderEngine(debug_mode=DEBUG_MODE, concurrent_mode=CONCURRENT_MODE, price_file="market_data.mini.csv", trades_file="trades.mini.csv", order_book_file="LOB.mini.txt", orderA_file="closed_orders.mini.txt", lob_file="LOB.mini.csv", rejects_file="rejects.mini.csv", output_mode=OUTPUT_MODE, output_format=OUTPUT_FORMAT, bar_interval=BAR_INTERVAL, bars_file="bars.mini.csv", quote_depth=QUOTE_DEPTH, quotes_file="quotes.mini.csv", golden_dir=VERIFY_DIR)
+    if VERIFY_DIR is not None:
+        ord_engine.verify_with_file(INPUT_FILE_NAME)
+        return
     ord_engine.run_with_file(INPUT_FILE_NAME)
 
 if __name__ == '__main__':
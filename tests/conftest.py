@@ -0,0 +1,39 @@
+import os
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture
+def mini_file():
+    """
+    The sample input of the repository, 10000 lines of GARAN.E
+    """
+    return os.path.join(ROOT, "GARAN.E.mini.csv")
+
+@pytest.fixture
+def read_outputs():
+    """
+    Returns a function that reads the output files of a directory into a dict of their name and content
+    """
+    def read(output_dir):
+        outputs = {}
+        for name in sorted(os.listdir(output_dir)):
+            path = os.path.join(output_dir, name)
+            if os.path.isfile(path):
+                with open(path) as f:
+                    outputs[name] = f.read()
+        return outputs
+    return read
+
+@pytest.fixture
+def multi_file(tmp_path, mini_file):
+    """
+    An input with the orders of two shares, which MultiOrderEngine runs on different workers: the sample input as GARAN.E
+    and a copy of it as AKBNK.E, each line of the copy right after the line of GARAN.E it is made from
+    """
+    with open(mini_file) as f:
+        lines = f.read().rstrip().splitlines()
+    path = tmp_path / "multi.csv"
+    path.write_text("".join([line + "\n" + line.replace(",GARAN.E,", ",AKBNK.E,") + "\n" for line in lines]))
+    return str(path)
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from LOB.OrderEngine import OrderEngine, InvalidOrder
+
+def top_of_book_changes(mini_file):
+    """
+    Replays the sample input message by message and returns the bist_time of each message after which the top of the book changed,
+    with the (bid_price, bid_qty, ask_price, ask_qty) it changed to, in ticks
+    """
+    engine = OrderEngine(output_mode=[])
+    times, tops = [], []
+    last = engine.top_of_book()
+    with open(mini_file) as f:
+        for line in f.read().rstrip().splitlines():
+            try:
+                engine.process_order(line)
+            except InvalidOrder:
+                continue
+            top = engine.top_of_book()
+            if top != last:
+                times.append(int(line.split(",")[1]))
+                tops.append(top)
+                last = top
+    return np.array(times), np.array(tops)
+
+def integral(times, values, start, end):
+    """
+    Integral over [start, end) of the step function that takes values[i] from times[i] on
+    """
+    return (values * np.diff(np.clip(np.append(times, end), start, end))).sum()
+
+@pytest.mark.parametrize("bar_interval", [1, 10])
+def test_bars_match_the_trades_and_the_book_of_each_bucket(tmp_path, mini_file, bar_interval):
+    interval = bar_interval * 10**9
+    OrderEngine(output_mode="full", output_dir=str(tmp_path), bar_interval=bar_interval).run_with_file(mini_file)
+    bars   = pd.read_csv(tmp_path / "bars.csv")
+    trades = pd.read_csv(tmp_path / "trades.csv", usecols=["bist_time", "price", "qty"])
+    assert len(trades) > 1000
+
+    # open, high, low, close, volume, vwap and trades of the trades grouped by bucket
+    trades["bucket"]   = trades["bist_time"] // interval * interval
+    trades["notional"] = trades["price"] * trades["qty"]
+    grouped  = trades.groupby("bucket")
+    expected = pd.DataFrame({
+        "open":   grouped["price"].first(),
+        "high":   grouped["price"].max(),
+        "low":    grouped["price"].min(),
+        "close":  grouped["price"].last(),
+        "volume": grouped["qty"].sum(),
+        "vwap":   grouped["notional"].sum() / grouped["qty"].sum(),
+        "trades": grouped.size(),
+    })
+    traded = bars[bars["trades"] > 0].set_index("bist_time")
+    assert traded.index.tolist() == expected.index.tolist()
+    for column in ["open", "high", "low", "close"]:
+        assert traded[column].tolist() == pytest.approx(expected[column].tolist())
+    assert traded["volume"].tolist() == expected["volume"].tolist()
+    assert traded["trades"].tolist() == expected["trades"].tolist()
+    assert traded["vwap"].tolist() == pytest.approx(expected["vwap"].tolist(), abs=1e-6)
+    assert (bars.loc[bars["trades"] == 0, ["open", "high", "low", "close", "vwap"]].isna()).all().all()
+    assert (bars.loc[bars["trades"] == 0, "volume"] == 0).all()
+
+    # the book is known from the first change of the top on, and up to the last one in the last bar
+    times, tops = top_of_book_changes(mini_file)
+    buckets = np.unique(times // interval * interval)
+    assert bars["bist_time"].tolist() == buckets.tolist()
+    bid_price, bid_qty, ask_price, ask_qty = tops.T
+    both = (bid_price > 0) & (ask_price > 0)
+    for bar, bucket in zip(bars.itertuples(), buckets.tolist()):
+        start, end = max(bucket, times[0]), min(bucket + interval, times[-1])
+        book_time   = integral(times, np.ones(len(times)), start, end)
+        spread_time = integral(times, both, start, end)
+        if book_time:
+            assert bar.bid_qty == pytest.approx(integral(times, bid_qty, start, end) / book_time, abs=0.01)
+            assert bar.ask_qty == pytest.approx(integral(times, ask_qty, start, end) / book_time, abs=0.01)
+        else:
+            assert np.isnan(bar.bid_qty) and np.isnan(bar.ask_qty)
+        if spread_time:
+            assert bar.spread * 100 == pytest.approx(integral(times, (ask_price - bid_price) * both, start, end) / spread_time, abs=1e-4)
+        else:
+            assert np.isnan(bar.spread)
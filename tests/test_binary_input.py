@@ -0,0 +1,52 @@
+import re
+
+from LOB.BinaryInput import convert_to_binary, read_binary_chunks, HEADER_SIZE, RECORD_DTYPE
+from LOB.OrderEngine import OrderEngine
+
+MALFORMED = [
+    "1663743600000000001,1663743600000000001,X,GARAN.E,B,19.93,1,100,5",
+    "1663743600000000001,1663743600000000001,A,GARAN.E,Q,19.93,1,100,5",
+    "0,1663743600000000001,A,GARAN.E,B,19.93,1,100,5",
+    "1663743600000000001,1663743600000000001,A,GARAN.E,B,19.935,1,100,5",
+    "1663743600000000001,1663743600000000001,A,GARAN.E,B,abc,1,100,5",
+    "1663743600000000001,1663743600000000001,A,GARAN.E,B",
+]
+
+def write_input(path, mini_file):
+    """
+    Writes the sample input with malformed lines in between, ending with an empty line and a line after it, which is never read
+    """
+    with open(mini_file) as f:
+        lines = f.read().rstrip().splitlines()
+    for i, line in enumerate(MALFORMED):
+        lines.insert(1000 * (i + 1), line)
+    path.write_text("\n".join(lines) + "\n\nafter,the,end\n")
+    return str(path)
+
+def test_binary_replay_gives_the_outputs_of_the_csv(tmp_path, mini_file, read_outputs):
+    csv_file = write_input(tmp_path / "input.csv", mini_file)
+    num_records = convert_to_binary(csv_file, str(tmp_path / "input.bin"))
+    assert num_records == 10000 + len(MALFORMED)
+
+    OrderEngine(output_mode="full", output_dir=str(tmp_path / "csv"), chunk_size=50000).run_with_file(csv_file)
+    OrderEngine(output_mode="full", output_dir=str(tmp_path / "bin"), chunk_size=50000).run_with_file(str(tmp_path / "input.bin"))
+    csv, binary = read_outputs(tmp_path / "csv"), read_outputs(tmp_path / "bin")
+    # the progress in the text output is the fraction of the bytes of the input read, which differs between the two files
+    for outputs in [csv, binary]:
+        outputs["LOB.txt"] = re.sub(r"\(\s*[\d.]+%\)", "", outputs["LOB.txt"])
+    assert binary == csv
+    # the sample input has 8 lines that aren't orders
+    assert csv["rejects.csv"].count("\n") == 1 + 8 + len(MALFORMED)
+    assert "END OF FILE REACHED" in csv["LOB.txt"]
+
+def test_reading_from_the_last_record_on_only_yields_the_end_of_the_input(tmp_path, mini_file):
+    bin_file = str(tmp_path / "input.bin")
+    num_records = convert_to_binary(write_input(tmp_path / "input.csv", mini_file), bin_file)
+    end = HEADER_SIZE + num_records * RECORD_DTYPE.itemsize
+
+    last = end - RECORD_DTYPE.itemsize
+    chunks = list(read_binary_chunks(bin_file, 1 << 20, 0.01, start=last))
+    assert [(start, stop, len(records), records[-1]) for start, stop, records, invalid in chunks] == [(last, end, 2, None)]
+
+    for start in [end, end + RECORD_DTYPE.itemsize]:
+        assert list(read_binary_chunks(bin_file, 1 << 20, 0.01, start=start)) == [(end, end, [None], [])]
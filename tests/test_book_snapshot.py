@@ -0,0 +1,44 @@
+from LOB.OrderEngine import OrderEngine
+
+# lines 6 to 2099 of the sample input share the same bist_time, the book is taken in the middle of them
+CUT = 1000
+
+def test_run_from_a_snapshot_gives_the_tail_of_a_full_run(tmp_path, mini_file):
+    full = OrderEngine(output_mode="full", output_dir=str(tmp_path / "full"))
+    full.run_with_file(mini_file)
+    full.write_book_snapshot(str(tmp_path / "full.csv"))
+
+    with open(mini_file) as f:
+        lines = f.read().splitlines()
+    assert lines[CUT - 1].split(",")[1] == lines[CUT].split(",")[1]
+    head_file = tmp_path / "head.csv"
+    head_file.write_text("\n".join(lines[:CUT]) + "\n")
+    head = OrderEngine(output_mode="full", output_dir=str(tmp_path / "head"))
+    head.run_with_file(str(head_file))
+    head.write_book_snapshot(str(tmp_path / "head_book.csv"))
+
+    tail = OrderEngine(output_mode="full", output_dir=str(tmp_path / "tail"))
+    tail.run_from_book(str(tmp_path / "head_book.csv"), mini_file)
+    assert tail.start_line == CUT
+    tail.write_book_snapshot(str(tmp_path / "tail.csv"))
+
+    # the trades of the full run all come after the cut, the rejects are split by line number
+    def read(name):
+        return (tmp_path / name).read_text().splitlines()
+    assert read("head/trades.csv")[1:] == []
+    assert read("tail/trades.csv") == read("full/trades.csv")
+    assert read("head/rejects.csv") + read("tail/rejects.csv")[1:] == read("full/rejects.csv")
+    assert read("tail.csv") == read("full.csv")
+
+def test_start_time_takes_all_the_lines_of_that_time_as_processed(tmp_path, mini_file):
+    with open(mini_file) as f:
+        lines = f.read().splitlines()
+    head_file = tmp_path / "head.csv"
+    head_file.write_text("\n".join(lines[:CUT]) + "\n")
+    head = OrderEngine(output_mode=[])
+    head.run_with_file(str(head_file))
+    head.write_book_snapshot(str(tmp_path / "head_book.csv"))
+
+    tail = OrderEngine(output_mode=[])
+    tail.run_from_book(str(tmp_path / "head_book.csv"), mini_file, start_time=int(lines[CUT - 1].split(",")[1]))
+    assert tail.start_line == 2100
@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from LOB.OrderEngine import OrderEngine
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the run is killed at the 7000th record, after a few checkpoints, with nothing saved or flushed
+CRASH_SCRIPT = """
+import os, sys
+from LOB.OrderEngine import OrderEngine
+engine = OrderEngine(**{kwargs!r})
+process_record = engine.process_record
+processed = [0]
+def process_or_crash(record):
+    processed[0] += 1
+    if processed[0] == 7000:
+        os._exit(3)
+    process_record(record)
+engine.process_record = process_or_crash
+engine.run_with_file({input_file!r})
+"""
+
+def engine_kwargs(output_dir, concurrent_mode):
+    return dict(output_mode="full", output_dir=str(output_dir), concurrent_mode=concurrent_mode, chunk_size=30000, flush_size=100,
+                checkpoint_file=str(output_dir) + ".ckpt", checkpoint_every=1500, bar_interval=1, quote_depth=3, quote_throttle=0.05)
+
+@pytest.mark.parametrize("concurrent_mode", [False, True])
+def test_resumed_run_gives_the_outputs_of_an_uninterrupted_one(tmp_path, mini_file, read_outputs, concurrent_mode):
+    kwargs = engine_kwargs(tmp_path / "full", concurrent_mode)
+    del kwargs["checkpoint_file"]
+    OrderEngine(**kwargs).run_with_file(mini_file)
+
+    kwargs = engine_kwargs(tmp_path / "resumed", concurrent_mode)
+    crashed = subprocess.run([sys.executable, "-c", CRASH_SCRIPT.format(kwargs=kwargs, input_file=mini_file)], cwd=ROOT,
+                             stdout=subprocess.DEVNULL)
+    assert crashed.returncode == 3
+    assert os.path.exists(kwargs["checkpoint_file"])
+    OrderEngine(**kwargs).resume_from(kwargs["checkpoint_file"], mini_file)
+
+    full, resumed = read_outputs(tmp_path / "full"), read_outputs(tmp_path / "resumed")
+    assert sorted(full) == ["LOB.csv", "LOB.txt", "bars.csv", "closed_orders.txt", "market_data.csv", "quotes.csv", "rejects.csv", "trades.csv"]
+    assert resumed == full
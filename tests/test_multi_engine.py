@@ -0,0 +1,43 @@
+import pandas as pd
+
+from LOB.MultiEngine import MultiOrderEngine
+from LOB.OrderEngine import OrderEngine
+
+def test_merged_closed_orders_are_a_single_csv(tmp_path, multi_file):
+    MultiOrderEngine(num_workers=2, output_dir=str(tmp_path / "out"), engine_kwargs=dict(output_mode="full")).run_with_file(multi_file)
+    with open(tmp_path / "out" / "closed_orders.txt") as f:
+        header = f.readline().rstrip("\n")
+    closed = pd.read_csv(tmp_path / "out" / "closed_orders.txt")
+    assert header == "network_time,bist_time,asset_name,side,price,que_loc,qty,id,qty_not_executed,canceled,order_stack"
+    assert list(closed.columns) == header.split(",")
+    assert sorted(closed["asset_name"].unique()) == ["AKBNK.E", "GARAN.E"]
+    # the two shares have the same orders
+    counts = closed["asset_name"].value_counts()
+    assert counts["AKBNK.E"] == counts["GARAN.E"] > 0
+
+def test_each_share_gives_the_rows_of_a_single_share_run(tmp_path, multi_file):
+    MultiOrderEngine(num_workers=2, output_dir=str(tmp_path / "multi"), engine_kwargs=dict(output_mode="full")).run_with_file(multi_file)
+
+    with open(multi_file) as f:
+        lines = f.read().splitlines()
+    for asset in ["GARAN.E", "AKBNK.E"]:
+        share_file = tmp_path / f"{asset}.csv"
+        share_file.write_text("".join([line + "\n" for line in lines if line.split(",")[3] == asset]))
+        OrderEngine(output_mode="full", output_dir=str(tmp_path / asset)).run_with_file(str(share_file))
+
+        for name in ["trades.csv", "market_data.csv", "LOB.csv"]:
+            merged = (tmp_path / "multi" / name).read_text().splitlines()
+            single = (tmp_path / asset / name).read_text().splitlines()
+            assert merged[0] == "asset_name," + single[0]
+            assert [row[len(asset) + 1:] for row in merged[1:] if row.startswith(asset + ",")] == single[1:]
+        closed = (tmp_path / "multi" / "closed_orders.txt").read_text().splitlines()
+        single = (tmp_path / asset / "closed_orders.txt").read_text().splitlines()
+        assert [row for row in closed[1:] if row.split(",")[2] == asset] == single[1:]
+        # the lines of the two shares alternate in the input, the reasons of the rejects are the same
+        rejects = pd.read_csv(tmp_path / "multi" / "rejects.csv")
+        single  = pd.read_csv(tmp_path / asset / "rejects.csv")
+        assert rejects[rejects["asset_name"] == asset]["reason"].tolist() == single["reason"].tolist() != []
+
+    # the merged rows are in order of bist_time
+    trades = pd.read_csv(tmp_path / "multi" / "trades.csv", index_col=False)
+    assert trades["bist_time"].is_monotonic_increasing
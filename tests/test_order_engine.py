@@ -0,0 +1,18 @@
+from LOB.OrderEngine import OrderEngine
+
+def test_lines_given_one_by_one_are_matched_with_the_text_output(tmp_path):
+    # process_order() has no input file to report the progress in, nor chunks of lines
+    engine = OrderEngine(output_mode="full", output_dir=str(tmp_path))
+    lines  = [
+        "1663743600000000001,1663743600000000001,A,GARAN.E,B,19.93,1,100,7621969089428000001",
+        "1663743600000000002,1663743600000000002,E,GARAN.E,B,0.0,0,100,7621969089428000001",
+        "1663743600000000003,1663743600000000003,A,GARAN.E,S,19.93,2,60,7621969089428000002",
+        "1663743600000000004,1663743600000000004,E,GARAN.E,S,0.0,0,60,7621969089428000002",
+    ]
+    for line in lines:
+        engine.process_order(line)
+    assert len(engine.last_trades) == 1
+    assert engine.progress() == 0.0
+    engine.save_to_file()
+    assert "At Line       4" in (tmp_path / "LOB.txt").read_text()
+    assert (tmp_path / "trades.csv").read_text().count("\n") == 2
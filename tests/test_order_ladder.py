@@ -0,0 +1,40 @@
+from LOB.OrderEngine import OrderEngine
+
+def test_ladder_gives_the_outputs_of_the_tree(tmp_path, mini_file, read_outputs):
+    for book_type in ["tree", "ladder"]:
+        OrderEngine(output_mode="full", output_dir=str(tmp_path / book_type), book_type=book_type).run_with_file(mini_file)
+    tree, ladder = read_outputs(tmp_path / "tree"), read_outputs(tmp_path / "ladder")
+    assert sorted(tree) == ["LOB.csv", "LOB.txt", "closed_orders.txt", "market_data.csv", "rejects.csv", "trades.csv"]
+    assert ladder == tree
+
+def test_order_out_of_the_band_is_rejected_without_changing_the_book(tmp_path):
+    lines = [
+        "1,1663743600000000001,A,GARAN.E,S,19.94,1,100,1",
+        "1,1663743600000000002,E,GARAN.E,S,0.0,0,100,1",
+        "1,1663743600000000003,A,GARAN.E,B,19.90,2,50,2",
+        "1,1663743600000000004,E,GARAN.E,B,0.0,0,50,2",
+        # above 20.00, the highest price of the band
+        "1,1663743600000000005,A,GARAN.E,S,20.05,3,70,3",
+        "1,1663743600000000006,E,GARAN.E,S,0.0,0,70,3",
+        # below 19.80, it would have crossed the bid at 19.90
+        "1,1663743600000000007,A,GARAN.E,S,19.75,4,70,4",
+        "1,1663743600000000008,E,GARAN.E,S,0.0,0,70,4",
+    ]
+    input_file = tmp_path / "input.csv"
+    input_file.write_text("\n".join(lines) + "\n")
+
+    engine = OrderEngine(output_mode="full", output_dir=str(tmp_path / "out"), book_type="ladder", price_limits=(19.80, 20.00))
+    engine.run_with_file(str(input_file))
+
+    rejects = (tmp_path / "out" / "rejects.csv").read_text().splitlines()
+    assert rejects == [
+        "line,reason",
+        '6,"price 20.05 of order 3 is out of the price band of the book"',
+        '8,"price 19.75 of order 4 is out of the price band of the book"',
+    ]
+    assert (tmp_path / "out" / "trades.csv").read_text().count("\n") == 1
+    assert len(engine.OpenAsks.levels) == len(engine.OpenBids.levels) == 21
+    assert [(price, order_que.volume) for price, order_que in engine.OpenAsks.iter_levels()] == [(1994, 100)]
+    assert [(price, order_que.volume) for price, order_que in engine.OpenBids.iter_levels()] == [(1990, 50)]
+    assert engine.get_order_with_id(3).order_stack == []
+    assert engine.get_order_with_id(4).order_stack == []
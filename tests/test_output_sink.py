@@ -0,0 +1,21 @@
+from LOB.OrderEngine import OrderEngine
+from LOB.OutputSink  import OutputSink
+
+def test_text_sink_buffer_stays_bounded(tmp_path):
+    # the log messages start with a line break instead of ending with one
+    sink     = OutputSink(str(tmp_path / "log.txt"), flush_size=64)
+    messages = [f"\nmessage {i}" for i in range(10000)]
+    for message in messages:
+        sink.write(message)
+        assert len(sink.buffer) < 64
+    sink.close()
+    assert (tmp_path / "log.txt").read_text() == "".join(messages)
+
+def test_log_of_rejected_lines_is_flushed_during_the_run(tmp_path):
+    engine = OrderEngine(output_mode="full", output_dir=str(tmp_path), flush_size=64)
+    lines  = ["1,1,X,GARAN.E,B,19.93,1,100,1"] * 10000
+    engine.process_lines(lines, 0)
+    assert len(engine.output_stream.buffer) < 64
+    assert len(engine.rejects_stream.buffer) < 64
+    engine.save_to_file()
+    assert (tmp_path / "LOB.txt").read_text().count("Invalid order at line") == len(lines)
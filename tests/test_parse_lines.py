@@ -0,0 +1,50 @@
+import csv
+
+import pytest
+
+from LOB.OrderEngine import OrderEngine, InvalidOrder
+
+VALID = "1663743600000000001,1663743600000000002,A,GARAN.E,B,19.93,1,100,7621969089428000001"
+
+# malformed lines, with the reason each one is rejected for
+MALFORMED = [
+    ("1663743600000000001,1663743600000000002,X,GARAN.E,B,19.93,1,100,5",    "msg_type must be either A, E or D"),
+    ("1663743600000000001,1663743600000000002,X,GARAN.E,Q,19.93,1,100,5",    "msg_type must be either A, E or D"),
+    ("1663743600000000001,1663743600000000002,A,GARAN.E,Q,19.93,1,100,5",    "side must be either B or S"),
+    ("0,1663743600000000002,A,GARAN.E,B,19.93,1,100,5",                      "network_time must be a positive integer"),
+    ("1663743600000000001,0,A,GARAN.E,B,19.93,1,100,5",                      "bist_time must be a positive integer"),
+    ("1663743600000000001,1663743600000000002,A,GARAN.E,B,19.93,1,100,0",    "id must be a positive integer"),
+    ("1663743600000000001,1663743600000000002,A,GARAN.E,B,19.935,1,100,5",   "price must be a multiple of tick_size"),
+    ("1663743600000000001,1663743600000000002,A,GARAN.E,B,19.93,1,100",      "quote_list must have 9 elements"),
+    ("1663743600000000001,1663743600000000002,A,GARAN.E,B,19.93,1,100,5,6",  "quote_list must have 9 elements"),
+    ("1663743600000000001,1663743600000000002,A,GARAN.E,B,abc,1,100,5",      "could not convert string to float: 'abc'"),
+    ("1663743600000000001,1663743600000000002,A,GARAN.E,B,inf,1,100,5",      "cannot convert float infinity to integer"),
+    ("1663743600000000001,1663743600000000002,A,GARAN.E,B,19.93,1,x,5",      "invalid literal for int() with base 10: 'x'"),
+]
+
+def outcome(value):
+    """
+    Returns a comparable form of a value returned by parse_fields(), the message of an InvalidOrder
+    """
+    return str(value) if value.__class__ is InvalidOrder else value
+
+@pytest.mark.parametrize("line,reason", MALFORMED)
+def test_masks_reject_a_line_as_parse_fields_does(line, reason):
+    engine = OrderEngine(output_mode=[])
+    lines  = [VALID, line, VALID]
+    parsed = engine.parse_lines(lines)
+    assert [outcome(x) for x in parsed] == [outcome(engine.parse_fields(l.split(","))) for l in lines]
+    assert outcome(parsed[1]) == reason
+    assert parsed[0] == parsed[2] == (1663743600000000001, 1663743600000000002, "A", "GARAN.E", "B", 1993, 1, 100, 7621969089428000001)
+
+def test_rejected_line_numbers_and_reasons(tmp_path):
+    lines = []
+    for line, reason in MALFORMED:
+        lines += [VALID.replace("7621969089428000001", str(len(lines) + 1)), line]
+    input_file = tmp_path / "input.csv"
+    input_file.write_text("\n".join(lines) + "\n")
+
+    OrderEngine(output_mode="full", output_dir=str(tmp_path / "out")).run_with_file(str(input_file))
+    with open(tmp_path / "out" / "rejects.csv", newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows == [["line", "reason"]] + [[str(2 * (i + 1)), reason] for i, (line, reason) in enumerate(MALFORMED)]
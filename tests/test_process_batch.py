@@ -0,0 +1,87 @@
+import csv
+
+import numpy as np
+import pandas as pd
+
+from LOB.BinaryInput import convert_to_binary, HEADER_SIZE, RECORD_DTYPE
+from LOB.OrderEngine import OrderEngine, BATCH_COLUMNS
+
+def batch_inputs(tmp_path, mini_file):
+    """
+    Returns the messages of the sample input in the 3 shapes process_batch() takes: a structured array of the records of
+    its binary input file, a dict of arrays with str msg_type and side, and a DataFrame of it
+    """
+    num_records = convert_to_binary(mini_file, str(tmp_path / "input.bin"))
+    # the records are followed by the trailer of the file
+    records = np.fromfile(tmp_path / "input.bin", dtype=RECORD_DTYPE, count=num_records, offset=HEADER_SIZE)
+    columns = {name: records[name] for name in BATCH_COLUMNS}
+    columns["msg_type"] = columns["msg_type"].astype("U1")
+    columns["side"]     = columns["side"].astype("U1")
+    return {"structured": records, "dict": columns, "DataFrame": pd.DataFrame(columns)}
+
+def read_csv_rows(path):
+    with open(path, newline="") as f:
+        return list(csv.reader(f))[1:]
+
+def to_ticks(price):
+    return 0 if price == "None" else round(float(price) * 100)
+
+def test_process_batch_gives_the_fills_and_rejects_of_run_with_file(tmp_path, mini_file):
+    OrderEngine(output_mode="full", output_dir=str(tmp_path / "out")).run_with_file(mini_file)
+    trades  = read_csv_rows(tmp_path / "out" / "trades.csv")
+    rejects = read_csv_rows(tmp_path / "out" / "rejects.csv")
+    lob     = read_csv_rows(tmp_path / "out" / "LOB.csv")
+    assert len(trades) > 1000 and len(rejects) == 8
+
+    results = {}
+    for shape, columns in batch_inputs(tmp_path, mini_file).items():
+        fills, top, rejected = OrderEngine(output_mode=[]).process_batch(columns)
+        results[shape] = fills, top, rejected
+
+        # the trades file has the columns of the fills after index, with the price in tick_size units
+        assert list(zip(*[fills[name].tolist() for name in ["bist_time", "price", "qty", "bid_id", "bid_time", "ask_id", "ask_time"]])) == \
+               [(int(row[0]), to_ticks(row[1]), *map(int, row[2:7])) for row in trades]
+        # the rejects file counts the lines from 1
+        assert (rejected["index"] + 1).tolist() == [int(line) for line, reason in rejects]
+        assert rejected["reason"].tolist() == [reason for line, reason in rejects]
+
+        # the lob file has a row after each message that traded, whose best levels are the last top of the book before it
+        traded = np.unique(fills["index"])
+        last   = np.searchsorted(top["index"], traded, side="right") - 1
+        assert [(top["bid_price"][j], top["bid_qty"][j], top["ask_price"][j], top["ask_qty"][j]) for j in last.tolist()] == \
+               [(to_ticks(row[7]), int(row[8]), to_ticks(row[1]), int(row[2])) for row in lob]
+        assert (top["bist_time"] == columns["bist_time"][top["index"]]).all()
+
+    for fills, top, rejected in results.values():
+        for result, expected in zip([fills, top, rejected], results["structured"]):
+            assert result.keys() == expected.keys()
+            for name in result:
+                assert result[name].tolist() == expected[name].tolist()
+
+def test_process_batch_reports_the_changes_of_the_top_of_book(tmp_path):
+    columns = {
+        "network_time": [1, 1, 1, 1, 1, 1, 1, 1],
+        "bist_time":    [10, 11, 12, 13, 14, 15, 16, 17],
+        "msg_type":     ["A", "E", "A", "E", "A", "E", "D", "X"],
+        "side":         ["S", "S", "B", "B", "B", "B", "B", "B"],
+        "price":        [1994, 0, 1990, 0, 1994, 0, 0, 1990],
+        "que_loc":      [1, 0, 1, 0, 1, 0, 0, 1],
+        "qty":          [100, 100, 50, 50, 30, 30, 0, 10],
+        "id":           [1, 1, 2, 2, 3, 3, 2, 4],
+    }
+    columns = {name: np.array(column) for name, column in columns.items()}
+    fills, top, rejects = OrderEngine(output_mode=[]).process_batch(columns, first_index=100)
+
+    # the bid 3 crosses the ask 1 at 19.94, and a D of the bid 2 empties the bid side
+    assert fills["index"].tolist() == [105]
+    assert (fills["price"].tolist(), fills["qty"].tolist()) == ([1994], [30])
+    assert sorted(fills["bid_id"].tolist() + fills["ask_id"].tolist()) == [1, 3]
+    assert [tuple(top[name][i] for name in ["index", "bist_time", "bid_price", "bid_qty", "ask_price", "ask_qty"])
+            for i in range(len(top["index"]))] == [
+        (101, 11, 0,    0,  1994, 100),
+        (103, 13, 1990, 50, 1994, 100),
+        (105, 15, 1990, 50, 1994, 70),
+        (106, 16, 0,    0,  1994, 70),
+    ]
+    assert rejects["index"].tolist() == [107]
+    assert rejects["reason"].tolist() == ["msg_type must be either A, E or D"]
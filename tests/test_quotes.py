@@ -0,0 +1,86 @@
+import csv
+
+import pytest
+
+from LOB.OrderEngine import OrderEngine, InvalidOrder
+
+def brute_force_quotes(mini_file, depth, throttle):
+    """
+    Replays the sample input message by message, reading the best depth levels of each side after each E and D message by sorting all
+    the levels of the book, and keeps the last of each throttle window (of each message without one) that differs from the previous row
+    """
+    engine = OrderEngine(output_mode=[])
+    changes = []
+    last = ((), ())
+    with open(mini_file) as f:
+        for line in f.read().rstrip().splitlines():
+            try:
+                engine.process_order(line)
+            except InvalidOrder:
+                continue
+            asks = tuple(sorted([(price, order_que.volume) for price, order_que in engine.OpenAsks.iter_levels()])[:depth])
+            bids = tuple(sorted([(price, order_que.volume) for price, order_que in engine.OpenBids.iter_levels()], reverse=True)[:depth])
+            if (asks, bids) != last:
+                last = (asks, bids)
+                changes.append((int(line.split(",")[1]), last))
+
+    if throttle:
+        window = round(throttle * 1e9)
+        last_of_window = {}
+        for bist_time, quote in changes:
+            last_of_window[bist_time // window] = (bist_time, quote)
+        changes = list(last_of_window.values())
+    rows = []
+    for bist_time, (asks, bids) in changes:
+        row = [bist_time]
+        for levels in [asks, bids]:
+            for price, volume in levels:
+                row += [price, volume]
+            row += [None, None] * (depth - len(levels))
+        if not rows or row[1:] != rows[-1][1:]:
+            rows.append(row)
+    return rows
+
+def read_quotes(path):
+    with open(path, newline="") as f:
+        rows = list(csv.reader(f))
+    # prices are turned back into ticks, and the volumes into ints
+    return rows[0], [[int(row[0])] + [None if x == "None" else round(float(x) * 100) if i % 2 else int(x) for i, x in enumerate(row[1:], 1)]
+                     for row in rows[1:]]
+
+@pytest.mark.parametrize("book_type, quote_depth, quote_throttle", [
+    ("tree", 1, 0),
+    ("tree", 3, 0),
+    ("ladder", 3, 0),
+    ("tree", 5, 0.5),
+    ("tree", 3, 10),
+])
+def test_quotes_are_the_changes_of_the_best_levels(tmp_path, mini_file, book_type, quote_depth, quote_throttle):
+    engine = OrderEngine(output_mode="full", output_dir=str(tmp_path), book_type=book_type, quote_depth=quote_depth, quote_throttle=quote_throttle)
+    engine.run_with_file(mini_file)
+    header, rows = read_quotes(tmp_path / "quotes.csv")
+    assert header == engine.lob_header(quote_depth).split(",")
+
+    expected = brute_force_quotes(mini_file, quote_depth, quote_throttle)
+    assert len(expected) > 10
+    assert rows == expected
+    # no row repeats the levels of the one before it, and with a throttle no two rows are in the same window
+    assert all(row[1:] != previous[1:] for previous, row in zip(rows, rows[1:]))
+    if quote_throttle:
+        windows = [row[0] // round(quote_throttle * 1e9) for row in rows]
+        assert len(set(windows)) == len(windows)
+
+def test_change_undone_within_a_throttle_window_is_not_written(tmp_path):
+    lines = [
+        "1,1000000000,A,GARAN.E,S,19.94,1,100,1",
+        "1,1000000000,E,GARAN.E,S,0.0,0,100,1",
+        # the bid is added and deleted in the window of the second second, which ends with the levels of the first one
+        "1,2000000000,A,GARAN.E,B,19.90,2,50,2",
+        "1,2000000000,E,GARAN.E,B,0.0,0,50,2",
+        "1,2500000000,D,GARAN.E,B,0.0,0,0,2",
+    ]
+    input_file = tmp_path / "input.csv"
+    input_file.write_text("\n".join(lines) + "\n")
+
+    OrderEngine(output_mode="full", output_dir=str(tmp_path / "out"), quote_depth=1, quote_throttle=1).run_with_file(str(input_file))
+    assert read_quotes(tmp_path / "out" / "quotes.csv")[1] == [[1000000000, 1994, 100, None, None]]
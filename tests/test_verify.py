@@ -0,0 +1,65 @@
+import shutil
+
+import pytest
+
+from LOB.OrderEngine import OrderEngine
+
+@pytest.fixture
+def golden_dir(tmp_path, mini_file):
+    """
+    The outputs of a run of the sample input, used as the golden files
+    """
+    OrderEngine(output_mode="full", output_dir=str(tmp_path / "golden")).run_with_file(mini_file)
+    return tmp_path / "golden"
+
+def verify(tmp_path, golden_dir, mini_file):
+    engine = OrderEngine(output_mode="full", output_dir=str(tmp_path / "out"), golden_dir=str(golden_dir))
+    divergence = engine.verify_with_file(mini_file)
+    # the wrapper that remembers the record being processed is removed once the verification is over
+    assert engine.process_record.__func__ is OrderEngine.process_record
+    return divergence
+
+def test_outputs_of_the_same_run_match(tmp_path, golden_dir, mini_file):
+    assert verify(tmp_path, golden_dir, mini_file) is None
+
+def test_modified_golden_line_is_reported_with_its_message(tmp_path, golden_dir, mini_file):
+    trades_file = golden_dir / "trades.csv"
+    lines = trades_file.read_text().splitlines(keepends=True)
+    actual = lines[100]
+    fields = actual.split(",")
+    fields[2] = str(int(fields[2]) + 1)
+    lines[100] = ",".join(fields)
+    trades_file.write_text("".join(lines))
+
+    divergence = verify(tmp_path, golden_dir, mini_file)
+    assert divergence["golden_file"] == str(trades_file)
+    assert divergence["golden_line"] == 101
+    assert divergence["expected"] == lines[100].rstrip("\n")
+    assert divergence["actual"] == actual.rstrip("\n")
+    # the message that produced the trade is the orderE at the input line reported, which has the bist_time of the trade
+    with open(mini_file) as f:
+        message = f.read().splitlines()[divergence["input_line"] - 1]
+    assert message.split(",")[1] == fields[0]
+    assert message.split(",")[2] == "E"
+    assert divergence["message"].split(",")[:3] == message.split(",")[:3]
+
+def test_truncated_golden_file_diverges_at_its_end(tmp_path, golden_dir, mini_file):
+    lob_file = golden_dir / "LOB.csv"
+    lines = lob_file.read_text().splitlines(keepends=True)
+    lob_file.write_text("".join(lines[:-10]))
+
+    divergence = verify(tmp_path, golden_dir, mini_file)
+    assert divergence["golden_file"] == str(lob_file)
+    assert divergence["golden_line"] == len(lines) - 9
+    assert divergence["expected"] == ""
+    assert divergence["actual"] == lines[-10].rstrip("\n")
+
+def test_golden_file_with_more_lines_diverges_after_the_output(tmp_path, golden_dir, mini_file):
+    shutil.copy(golden_dir / "trades.csv", tmp_path / "trades.csv")
+    with open(golden_dir / "trades.csv", "a") as f:
+        f.write("1,19.93,1,2,3,4,5\n")
+
+    divergence = verify(tmp_path, golden_dir, mini_file)
+    lines = (tmp_path / "trades.csv").read_text().splitlines()
+    assert divergence["golden_line"] == len(lines) + 1
+    assert (divergence["expected"], divergence["actual"]) == ("1,19.93,1,2,3,4,5", "")